@@ -1,41 +1,128 @@
-from flask import Flask, render_template, request, jsonify, send_file, flash, redirect, url_for, abort, session
+from flask import (Flask, render_template, request, jsonify, send_file, flash, redirect, url_for, abort, session,
+                   Response, stream_with_context, make_response)
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
-import csv
-import io
 import secrets
+import time
+
+import click
+import numpy as np
 
 from PIL import Image
-from models import db, User, Material, Verification, Comment, Bookmark
+from models import (db, User, Material, Verification, Comment, Bookmark, RenderJob, RenderWorker, CatalogStat,
+                    ImportedFile)
 from forms import (
     LoginForm, RegistrationForm, MaterialForm, VerificationForm,
     CommentForm, EditProfileForm, ChangePasswordForm
 )
 from utils.visualization import StructureVisualizer, BandStructureVisualizer, DOSVisualizer
+from utils.render_cache import RenderCache
+from utils.render_jobs import render_material_images
+from utils.structure_cache import structure_cache
+from utils.query_counter import init_query_counter
+from utils.pagination import keyset_page, rank_page, CountCache
+from utils.search import create_search_index, search_supported, match_expression, ranked_matches
+from utils.catalog_stats import (init_catalog_stats, read_stats, reconcile_stats, add_to_stats, material_keys,
+                                 materials_version, VERSION_KEY)
+from utils.importer import collect_sources, file_sha256, parse_structure_file
+from utils.downsampling import band_window, json_points
+from utils.counters import CounterBuffer
+from utils.backups import BackupManager, COMPRESSION_SUFFIXES, zstd_available
+from utils.db_config import database_config, init_database_engines, read_only_endpoint
+from utils.export import iter_csv, gzip_stream, iter_arrow, arrow_available
+from utils.metrics import metrics, init_metrics
+from utils.conditional import make_etag, file_version, is_not_modified, not_modified, with_validators
+from utils.spectra_storage import (
+    save_band_structure, load_band_structure, save_dos, load_dos, remove_spectra,
+    parse_band_structure_upload, parse_dos_upload, load_levels, build_missing_levels
+)
 from flask_migrate import Migrate
-from translations import translations, get_locale
+from translations import CATALOGS, DEFAULT_LANGUAGE, LANGUAGES, get_catalog, get_locale
 
 # Конфигурация
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-change-in-production'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///2dmaterials.db'
+# DATABASE_URL, DATABASE_REPLICA_URL, пул и PRAGMA SQLite - см. utils/db_config.py
+app.config.update(database_config())
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max file size
+app.config['BANDS_FOLDER'] = 'static/uploads/bands'
+app.config['DOS_FOLDER'] = 'static/uploads/dos'
+app.config['RENDER_CACHE_FOLDER'] = 'static/renders'
+app.config['RENDER_CACHE_MAX_BYTES'] = int(os.environ.get('RENDER_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+# Неудавшаяся отрисовка не повторяется столько секунд (пока не изменятся данные)
+app.config['RENDER_FAILURE_TTL'] = int(os.environ.get('RENDER_FAILURE_TTL', 600))
+app.config['RENDER_DPI'] = 150
+# Страница ждет render-worker (показывает заглушку), только пока задание
+# моложе RENDER_JOB_MAX_AGE секунд и воркер отмечался не позже
+# RENDER_WORKER_TIMEOUT секунд назад; иначе рисует сама через кэш рендеров
+app.config['RENDER_JOB_MAX_AGE'] = int(os.environ.get('RENDER_JOB_MAX_AGE', 300))
+app.config['RENDER_WORKER_TIMEOUT'] = int(os.environ.get('RENDER_WORKER_TIMEOUT', 60))
+app.config['STRUCTURE_CACHE_MAX_BYTES'] = int(os.environ.get('STRUCTURE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+app.config['STRUCTURE_SIDECAR_MAX_BYTES'] = int(os.environ.get('STRUCTURE_SIDECAR_MAX_BYTES', 256 * 1024 * 1024))
+# Для тестов/отладки: заголовок X-SQL-Queries с числом SQL-запросов (все базы)
+# и необязательный максимум запросов на один HTTP-запрос
+app.config['SQL_QUERY_COUNT'] = os.environ.get('SQL_QUERY_COUNT') == '1'
+app.config['SQL_QUERY_BUDGET'] = int(os.environ.get('SQL_QUERY_BUDGET', 0)) or None
+app.config['MATERIALS_PER_PAGE'] = 20
+app.config['MATERIALS_MAX_PER_PAGE'] = 100
+app.config['MATERIALS_COUNT_TTL'] = 60  # секунд, кэш общего числа найденных материалов
+app.config['COUNTER_FLUSH_INTERVAL'] = float(os.environ.get('COUNTER_FLUSH_INTERVAL', 5))
+app.config['BACKUP_FOLDER'] = os.environ.get('BACKUP_FOLDER', os.path.join(app.root_path, 'backups'))
+app.config['BACKUP_KEEP'] = int(os.environ.get('BACKUP_KEEP', 10))  # 0 - хранить все
+# Копии перед восстановлением считаются отдельно от плановых
+app.config['BACKUP_KEEP_PRE_RESTORE'] = int(os.environ.get('BACKUP_KEEP_PRE_RESTORE', 3))
+app.config['BACKUP_COMPRESSION'] = os.environ.get('BACKUP_COMPRESSION', 'zstd' if zstd_available() else 'gzip')
+app.config['BACKUP_PAGES_PER_STEP'] = int(os.environ.get('BACKUP_PAGES_PER_STEP', 1024))
+app.config['BACKUP_STEP_PAUSE'] = float(os.environ.get('BACKUP_STEP_PAUSE', 0.005))  # секунд между шагами
+# Метрики запросов для /admin/metrics; METRICS_TOKEN - доступ для Prometheus без входа
+app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '1') != '0'
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
 
 # Создание папок для загрузок
 os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'cif'), exist_ok=True)
 os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'poscar'), exist_ok=True)
-os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'bands'), exist_ok=True)
-os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'dos'), exist_ok=True)
+os.makedirs(app.config['BANDS_FOLDER'], exist_ok=True)
+os.makedirs(app.config['DOS_FOLDER'], exist_ok=True)
 os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'reports'), exist_ok=True)
 
 # Инициализация
 db.init_app(app)
+init_database_engines(app, db)
+init_query_counter(app, db)
+init_metrics(app, db)
+init_catalog_stats(db.session)
+render_cache = RenderCache(app.config['RENDER_CACHE_FOLDER'],
+                           max_bytes=app.config['RENDER_CACHE_MAX_BYTES'],
+                           failure_ttl=app.config['RENDER_FAILURE_TTL'])
+# Разобранные CIF/POSCAR кэшируются в памяти и в .npz в instance/, чтобы
+# render-worker и новые процессы не разбирали файлы заново
+structure_cache.configure(max_bytes=app.config['STRUCTURE_CACHE_MAX_BYTES'],
+                          sidecar_dir=os.path.join(app.instance_path, 'structures'),
+                          sidecar_max_bytes=app.config['STRUCTURE_SIDECAR_MAX_BYTES'])
+material_counts = CountCache(ttl=app.config['MATERIALS_COUNT_TTL'])
+# Просмотры и скачивания пишутся в БД пакетами, а не коммитом на каждый GET
+material_counters = CounterBuffer(Material.__table__, columns=('views', 'downloads'))
+material_counters.init_app(app, db)
+metrics.add_collector(lambda: [
+    (f'counter_buffer_{name}', 'counter' if name in ('flushed_increments', 'flush_failures') else 'gauge',
+     f'View/download counter buffer: {name}', value)
+    for name, value in material_counters.metrics().items()
+])
+metrics.add_collector(lambda: [
+    (f'structure_cache_{name}', 'gauge' if name in ('entries', 'bytes') else 'counter',
+     f'Parsed structure cache: {name}', value)
+    for name, value in structure_cache.stats().items()
+])
+
+# Резервные копии SQLite (backup API, в фоновом потоке)
+backups = BackupManager(app.config['BACKUP_FOLDER'])
+backups.init_app(app, db)
 CORS(app)
 
 migrate = Migrate(app, db)
@@ -47,24 +134,252 @@ login_manager.login_view = 'login'
 login_manager.login_message = 'Пожалуйста, войдите для доступа к этой странице.'
 login_manager.login_message_category = 'info'
 
+# Шаблоны страницы материала входят в ее ETag: после обновления шаблонов
+# закэшированные браузерами страницы становятся недействительными
+MATERIAL_PAGE_VERSION = file_version([os.path.join(app.root_path, 'templates', name)
+                                      for name in ('base.html', 'material.html')])
+# Рендеры адресуются хэшем источника и никогда не меняются по тому же URL
+RENDER_MAX_AGE = 365 * 24 * 3600
+
 @login_manager.user_loader
 def load_user(user_id):
     return db.session.get(User, int(user_id))
 
 
+@app.after_request
+def render_cache_validators(response):
+    """
+    Сильный ETag рендеров - их ключ в кэше (хэш источника). Ответ static
+    строится по mtime, а кэш обновляет mtime при каждом попадании, из-за
+    чего браузеры заново скачивали неизменившиеся изображения.
+    """
+    filename = (request.view_args or {}).get('filename', '')
+    if request.endpoint == 'static' and filename.startswith('renders/') and response.status_code in (200, 304):
+        response.set_etag(os.path.splitext(os.path.basename(filename))[0])
+        response.headers.pop('Last-Modified', None)
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = RENDER_MAX_AGE
+        response.cache_control.immutable = True
+        response.make_conditional(request)
+    return response
+
+
 @app.route('/set_language/<lang>')
 def set_language(lang):
-    if lang in ['en', 'ru']:
+    if lang in LANGUAGES:
         session['language'] = lang
     return redirect(request.referrer or url_for('index'))
 
 
 @app.context_processor
 def inject_translations():
-    def t(key):
-        lang = session.get('language', request.accept_languages.best_match(['en', 'ru']) or 'en')
-        return translations.get(lang, translations['en']).get(key, key)
-    return dict(t=t)
+    # Язык определяется один раз за запрос, t - готовый каталог этого языка
+    return dict(t=get_catalog())
+
+def load_json_data(text):
+    """Разбирает JSON с данными для графиков, None при ошибке"""
+    try:
+        return json.loads(text)
+    except (json.JSONDecodeError, ValueError):
+        return None
+
+
+def cached_render_url(source, renderer, version, dpi, render):
+    """URL отрисованного изображения из кэша рендеров (None при ошибке отрисовки)"""
+    rel = render_cache.get_or_render(source, renderer, version, dpi, render)
+    if rel is None:
+        return None
+    return url_for('static', filename=f'renders/{rel}')
+
+
+# Колонки Material, которые заполняет фоновая отрисовка
+RENDER_IMAGE_FIELDS = ('structure_image_path', 'reciprocal_lattice_image_path',
+                       'band_structure_image_path', 'dos_image_path')
+
+
+def enqueue_render(material, fields=RENDER_IMAGE_FIELDS):
+    """Ставит материал в очередь фоновой отрисовки, сбрасывая устаревшие изображения"""
+    for field in fields:
+        setattr(material, field, None)
+    pending = RenderJob.query.filter_by(material_id=material.id, status='pending').first()
+    if pending is None:
+        db.session.add(RenderJob(material_id=material.id))
+
+
+def render_in_progress(material_id):
+    """
+    Отрисует ли render-worker изображения материала в ближайшее время:
+    задание ждет или выполняется не дольше RENDER_JOB_MAX_AGE, и хотя бы
+    один воркер недавно отметился. Без воркера или после его падения
+    задание может висеть сколько угодно - тогда страница рисует сама.
+    """
+    now = datetime.utcnow()
+    job = RenderJob.query.filter(
+        RenderJob.material_id == material_id,
+        RenderJob.status.in_(('pending', 'running')),
+        RenderJob.created_at >= now - timedelta(seconds=app.config['RENDER_JOB_MAX_AGE'])
+    ).first()
+    if job is None:
+        return False
+    return RenderWorker.query.filter(
+        RenderWorker.heartbeat_at >= now - timedelta(seconds=app.config['RENDER_WORKER_TIMEOUT'])
+    ).first() is not None
+
+
+def render_payload(material):
+    """Данные для render_material_images (передаются в дочерний процесс)"""
+    return {
+        'structure_path': material.cif_file_path or material.poscar_file_path,
+        'band_structure_path': material.band_structure_path,
+        'dos_path': material.dos_path,
+        # Старый JSON нужен, только если данные еще не переведены в .npy
+        'band_structure_data': None if material.band_structure_path else material.band_structure_data,
+        'dos_data': None if material.dos_path else material.dos_data,
+        'cache_folder': app.config['RENDER_CACHE_FOLDER'],
+        'cache_max_bytes': app.config['RENDER_CACHE_MAX_BYTES'],
+        'cache_failure_ttl': app.config['RENDER_FAILURE_TTL'],
+        'dpi': app.config['RENDER_DPI'],
+    }
+
+
+def get_band_data(material):
+    """Данные зонной структуры материала (из .npy или старого JSON), None если нет"""
+    if material.band_structure_path:
+        return load_band_structure(material.band_structure_path)
+    if material.band_structure_data:
+        return load_json_data(material.band_structure_data)
+    return None
+
+
+def get_dos_data(material):
+    """Данные DOS материала (из .npy или старого JSON), None если нет"""
+    if material.dos_path:
+        return load_dos(material.dos_path)
+    if material.dos_data:
+        return load_json_data(material.dos_data)
+    return None
+
+
+def get_levels(path):
+    """Пирамида детализации папки с данными; None для старого JSON (строится на лету)"""
+    return load_levels(path) if path else None
+
+
+def save_spectra_uploads(material, form):
+    """
+    Сохраняет загруженные файлы зонной структуры и DOS в бинарном виде.
+    Возвращает колонки изображений, которые нужно перерисовать, и папки
+    со старыми версиями данных (их удаляют после commit).
+    """
+    image_fields = []
+    old_paths = []
+    uploads = (
+        (form.band_structure_file.data, 'band_structure_path', 'band_structure_image_path',
+         parse_band_structure_upload, save_band_structure, app.config['BANDS_FOLDER']),
+        (form.dos_file.data, 'dos_path', 'dos_image_path',
+         parse_dos_upload, save_dos, app.config['DOS_FOLDER']),
+    )
+    for upload, path_field, image_field, parse, save, folder in uploads:
+        if not upload:
+            continue
+        try:
+            path = save(folder, material.id, parse(upload.filename, upload.read()))
+        except (ValueError, KeyError, TypeError) as e:
+            flash(f'Не удалось разобрать файл {upload.filename}: {e}', 'warning')
+            continue
+        old_path = getattr(material, path_field)
+        if old_path and old_path != path:
+            old_paths.append(old_path)
+        setattr(material, path_field, path)
+        image_fields.append(image_field)
+    return image_fields, old_paths
+
+
+def static_image_url(path):
+    """URL сохраненного в static/ изображения или None, если файла нет"""
+    if path and os.path.exists(path):
+        return url_for('static', filename=path[len('static/'):])
+    return None
+
+def browse_filters(args):
+    """Фильтры страницы browse (и /api/search) из параметров запроса"""
+    try:
+        min_tc = float(args.get('min_tc', 0))
+    except ValueError:
+        min_tc = 0
+    try:
+        max_band_gap = float(args.get('max_band_gap', 10))
+    except ValueError:
+        max_band_gap = 10
+    return {
+        'magnetic_order': args.get('magnetic_order', '').strip(),
+        'verified_only': args.get('verified_only', 'false') == 'true',
+        'min_tc': min_tc,
+        'max_band_gap': max_band_gap
+    }
+
+def browse_query(formula='', magnetic_order='', verified_only=False, min_tc=0, max_band_gap=10):
+    """Запрос публичных материалов с фильтрами страницы browse"""
+    query = db.session.query(Material).options(Material.summary()).filter(Material.is_public == True)
+    if formula:
+        query = query.filter(Material.formula.ilike(f'%{formula}%'))
+    if magnetic_order:
+        query = query.filter_by(magnetic_order=magnetic_order)
+    if verified_only:
+        query = query.filter_by(is_verified=True)
+    if min_tc > 0:
+        query = query.filter(Material.curie_temperature >= min_tc)
+    if max_band_gap < 10:
+        query = query.filter(Material.band_gap <= max_band_gap)
+    return query
+
+def search_query(text, **filters):
+    """
+    Ранжированный полнотекстовый поиск с фильтрами browse: (запрос, колонка rank).
+    (None, None), если FTS недоступен или запрос слишком короткий - тогда
+    используется browse_query с поиском подстроки в формуле.
+    """
+    expression = match_expression(text) if search_supported(db.engine) else None
+    if expression is None:
+        return None, None
+    matches = ranked_matches(expression)
+    query = browse_query(**filters).join(matches, matches.c.id == Material.id).add_columns(matches.c.rank)
+    return query, matches.c.rank
+
+def catalog_stats():
+    """Счетчики главной страницы и /api/stats из CatalogStat (один запрос)"""
+    counts = read_stats(db.session)
+    by_prefix = {'magnetic_order': {}, 'crystal_system': {}}
+    for key, value in counts.items():
+        prefix, _, name = key.partition(':')
+        if prefix in by_prefix and value:
+            by_prefix[prefix][name] = value
+    return {
+        'total_materials': counts.get('materials', 0),
+        'verified_materials': counts.get('verified_materials', 0),
+        'total_users': counts.get('users', 0),
+        'fm_materials': by_prefix['magnetic_order'].get('FM', 0),
+        'afm_materials': by_prefix['magnetic_order'].get('AFM', 0),
+        'magnetic_orders': by_prefix['magnetic_order'],
+        'crystal_systems': by_prefix['crystal_system']
+    }
+
+def material_version(material_id, *columns):
+    """
+    Легкая строка Material для условных запросов: updated_at, is_public и
+    columns, без тяжелых колонок. 404, если материала нет.
+    """
+    row = db.session.query(Material.updated_at, Material.is_public, *columns).filter(
+        Material.id == material_id
+    ).first()
+    if row is None:
+        abort(404)
+    return row
+
+def query_version():
+    """Параметры запроса в каноническом порядке - часть ETag ответов API"""
+    return tuple(sorted(request.args.items(multi=True)))
 
 # Helper function for 404 errors
 def get_or_404(model, id):
@@ -77,6 +392,11 @@ def get_or_404(model, id):
 with app.app_context():
     try:
         db.create_all()
+        with db.engine.begin() as connection:
+            create_search_index(connection)
+        # Счетчики для новой базы (или базы до появления CatalogStat)
+        if db.session.query(CatalogStat.key).first() is None:
+            reconcile_stats(db.session)
         print("Database tables created successfully!")
         
         # Create admin user
@@ -126,61 +446,40 @@ def internal_error(error):
 # Главная страница
 @app.route('/')
 def index():
-    stats = {
-        'total_materials': db.session.query(Material).count(),
-        'verified_materials': db.session.query(Material).filter_by(is_verified=True).count(),
-        'total_users': db.session.query(User).count(),
-        'recent_materials': db.session.query(Material).order_by(Material.created_at.desc()).limit(6).all(),
-        'top_materials': db.session.query(Material).order_by(Material.views.desc()).limit(6).all(),
-        'fm_materials': db.session.query(Material).filter_by(magnetic_order='FM').count(),
-        'afm_materials': db.session.query(Material).filter_by(magnetic_order='AFM').count()
-    }
+    stats = catalog_stats()
+    stats['recent_materials'] = db.session.query(Material).options(Material.summary()).order_by(Material.created_at.desc()).limit(6).all()
+    stats['top_materials'] = db.session.query(Material).options(Material.summary()).order_by(Material.views.desc()).limit(6).all()
     return render_template('index.html', stats=stats)
 
 # Просмотр материалов
 @app.route('/browse')
+@read_only_endpoint
 def browse():
-    # Получение параметров фильтрации из запроса
+    # Получение параметров фильтрации из запроса; поле formula - строка поиска
     formula = request.args.get('formula', '').strip()
-    magnetic_order = request.args.get('magnetic_order', '').strip()
-    verified_only = request.args.get('verified_only', 'false') == 'true'
-    
-    try:
-        min_tc = float(request.args.get('min_tc', 0))
-    except ValueError:
-        min_tc = 0
-        
-    try:
-        max_band_gap = float(request.args.get('max_band_gap', 10))
-    except ValueError:
-        max_band_gap = 10
-    
-    # Пагинация
-    page = request.args.get('page', 1, type=int)
-    per_page = 20
-    
-    # Start query
-    query = db.session.query(Material).filter(Material.is_public == True)
-    
-    # Apply filters
-    if formula:
-        query = query.filter(Material.formula.ilike(f'%{formula}%'))
-    if magnetic_order:
-        query = query.filter_by(magnetic_order=magnetic_order)
-    if verified_only:
-        query = query.filter_by(is_verified=True)
-    if min_tc > 0:
-        query = query.filter(Material.curie_temperature >= min_tc)
-    if max_band_gap < 10:
-        query = query.filter(Material.band_gap <= max_band_gap)
+    filters = browse_filters(request.args)
     
-    # Get total count
-    total = query.count()
+    # Пагинация курсором: по (created_at, id), для результатов поиска - по (rank, id)
+    cursor = request.args.get('cursor', '').strip() or None
+    per_page = app.config['MATERIALS_PER_PAGE']
+    count_key = ('browse', formula) + tuple(sorted(filters.items()))
     
-    # Paginate
-    materials = query.order_by(Material.created_at.desc())\
-                    .offset((page - 1) * per_page)\
-                    .limit(per_page).all()
+    query, rank = search_query(formula, **filters)
+    if query is not None:
+        total = material_counts.get(count_key, query)
+        try:
+            materials, _, next_cursor = rank_page(query, rank, Material.id, per_page, cursor)
+        except ValueError:
+            materials, _, next_cursor = rank_page(query, rank, Material.id, per_page)
+    else:
+        query = browse_query(formula, **filters)
+        # Общее число кэшируется на MATERIALS_COUNT_TTL секунд
+        total = material_counts.get(count_key, query)
+        try:
+            materials, next_cursor = keyset_page(query, Material, per_page, cursor)
+        except ValueError:
+            # Поврежденный курсор - начинаем с первой страницы
+            materials, next_cursor = keyset_page(query, Material, per_page)
     
     # Get unique magnetic orders for filter dropdown
     unique_orders = db.session.query(Material.magnetic_order).distinct().filter(
@@ -191,59 +490,29 @@ def browse():
     return render_template('browse.html', 
                          materials=materials,
                          unique_orders=unique_orders,
-                         filters={
-                             'formula': formula,
-                             'magnetic_order': magnetic_order,
-                             'verified_only': verified_only,
-                             'min_tc': min_tc,
-                             'max_band_gap': max_band_gap
-                         },
+                         filters=dict(filters, formula=formula),
                          pagination={
-                             'page': page,
                              'per_page': per_page,
                              'total': total,
-                             'pages': (total + per_page - 1) // per_page
+                             'next_cursor': next_cursor,
+                             'is_first': cursor is None
                          })
 
 # Детальная страница материала
 @app.route('/material/<int:material_id>')
 def material_detail(material_id):
-    material = get_or_404(Material, material_id)
-    if not material:
-        abort(404)
-    
-    # Увеличиваем счетчик просмотров
-    material.views += 1
-    db.session.commit()
-    
-    # Загружаем данные для визуализации
-    structure_image = None
-    band_structure_image = None
-    dos_image = None
-    
-    if material.cif_file_path and os.path.exists(material.cif_file_path):
-        structure_image = StructureVisualizer.create_structure_plot(
-            material.cif_file_path
-        )
-    
-    if material.band_structure_data:
-        try:
-            band_data = json.loads(material.band_structure_data)
-            band_structure_image = BandStructureVisualizer.create_band_structure_plot(band_data)
-        except (json.JSONDecodeError, ValueError):
-            pass
+    version = material_version(
+        material_id, Material.structure_image_path, Material.band_structure_image_path,
+        Material.dos_image_path, Material.band_structure_path, Material.dos_path
+    )
     
-    if material.dos_data:
-        try:
-            dos_data = json.loads(material.dos_data)
-            dos_image = DOSVisualizer.create_dos_plot(dos_data)
-        except (json.JSONDecodeError, ValueError):
-            pass
+    # Просмотр учитывается в буфере; в БД он попадет при следующем сбросе.
+    # Считается и для ответа 304 - это тоже просмотр
+    material_counters.add('views', material_id)
     
-    # Комментарии
-    comments = Comment.query.filter_by(material_id=material_id).order_by(
-        Comment.created_at.desc()
-    ).all()
+    # Изображения готовит фоновый render-worker; пока он жив и задание
+    # не устарело, страница показывает заглушку
+    render_pending = render_in_progress(material_id)
     
     # Проверка, добавлен ли в закладки
     is_bookmarked = False
@@ -254,13 +523,102 @@ def material_detail(material_id):
         ).first()
         is_bookmarked = bookmark is not None
     
-    return render_template('material.html',
+    # Версия страницы: материал и его изображения (готовые рендеры меняют пути,
+    # но не updated_at), комментарии, пользователь и язык. Счетчики просмотров
+    # и скачиваний в версию не входят - в копии из кэша они могут отставать.
+    # Страница с flash-сообщениями отдается без ETag: они показываются один раз
+    comment_version = db.session.query(
+        db.func.count(Comment.id), db.func.max(Comment.id), db.func.max(Comment.updated_at)
+    ).filter(Comment.material_id == material_id).one()
+    etag = None
+    if '_flashes' not in session:
+        etag = make_etag(
+            'material', material_id, tuple(version), render_pending, tuple(comment_version),
+            current_user.get_id(), getattr(current_user, 'role', None), is_bookmarked, get_locale(),
+            StructureVisualizer.RENDER_VERSION, BandStructureVisualizer.RENDER_VERSION,
+            DOSVisualizer.RENDER_VERSION, app.config['RENDER_DPI'], MATERIAL_PAGE_VERSION
+        )
+        if is_not_modified(etag):
+            return not_modified(etag, private=True)
+    
+    material = get_or_404(Material, material_id)
+    
+    structure_image = static_image_url(material.structure_image_path)
+    band_structure_image = static_image_url(material.band_structure_image_path)
+    dos_image = static_image_url(material.dos_image_path)
+    
+    # Материалы без готовых изображений (например, добавленные до появления
+    # фоновой отрисовки) рисуем на месте через кэш рендеров; ключ - хэш
+    # содержимого источника, поэтому после edit_material изображения обновляются
+    dpi = app.config['RENDER_DPI']
+    
+    structure_path = material.cif_file_path or material.poscar_file_path
+    if not structure_image and not render_pending and structure_path and os.path.exists(structure_path):
+        with open(structure_path, 'rb') as f:
+            structure_source = f.read()
+        structure_image = cached_render_url(
+            structure_source, 'structure', StructureVisualizer.RENDER_VERSION, dpi,
+            lambda out: StructureVisualizer.create_structure_plot(structure_path, out, dpi=dpi)
+        )
+    
+    # Путь к .npy содержит хэш данных, поэтому годится как источник ключа кэша
+    if not band_structure_image and not render_pending:
+        band_source = material.band_structure_path or material.band_structure_data
+        if band_source:
+            band_structure_image = cached_render_url(
+                band_source, 'band_structure', BandStructureVisualizer.RENDER_VERSION, dpi,
+                lambda out: BandStructureVisualizer.create_band_structure_plot(
+                    get_band_data(material), out, dpi=dpi)
+            )
+    
+    if not dos_image and not render_pending:
+        dos_source = material.dos_path or material.dos_data
+        if dos_source:
+            dos_image = cached_render_url(
+                dos_source, 'dos', DOSVisualizer.RENDER_VERSION, dpi,
+                lambda out: DOSVisualizer.create_dos_plot(get_dos_data(material), out, dpi=dpi,
+                                                          levels=get_levels(material.dos_path))
+            )
+    
+    # Комментарии (авторы и ответы загружаются сразу, без запроса на каждый комментарий)
+    comments = Comment.query.filter_by(material_id=material_id).options(
+        db.selectinload(Comment.user),
+        db.selectinload(Comment.replies).selectinload(Comment.user)
+    ).order_by(
+        Comment.created_at.desc()
+    ).all()
+    
+    response = make_response(render_template('material.html',
                          material=material,
                          structure_image=structure_image,
                          band_structure_image=band_structure_image,
                          dos_image=dos_image,
+                         render_pending=render_pending,
+                         views=material.views + material_counters.pending('views', material.id),
+                         downloads=(material.downloads or 0) + material_counters.pending('downloads', material.id),
                          comments=comments,
-                         is_bookmarked=is_bookmarked)
+                         is_bookmarked=is_bookmarked))
+    if etag is None:
+        response.cache_control.no_store = True
+        return response
+    return with_validators(response, etag, private=True)
+
+# Скачивание файлов структуры с учетом в счетчике downloads. Файлы
+# публичного материала доступны всем, как прежние ссылки на static;
+# непубличного - только вошедшим пользователям, как его спектры в API
+@app.route('/material/<int:material_id>/download/<kind>')
+def download_material_file(material_id, kind):
+    material = get_or_404(Material, material_id)
+    if not material.is_public and not current_user.is_authenticated:
+        abort(403)
+    paths = {'cif': material.cif_file_path, 'poscar': material.poscar_file_path}
+    if not paths.get(kind):
+        abort(404)
+    path = os.path.join(app.root_path, paths[kind])
+    if not os.path.exists(path):
+        abort(404)
+    material_counters.add('downloads', material.id)
+    return send_file(path, as_attachment=True, download_name=os.path.basename(path))
 
 # Визуализация
 @app.route('/material/<int:material_id>/visualization')
@@ -278,19 +636,19 @@ def material_visualization(material_id):
             material.cif_file_path
         )
     
-    if material.band_structure_data:
-        try:
-            band_data = json.loads(material.band_structure_data)
-            interactive_bands = BandStructureVisualizer.create_interactive_bands(band_data)
-        except (json.JSONDecodeError, ValueError):
-            pass
+    band_data = get_band_data(material)
+    if band_data:
+        interactive_bands = BandStructureVisualizer.create_interactive_bands(
+            band_data, zoom_url=url_for('api_material_bands', material_id=material.id),
+            levels=get_levels(material.band_structure_path)
+        )
     
-    if material.dos_data:
-        try:
-            dos_data = json.loads(material.dos_data)
-            interactive_dos = DOSVisualizer.create_interactive_dos(dos_data)
-        except (json.JSONDecodeError, ValueError):
-            pass
+    dos_data = get_dos_data(material)
+    if dos_data:
+        interactive_dos = DOSVisualizer.create_interactive_dos(
+            dos_data, levels=get_levels(material.dos_path),
+            zoom_url=url_for('api_material_dos', material_id=material.id)
+        )
     
     return render_template('visualization.html',
                          material=material,
@@ -358,6 +716,9 @@ def add_material():
             material.tags = json.dumps(tags_list)
         
         db.session.add(material)
+        db.session.flush()
+        save_spectra_uploads(material, form)
+        enqueue_render(material)
         db.session.commit()
         
         flash('Материал успешно добавлен!', 'success')
@@ -421,9 +782,13 @@ def verify_material(material_id):
 @app.route('/profile')
 @login_required
 def profile():
-    user_materials = Material.query.filter_by(user_id=current_user.id).all()
-    bookmarks = Bookmark.query.filter_by(user_id=current_user.id).all()
-    verifications = Verification.query.filter_by(expert_id=current_user.id).all()
+    user_materials = Material.query.options(Material.summary()).filter_by(user_id=current_user.id).all()
+    bookmarks = Bookmark.query.options(
+        db.selectinload(Bookmark.material).options(Material.summary())
+    ).filter_by(user_id=current_user.id).all()
+    verifications = Verification.query.options(
+        db.selectinload(Verification.material).options(Material.summary())
+    ).filter_by(expert_id=current_user.id).all()
     
     return render_template('profile.html',
                          user=current_user,
@@ -439,9 +804,14 @@ def admin_dashboard():
         flash('Доступ запрещен', 'danger')
         return redirect(url_for('index'))
     
-    all_materials = Material.query.order_by(Material.created_at.desc()).all()
+    # Авторы материалов загружаются одним запросом, а не по одному на строку
+    all_materials = Material.query.options(
+        Material.summary(), db.selectinload(Material.author)
+    ).order_by(Material.created_at.desc()).all()
     all_users = User.query.all()
-    pending_materials = Material.query.filter_by(is_verified=False, is_public=True).order_by(Material.created_at.desc()).all()
+    pending_materials = Material.query.options(
+        Material.summary(), db.selectinload(Material.author)
+    ).filter_by(is_verified=False, is_public=True).order_by(Material.created_at.desc()).all()
     
     return render_template('admin.html',
                          materials=all_materials,
@@ -497,30 +867,89 @@ def toggle_bookmark(material_id):
 
 # API endpoints
 @app.route('/api/materials')
+@read_only_endpoint
 def api_materials():
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
-    offset = (page - 1) * per_page
+    per_page = request.args.get('per_page', app.config['MATERIALS_PER_PAGE'], type=int)
+    per_page = max(1, min(per_page, app.config['MATERIALS_MAX_PER_PAGE']))
+    cursor = request.args.get('cursor') or None
+    with_total = request.args.get('with_total', 'false') == 'true'
     
-    query = Material.query.filter_by(is_public=True)
-    total = query.count()
-    materials = query.offset(offset).limit(per_page).all()
-    pages = (total + per_page - 1) // per_page
+    # Версия коллекции меняется при любом изменении материалов
+    etag = make_etag('api_materials', materials_version(db.session), query_version())
+    if is_not_modified(etag):
+        return not_modified(etag)
     
-    return jsonify({
+    query = Material.query.options(Material.summary()).filter_by(is_public=True)
+    try:
+        materials, next_cursor = keyset_page(query, Material, per_page, cursor)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    result = {
         'materials': [m.to_dict() for m in materials],
-        'total': total,
-        'pages': pages,
-        'current_page': page
-    })
+        'per_page': per_page,
+        'next_cursor': next_cursor
+    }
+    # Общее число - только по запросу и из кэша
+    if with_total:
+        result['total'] = material_counts.get(('api_materials',), query)
+    return with_validators(jsonify(result), etag)
+
+@app.route('/api/search')
+@read_only_endpoint
+def api_search():
+    """
+    Поиск по формуле, названию, IUPAC-названию, тегам и ссылкам (q) с теми же
+    фильтрами, что и browse. Результаты упорядочены по релевантности.
+    """
+    text = request.args.get('q', '').strip()
+    per_page = request.args.get('per_page', app.config['MATERIALS_PER_PAGE'], type=int)
+    per_page = max(1, min(per_page, app.config['MATERIALS_MAX_PER_PAGE']))
+    cursor = request.args.get('cursor') or None
+    filters = browse_filters(request.args)
+    
+    etag = make_etag('api_search', materials_version(db.session), query_version())
+    if is_not_modified(etag):
+        return not_modified(etag)
+    
+    query, rank = search_query(text, **filters)
+    try:
+        if query is not None:
+            materials, ranks, next_cursor = rank_page(query, rank, Material.id, per_page, cursor)
+        else:
+            materials, next_cursor = keyset_page(browse_query(text, **filters), Material, per_page, cursor)
+            ranks = [None] * len(materials)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    results = []
+    for material, score in zip(materials, ranks):
+        item = material.to_dict()
+        item['rank'] = score
+        results.append(item)
+    return with_validators(jsonify({
+        'query': text,
+        'ranked': query is not None,
+        'materials': results,
+        'per_page': per_page,
+        'next_cursor': next_cursor
+    }), etag)
 
 @app.route('/api/material/<int:material_id>')
+@read_only_endpoint
 def api_material_detail(material_id):
-    material = Material.query.get_or_404(material_id)
-    
-    if not material.is_public:
+    version = material_version(material_id)
+    if not version.is_public:
         return jsonify({'error': 'Material is not public'}), 403
     
+    # Все поля ответа меняются только вместе с updated_at. Счетчиков views и
+    # downloads в ответе нет: буфер счетчиков пишет их, не меняя updated_at,
+    # и 304 с этим ETag отдавал бы устаревшие значения
+    etag = make_etag('api_material', material_id, version.updated_at)
+    if is_not_modified(etag, version.updated_at):
+        return not_modified(etag, version.updated_at)
+    
+    material = Material.query.get_or_404(material_id)
     result = material.to_dict()
     
     # Добавляем детали
@@ -551,16 +980,101 @@ def api_material_detail(material_id):
     }
     
     result.update(details)
-    return jsonify(result)
+    return with_validators(jsonify(result), etag, material.updated_at)
+
+@app.route('/api/material/<int:material_id>/bands')
+@read_only_endpoint
+def api_material_bands(material_id):
+    """
+    Зонная структура одним trace (зоны разделены null) для интерактивного
+    графика: диапазон k от kmin до kmax, прореженный до px точек на зону
+    """
+    version = material_version(material_id, Material.band_structure_path)
+    if not version.is_public and not current_user.is_authenticated:
+        return jsonify({'error': 'Material is not public'}), 403
+    
+    # Путь к .npy содержит хэш данных; старые данные в JSON меняются вместе с updated_at
+    etag = make_etag('bands', material_id, tuple(version), query_version())
+    if is_not_modified(etag, version.updated_at):
+        return not_modified(etag, version.updated_at)
+    
+    material = Material.query.get_or_404(material_id)
+    data = get_band_data(material)
+    if not data:
+        return jsonify({'error': 'Band structure is not available'}), 404
+    
+    px = max(50, min(request.args.get('px', BandStructureVisualizer.INTERACTIVE_PX, type=int), 4000))
+    x, y, full_resolution = band_window(
+        data['kpoints'], data['energies'],
+        kmin=request.args.get('kmin', type=float),
+        kmax=request.args.get('kmax', type=float),
+        px=px, max_points=BandStructureVisualizer.INTERACTIVE_MAX_POINTS,
+        levels=get_levels(material.band_structure_path)
+    )
+    return with_validators(jsonify({'x': json_points(x), 'y': json_points(y), 'full_resolution': full_resolution}),
+                           etag, version.updated_at)
+
+@app.route('/api/material/<int:material_id>/dos')
+@read_only_endpoint
+def api_material_dos(material_id):
+    """
+    Окно DOS от emin до emax с уровня детализации, где в него попадает не
+    больше px точек: для каждой энергии - min и max каждого канала.
+    format=binary - float32 построчно: энергия, min каналов, max каналов.
+    """
+    version = material_version(material_id, Material.dos_path)
+    if not version.is_public and not current_user.is_authenticated:
+        return jsonify({'error': 'Material is not public'}), 403
+    
+    etag = make_etag('dos', material_id, tuple(version), query_version())
+    if is_not_modified(etag, version.updated_at):
+        return not_modified(etag, version.updated_at)
+    
+    material = Material.query.get_or_404(material_id)
+    data = get_dos_data(material)
+    if not data:
+        return jsonify({'error': 'DOS is not available'}), 404
+    
+    px = max(50, min(request.args.get('px', DOSVisualizer.INTERACTIVE_PX, type=int), 4000))
+    level, energy, minimum, maximum = DOSVisualizer.window(
+        data, levels=get_levels(material.dos_path),
+        emin=request.args.get('emin', type=float),
+        emax=request.args.get('emax', type=float),
+        px=px
+    )
+    names = ['total_dos'] + list(data.get('partial_dos') or {})
+    
+    if request.args.get('format') == 'binary':
+        body = np.vstack([np.asarray(energy, dtype=np.float32)[None, :],
+                          np.asarray(minimum, dtype=np.float32),
+                          np.asarray(maximum, dtype=np.float32)])
+        response = Response(np.ascontiguousarray(body, dtype='<f4').tobytes(),
+                            mimetype='application/octet-stream')
+        response.headers['X-LOD-Level'] = str(level)
+        response.headers['X-Shape'] = f'{body.shape[0]},{body.shape[1]}'
+        response.headers['X-Channels'] = json.dumps(names)
+        return with_validators(response, etag, version.updated_at)
+    
+    channels = [{'min': json_points(minimum[i]), 'max': json_points(maximum[i])}
+                for i in range(len(names))]
+    for channel, name in zip(channels[1:], names[1:]):
+        channel['name'] = name
+    return with_validators(jsonify({
+        'level': level,
+        'full_resolution': level == 0,
+        'energy': json_points(energy),
+        'total_dos': channels[0],
+        'partial_dos': channels[1:],
+    }), etag, version.updated_at)
 
 @app.route('/api/stats')
+@read_only_endpoint
 def api_stats():
-    return jsonify({
-        'total_materials': Material.query.count(),
-        'fm_materials': Material.query.filter_by(magnetic_order='FM').count(),
-        'afm_materials': Material.query.filter_by(magnetic_order='AFM').count(),
-        'verified_materials': Material.query.filter_by(is_verified=True).count()
-    })
+    stats = catalog_stats()
+    etag = make_etag('api_stats', json.dumps(stats, sort_keys=True))
+    if is_not_modified(etag):
+        return not_modified(etag)
+    return with_validators(jsonify(stats), etag)
 
 # Аутентификация
 @app.route('/login', methods=['GET', 'POST'])
@@ -726,6 +1240,9 @@ def edit_material(material_id):
         material.reference = form.reference.data or None
         
         # Handle file uploads (similar to add_material)
+        replaced_structures = [path for path, upload in ((material.cif_file_path, form.cif_file.data),
+                                                         (material.poscar_file_path, form.poscar_file.data))
+                               if path and upload]
         if form.cif_file.data:
             cif_filename = secure_filename(f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{form.cif_file.data.filename}")
             form.cif_file.data.save(
@@ -740,6 +1257,15 @@ def edit_material(material_id):
             )
             material.poscar_file_path = os.path.join('static/uploads/poscar', poscar_filename)
         
+        # Band structure / DOS uploads are stored as binary arrays
+        stale_images, old_spectra = save_spectra_uploads(material, form)
+        
+        # Structure or spectra changed - re-render their images in the background
+        if form.cif_file.data or form.poscar_file.data:
+            stale_images += ['structure_image_path', 'reciprocal_lattice_image_path']
+        if stale_images:
+            enqueue_render(material, fields=stale_images)
+        
         # Update tags
         if form.tags.data:
             tags_list = [tag.strip() for tag in form.tags.data.split(',')]
@@ -747,6 +1273,10 @@ def edit_material(material_id):
         
         material.updated_at = datetime.utcnow()
         db.session.commit()
+        for path in old_spectra:
+            remove_spectra(path)
+        for path in replaced_structures:
+            structure_cache.forget(path)
         
         flash('Материал успешно обновлен!', 'success')
         return redirect(url_for('material_detail', material_id=material.id))
@@ -787,56 +1317,44 @@ def delete_material(material_id):
         flash('Вы не можете удалить этот материал.', 'danger')
         return redirect(url_for('material_detail', material_id=material_id))
     
+    spectra = (material.band_structure_path, material.dos_path)
+    structures = [path for path in (material.cif_file_path, material.poscar_file_path) if path]
     db.session.delete(material)
     db.session.commit()
-    
+    # Папки .npy удаляются после commit, как и при замене данных в edit_material
+    for path in spectra:
+        remove_spectra(path)
+    for path in structures:
+        structure_cache.forget(path)
+
     flash('Материал успешно удален!', 'success')
     return redirect(url_for('profile'))
 
 # Экспорт данных
 @app.route('/export/csv')
+@read_only_endpoint
 def export_csv():
-    materials = Material.query.filter_by(is_public=True).all()
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Заголовки
-    writer.writerow([
-        'ID', 'Formula', 'Name', 'Crystal System', 'Space Group',
-        'Band Gap (eV)', 'Band Gap Type', 'Magnetic Order',
-        'Magnetic Moment (μB)', 'Curie Temperature (K)',
-        'Is Verified', 'Verification Score (%)', 'DOI', 'Created At'
-    ])
-    
-    # Данные
-    for m in materials:
-        writer.writerow([
-            m.id,
-            m.formula,
-            m.name or '',
-            m.crystal_system or '',
-            m.space_group or '',
-            f"{m.band_gap:.3f}" if m.band_gap is not None else '',
-            m.band_gap_type or '',
-            m.magnetic_order or '',
-            f"{m.magnetic_moment:.2f}" if m.magnetic_moment is not None else '',
-            f"{m.curie_temperature:.1f}" if m.curie_temperature is not None else '',
-            'Yes' if m.is_verified else 'No',
-            f"{m.verification_score:.1f}" if m.verification_score is not None else '',
-            m.doi or '',
-            m.created_at.strftime('%Y-%m-%d %H:%M:%S') if m.created_at else ''
-        ])
-    
-    output.seek(0)
-    csv_bytes = io.BytesIO(output.getvalue().encode('utf-8'))
-    
-    return send_file(
-        csv_bytes,
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name='2d_materials_database.csv'
-    )
+    """CSV публичных материалов потоком; ?compression=gzip - сжатый .csv.gz"""
+    chunks = iter_csv(db.session, Material.__table__)
+    filename = '2d_materials_database.csv'
+    mimetype = 'text/csv'
+    if request.args.get('compression') == 'gzip':
+        chunks = gzip_stream(chunks)
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    return Response(stream_with_context(chunks), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@app.route('/export/<any(parquet, arrow):fmt>')
+@read_only_endpoint
+def export_table(fmt):
+    """Все числовые свойства публичных материалов в Parquet или потоке Arrow IPC"""
+    if not arrow_available():
+        return jsonify({'error': 'Parquet/Arrow export requires pyarrow'}), 501
+    filename = '2d_materials_database.parquet' if fmt == 'parquet' else '2d_materials_database.arrows'
+    mimetype = 'application/vnd.apache.parquet' if fmt == 'parquet' else 'application/vnd.apache.arrow.stream'
+    return Response(stream_with_context(iter_arrow(db.session, Material.__table__, fmt)), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
 
 
 @app.route('/admin/backup')
@@ -846,23 +1364,16 @@ def backup_database():
         flash('Access denied', 'danger')
         return redirect(url_for('index'))
     
-    import shutil
-    from datetime import datetime
-    
-    db_path = app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '')
-    backup_dir = os.path.join(app.root_path, 'backups')
-    os.makedirs(backup_dir, exist_ok=True)
-    
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    backup_path = os.path.join(backup_dir, f'backup_{timestamp}.db')
-    
+    # Копия снимается фоновым потоком; ход выполнения - на странице резервных копий
     try:
-        shutil.copy2(db_path, backup_path)
-        flash(f'Backup created: backup_{timestamp}.db', 'success')
+        if backups.start('backup'):
+            flash('Backup started', 'info')
+        else:
+            flash('Another backup or restore is in progress', 'warning')
     except Exception as e:
         flash(f'Backup failed: {str(e)}', 'danger')
     
-    return redirect(url_for('admin_dashboard'))
+    return redirect(url_for('list_backups'))
 
 
 @app.route('/admin/restore/<filename>')
@@ -872,30 +1383,61 @@ def restore_database(filename):
         flash('Access denied', 'danger')
         return redirect(url_for('index'))
     
-    import shutil
-    from datetime import datetime
-    
-    backup_dir = os.path.join(app.root_path, 'backups')
-    backup_path = os.path.join(backup_dir, filename)
-    
-    if not os.path.exists(backup_path):
+    if not backups.exists(filename):
         flash('Backup file not found', 'danger')
-        return redirect(url_for('admin_dashboard'))
-    
-    db_path = app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '')
+        return redirect(url_for('list_backups'))
     
     try:
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        pre_restore = db_path + f'.pre_restore_{timestamp}'
-        shutil.copy2(db_path, pre_restore)
-        
-        shutil.copy2(backup_path, db_path)
-        flash(f'Database restored from {filename}', 'success')
+        if backups.start('restore', filename):
+            flash(f'Restore from {filename} started', 'info')
+        else:
+            flash('Another backup or restore is in progress', 'warning')
     except Exception as e:
         flash(f'Restore failed: {str(e)}', 'danger')
     
-    return redirect(url_for('admin_dashboard'))
+    return redirect(url_for('list_backups'))
+
+
+@app.route('/admin/backup/status')
+@login_required
+def backup_status():
+    """Ход последнего резервного копирования или восстановления"""
+    if not current_user.is_admin():
+        return jsonify({'error': 'Access denied'}), 403
+    return jsonify(backups.status())
+
+
+@app.route('/admin/backups/<filename>')
+@login_required
+def download_backup(filename):
+    if not current_user.is_admin():
+        flash('Access denied', 'danger')
+        return redirect(url_for('index'))
+    if not backups.exists(filename):
+        abort(404)
+    return send_file(os.path.join(backups.folder, filename), as_attachment=True, download_name=filename)
+
+
+@app.route('/admin/counters')
+@login_required
+def counter_metrics():
+    """Состояние буфера счетчиков просмотров/скачиваний (задержка записи и т.д.)"""
+    if not current_user.is_admin():
+        return jsonify({'error': 'Access denied'}), 403
+    return jsonify(material_counters.metrics())
 
+@app.route('/admin/metrics')
+def prometheus_metrics():
+    """
+    Гистограммы запросов, SQL и отрисовки этого процесса в формате Prometheus.
+    Доступ: администратор или заголовок Authorization: Bearer <METRICS_TOKEN>.
+    """
+    token = app.config['METRICS_TOKEN']
+    header = request.headers.get('Authorization', '')
+    if not (current_user.is_authenticated and current_user.is_admin()) and not (
+            token and secrets.compare_digest(header, f'Bearer {token}')):
+        return Response('Access denied\n', status=403, mimetype='text/plain')
+    return Response(metrics.expose(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 @app.route('/admin/backups')
 @login_required
@@ -904,23 +1446,391 @@ def list_backups():
         flash('Access denied', 'danger')
         return redirect(url_for('index'))
     
-    backup_dir = os.path.join(app.root_path, 'backups')
-    os.makedirs(backup_dir, exist_ok=True)
-    
-    backups = []
-    if os.path.exists(backup_dir):
-        for f in sorted(os.listdir(backup_dir), reverse=True):
-            if f.endswith('.db'):
-                filepath = os.path.join(backup_dir, f)
-                size = os.path.getsize(filepath)
-                mtime = os.path.getmtime(filepath)
-                backups.append({
-                    'name': f,
-                    'size': size,
-                    'mtime': datetime.fromtimestamp(mtime).strftime('%Y-%m-%d %H:%M:%S')
-                })
-    
-    return render_template('backups.html', backups=backups)
+    backup_list = backups.list()
+    for backup in backup_list:
+        backup['mtime'] = datetime.fromtimestamp(backup['mtime']).strftime('%Y-%m-%d %H:%M:%S')
+    
+    return render_template('backups.html', backups=backup_list, backup_status=backups.status())
+
+
+@app.cli.command('clear-render-cache')
+def clear_render_cache():
+    """Очищает дисковый кэш отрисованных изображений"""
+    render_cache.clear()
+    print('Render cache cleared')
+
+
+def claim_render_job(max_attempts):
+    """Атомарно забирает следующее задание из очереди (None, если очередь пуста)"""
+    while True:
+        job = RenderJob.query.filter(
+            RenderJob.status == 'pending',
+            RenderJob.attempts < max_attempts
+        ).order_by(RenderJob.id).first()
+        if job is None:
+            return None
+        
+        # UPDATE ... WHERE status = 'pending' не даст двум воркерам взять одно задание
+        claimed = RenderJob.query.filter_by(id=job.id, status='pending').update({
+            'status': 'running',
+            'attempts': RenderJob.attempts + 1,
+            'started_at': datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            db.session.refresh(job)
+            return job
+
+
+def render_worker_heartbeat(name):
+    """Отметка живого render-worker (см. render_in_progress)"""
+    worker = db.session.get(RenderWorker, name)
+    if worker is None:
+        worker = RenderWorker(name=name)
+        db.session.add(worker)
+    worker.heartbeat_at = datetime.utcnow()
+    db.session.commit()
+
+
+def finish_render_job(job_id, future, max_attempts):
+    """Сохраняет результат задания и пути к изображениям в Material"""
+    job = db.session.get(RenderJob, job_id)
+    job.finished_at = datetime.utcnow()
+    
+    try:
+        results, errors, duration = future.result()
+    except Exception as e:
+        results, errors = {}, [f'{type(e).__name__}: {e}']
+        duration = (job.finished_at - job.started_at).total_seconds()
+    
+    # Удачные изображения сохраняем даже при частичной ошибке
+    if results and job.material_id:
+        values = {column: os.path.join(app.config['RENDER_CACHE_FOLDER'], rel)
+                  for column, rel in results.items()}
+        # updated_at не трогаем: изменились только производные изображения
+        values['updated_at'] = Material.updated_at
+        Material.query.filter_by(id=job.material_id).update(values, synchronize_session=False)
+    
+    job.duration = duration
+    if errors:
+        job.error = '; '.join(errors)
+        job.status = 'pending' if job.attempts < max_attempts else 'failed'
+        print(f"Render job {job.id} (material {job.material_id}) failed: {job.error}")
+    else:
+        job.status = 'done'
+        job.error = None
+    
+    db.session.commit()
+
+
+@app.cli.command('render-worker')
+@click.option('--processes', default=os.cpu_count() or 1, show_default=True,
+              help='Number of render processes')
+@click.option('--poll-interval', default=2.0, show_default=True,
+              help='Seconds between queue polls when idle')
+@click.option('--max-attempts', default=3, show_default=True,
+              help='Attempts before a job is marked failed')
+@click.option('--stale-after', default=3600, show_default=True,
+              help='Requeue jobs left running by a dead worker after this many seconds')
+@click.option('--once', is_flag=True, help='Drain the current queue and exit')
+def render_worker(processes, poll_interval, max_attempts, stale_after, once):
+    """Фоновая отрисовка изображений материалов из очереди RenderJob"""
+    import socket
+    from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+    
+    stale = RenderJob.query.filter(
+        RenderJob.status == 'running',
+        RenderJob.started_at < datetime.utcnow() - timedelta(seconds=stale_after)
+    ).update({'status': 'pending'}, synchronize_session=False)
+    db.session.commit()
+    if stale:
+        print(f'Requeued {stale} stale render jobs')
+    
+    print(f'Render worker started with {processes} processes')
+    name = f'{socket.gethostname()}:{os.getpid()}'
+    heartbeat_interval = app.config['RENDER_WORKER_TIMEOUT'] / 4
+    last_heartbeat = None
+    running = {}
+    try:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            while True:
+                if last_heartbeat is None or time.monotonic() - last_heartbeat >= heartbeat_interval:
+                    render_worker_heartbeat(name)
+                    last_heartbeat = time.monotonic()
+                
+                while len(running) < processes:
+                    job = claim_render_job(max_attempts)
+                    if job is None:
+                        break
+                    if job.material is None:
+                        job.status = 'failed'
+                        job.error = 'Material no longer exists'
+                        job.finished_at = datetime.utcnow()
+                        db.session.commit()
+                        continue
+                    future = pool.submit(render_material_images, render_payload(job.material))
+                    running[future] = job.id
+                
+                if not running:
+                    if once:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+                
+                done, _ = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finish_render_job(running.pop(future), future, max_attempts)
+                # Не держим открытую транзакцию между опросами очереди
+                db.session.remove()
+    finally:
+        db.session.rollback()
+        RenderWorker.query.filter_by(name=name).delete()
+        db.session.commit()
+
+
+def insert_import_batch(results, user_id, is_public, render):
+    """Одна транзакция: материалы, записи ImportedFile, задания отрисовки, счетчики"""
+    from collections import Counter
+    
+    rows = []
+    for result in results:
+        values = dict(result['values'], user_id=user_id)
+        values.setdefault('is_public', is_public)
+        rows.append(values)
+    ids = db.session.scalars(
+        db.insert(Material).returning(Material.id, sort_by_parameter_order=True), rows
+    ).all()
+    db.session.execute(db.insert(ImportedFile), [
+        {'sha256': result['sha256'], 'source_path': result['path'][:500], 'material_id': material_id}
+        for result, material_id in zip(results, ids)
+    ])
+    if render:
+        db.session.execute(db.insert(RenderJob), [{'material_id': material_id} for material_id in ids])
+    # Массовая вставка идет мимо событий сессии - счетчики каталога обновляем сами
+    deltas = Counter({VERSION_KEY: 1})
+    for values in rows:
+        deltas.update(material_keys(values.get('is_verified'), values.get('magnetic_order'),
+                                    values.get('crystal_system')))
+    add_to_stats(db.session.connection(), deltas)
+    db.session.commit()
+
+
+@app.cli.command('import-materials')
+@click.argument('source', type=click.Path(exists=True))
+@click.option('--processes', default=os.cpu_count() or 1, show_default=True,
+              help='Number of parsing processes')
+@click.option('--batch-size', default=500, show_default=True,
+              help='Materials inserted per transaction')
+@click.option('--user', 'username', default='admin', show_default=True,
+              help='Owner of the imported materials')
+@click.option('--private', is_flag=True, help='Import materials as not public')
+@click.option('--no-render', is_flag=True, help='Do not queue image rendering')
+@click.option('--error-log', type=click.Path(dir_okay=False, writable=True),
+              help='Write per-file errors to this CSV file')
+def import_materials(source, processes, batch_size, username, private, no_render, error_log):
+    """
+    Импорт файлов CIF/POSCAR из каталога или манифеста (.csv/.json/.jsonl)
+    со свойствами из манифеста или файлов X.json/X.csv рядом со структурой.
+    Уже импортированные файлы (по хэшу содержимого) пропускаются, поэтому
+    прерванный импорт продолжается повторным запуском.
+    """
+    import csv
+    from concurrent.futures import ProcessPoolExecutor
+    
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.ClickException(f'User not found: {username}')
+    user_id = user.id
+    
+    started = time.perf_counter()
+    entries = collect_sources(source)
+    known = set(db.session.scalars(db.select(ImportedFile.sha256)))
+    db.session.remove()
+    upload_folder = os.path.join(app.root_path, app.config['UPLOAD_FOLDER'])
+    tasks = []
+    skipped = 0
+    errors = []
+    for path, properties in entries:
+        try:
+            digest = file_sha256(path)
+        except OSError as e:
+            errors.append((path, f'{type(e).__name__}: {e}'))
+            continue
+        if digest in known:
+            skipped += 1
+            continue
+        known.add(digest)
+        tasks.append({'path': path, 'sha256': digest, 'properties': properties,
+                      'upload_folder': upload_folder})
+    print(f'{len(entries)} files found, {skipped} already imported, {len(tasks)} to import')
+    
+    imported = 0
+    batch = []
+    
+    def report():
+        elapsed = time.perf_counter() - started
+        done = imported + len(errors)
+        print(f'  {imported} imported, {len(errors)} errors, '
+              f'{done / elapsed if elapsed else 0:.1f} files/s')
+    
+    try:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            chunksize = max(1, min(64, len(tasks) // (processes * 4) or 1))
+            for result in pool.map(parse_structure_file, tasks, chunksize=chunksize):
+                if 'error' in result:
+                    errors.append((result['path'], result['error']))
+                    print(f"  error: {result['path']}: {result['error']}")
+                    continue
+                batch.append(result)
+                if len(batch) >= batch_size:
+                    insert_import_batch(batch, user_id, not private, not no_render)
+                    imported += len(batch)
+                    batch = []
+                    report()
+            if batch:
+                insert_import_batch(batch, user_id, not private, not no_render)
+                imported += len(batch)
+                batch = []
+    except KeyboardInterrupt:
+        db.session.rollback()
+        print(f'Interrupted: {imported} materials committed, run the command again to resume')
+        raise SystemExit(1)
+    finally:
+        if error_log and errors:
+            with open(error_log, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['path', 'error'])
+                writer.writerows(errors)
+    
+    elapsed = time.perf_counter() - started
+    print(f'Done in {elapsed:.1f} s: {imported} imported, {skipped} skipped, {len(errors)} errors, '
+          f'{(imported + len(errors)) / elapsed if elapsed else 0:.1f} files/s')
+
+
+@app.cli.command('build-spectra-lod')
+def build_spectra_lod():
+    """Строит пирамиды детализации для DOS и зон, сохраненных до их появления"""
+    built = 0
+    rows = db.session.execute(
+        db.select(Material.band_structure_path, Material.dos_path).where(
+            db.or_(Material.band_structure_path.isnot(None), Material.dos_path.isnot(None))
+        )
+    ).all()
+    for band_path, dos_path in rows:
+        for path, kind in ((band_path, 'bands'), (dos_path, 'dos')):
+            if path and os.path.isdir(path) and build_missing_levels(path, kind):
+                built += 1
+    print(f'Pyramids built for {built} data folders')
+
+
+def print_pages_progress(label):
+    """progress(remaining, total) для команд резервного копирования"""
+    def progress(remaining, total):
+        print(f'\r{label}: {total - remaining}/{total} pages', end='' if remaining else '\n', flush=True)
+    return progress
+
+
+@app.cli.command('backup-db')
+@click.option('--compression', type=click.Choice(list(COMPRESSION_SUFFIXES)),
+              help='Default: BACKUP_COMPRESSION')
+def backup_db(compression):
+    """Резервная копия базы SQLite (для cron); лишние старые копии удаляются"""
+    started = time.perf_counter()
+    try:
+        name = backups.backup(compression=compression, progress=print_pages_progress('Backup'))
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    size = os.path.getsize(os.path.join(backups.folder, name))
+    print(f'{name}: {size / 2**20:.1f} MB in {time.perf_counter() - started:.1f} s')
+
+
+@app.cli.command('restore-db')
+@click.argument('filename')
+def restore_db(filename):
+    """Восстанавливает базу из резервной копии (текущая база сохраняется)"""
+    if not backups.exists(filename):
+        raise click.ClickException(f'Backup not found: {filename}')
+    pre_restore = backups.restore(filename, progress=print_pages_progress('Restore'))
+    print(f'Restored from {filename}; previous database saved as {pre_restore}')
+
+
+@app.cli.command('render-status')
+def render_status():
+    """Состояние очереди фоновой отрисовки"""
+    counts = dict(db.session.query(RenderJob.status, db.func.count(RenderJob.id))
+                  .group_by(RenderJob.status).all())
+    for status in ('pending', 'running', 'done', 'failed'):
+        print(f'{status:>8}: {counts.get(status, 0)}')
+    
+    now = datetime.utcnow()
+    for worker in RenderWorker.query.order_by(RenderWorker.name).all():
+        print(f'  worker {worker.name}: last heartbeat {(now - worker.heartbeat_at).total_seconds():.0f} s ago')
+    
+    avg_duration = db.session.query(db.func.avg(RenderJob.duration)).filter(
+        RenderJob.status == 'done'
+    ).scalar()
+    if avg_duration is not None:
+        print(f'Average render time: {avg_duration:.2f} s')
+    
+    failed = RenderJob.query.filter(RenderJob.error.isnot(None)).order_by(
+        RenderJob.finished_at.desc()
+    ).limit(10).all()
+    for job in failed:
+        print(f'  job {job.id} material {job.material_id} [{job.status}, '
+              f'{job.attempts} attempts]: {job.error}')
+
+
+
+@app.cli.command('db-info')
+def db_info():
+    """Фактические настройки подключений: PRAGMA SQLite, пул, реплика"""
+    for key, engine in db.engines.items():
+        name = key or 'primary'
+        print(f'{name}: {engine.url.render_as_string(hide_password=True)}')
+        with engine.connect() as connection:
+            if engine.dialect.name == 'sqlite':
+                for pragma in ('journal_mode', 'synchronous', 'mmap_size', 'busy_timeout'):
+                    value = connection.exec_driver_sql(f'PRAGMA {pragma}').scalar()
+                    print(f'  {pragma}: {value}')
+            else:
+                print(f'  server: {connection.exec_driver_sql("SELECT version()").scalar()}')
+        print(f'  pool: {engine.pool.status()}')
+
+
+@app.cli.command('reconcile-stats')
+def reconcile_stats_command():
+    """Пересчитывает счетчики каталога (CatalogStat) по таблицам material и user"""
+    changes = reconcile_stats(db.session)
+    for key, (old, new) in sorted(changes.items()):
+        print(f'{key}: {old} -> {new}')
+    print(f'Statistics reconciled, {len(changes)} counters corrected')
+
+
+@app.cli.command('check-translations')
+def check_translations():
+    """
+    Ключи без перевода в каждом языке (показываются по-английски) и ключи
+    t('...') из шаблонов, которых нет ни в одном каталоге
+    """
+    import re
+    
+    for language, catalog in CATALOGS.items():
+        if catalog.missing:
+            print(f'{language}: {len(catalog.missing)} keys fall back to {DEFAULT_LANGUAGE}: '
+                  f'{", ".join(sorted(catalog.missing))}')
+    
+    used = set()
+    key_pattern = re.compile(r"""\bt\(\s*['"]([^'"]+)['"]\s*\)""")
+    templates_folder = os.path.join(app.root_path, app.template_folder)
+    for root, dirs, files in os.walk(templates_folder):
+        for filename in files:
+            if filename.endswith('.html'):
+                with open(os.path.join(root, filename), encoding='utf-8') as f:
+                    used.update(key_pattern.findall(f.read()))
+    unknown = sorted(key for key in used if key not in CATALOGS[DEFAULT_LANGUAGE])
+    print(f'{len(used)} keys used in templates, {len(unknown)} unknown')
+    if unknown:
+        raise click.ClickException(f'Keys without any translation: {", ".join(unknown)}')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,69 @@
+"""
+Размер HTML и время построения интерактивной зонной структуры:
+trace на каждую зону против одного trace с NaN-разрывами и LTTB.
+
+    python benchmarks/bench_bands.py [--kpoints 2000] [--bands 10 100 1000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.downsampling import band_window
+from utils.visualization import BandStructureVisualizer
+
+
+def synthetic_bands(n_kpoints, n_bands, seed=0):
+    """Зоны-косинусы с разной шириной и сдвигом по энергии на пути длиной 3"""
+    rng = np.random.default_rng(seed)
+    kpoints = np.linspace(0, 3, n_kpoints)
+    centers = np.linspace(-10, 10, n_bands)
+    widths = rng.uniform(0.2, 2.0, n_bands)
+    phases = rng.uniform(0, np.pi, n_bands)
+    energies = centers + widths * np.cos(2 * np.pi * kpoints[:, None] + phases)
+    return {'kpoints': kpoints, 'energies': energies,
+            'labels': {'G': 0.0, 'M': kpoints[n_kpoints // 2], 'K': 3.0}}
+
+
+def measure(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        html = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(html.encode('utf-8'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--kpoints', type=int, default=2000)
+    parser.add_argument('--bands', type=int, nargs='+', default=[10, 100, 1000])
+    args = parser.parse_args()
+
+    print(f'{args.kpoints} k-points per band')
+    print(f'{"bands":>6} {"mode":<14} {"time, ms":>9} {"HTML, KB":>10} {"zoom 10%, ms":>13}')
+    for n_bands in args.bands:
+        data = synthetic_bands(args.kpoints, n_bands)
+        cases = [
+            ('trace per band', lambda: BandStructureVisualizer.create_interactive_bands(data, single_trace=False)),
+            ('single trace', lambda: BandStructureVisualizer.create_interactive_bands(
+                data, zoom_url='/api/material/1/bands')),
+        ]
+        for name, fn in cases:
+            elapsed, size = measure(fn, repeat=1 if n_bands >= 1000 and name == 'trace per band' else 3)
+            zoom = ''
+            if name == 'single trace':
+                started = time.perf_counter()
+                band_window(data['kpoints'], data['energies'], kmin=1.0, kmax=1.3,
+                            max_points=BandStructureVisualizer.INTERACTIVE_MAX_POINTS)
+                zoom = f'{(time.perf_counter() - started) * 1000:.1f}'
+            print(f'{n_bands:>6} {name:<14} {elapsed * 1000:>9.1f} {size / 1024:>10.0f} {zoom:>13}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Задержка и пиковая память запросов списков материалов до и после профиля
+загрузки Material.summary(). "До" - полная загрузка строки вместе с
+тяжелыми колонками группы 'details', как было раньше.
+
+    python benchmarks/bench_browse.py [--rows 50000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from models import db, Material, User
+
+
+def create_app(db_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def populate(rows, seed=0):
+    """Материалы со скалярными свойствами и тяжелыми текстовыми колонками"""
+    rng = random.Random(seed)
+    user = User(username='bench', email='bench@example.com')
+    db.session.add(user)
+    db.session.commit()
+
+    started = datetime(2024, 1, 1)
+    wyckoff = json.dumps([{'element': 'Cr', 'site': '2c', 'xyz': [rng.random() for _ in range(3)]}] * 20)
+    elastic = json.dumps([[rng.uniform(0, 300) for _ in range(6)] for _ in range(6)])
+    batch = []
+    for i in range(rows):
+        batch.append({
+            'name': f'Material {i}',
+            'formula': rng.choice(['CrI3', 'CrBr3', 'Fe3GeTe2', 'MnBi2Te4', 'VSe2', 'NiPS3']),
+            'crystal_system': rng.choice(['Trigonal', 'Hexagonal', 'Monoclinic']),
+            'space_group': rng.choice(['R-3', 'P-3m1', 'C2/m']),
+            'band_gap': rng.uniform(0, 4),
+            'magnetic_order': rng.choice(['FM', 'AFM', 'ferrimagnetic', None]),
+            'magnetic_moment': rng.uniform(0, 6),
+            'curie_temperature': rng.uniform(0, 400),
+            'is_verified': rng.random() < 0.3,
+            'is_public': True,
+            'user_id': user.id,
+            'views': rng.randint(0, 10000),
+            'created_at': started + timedelta(minutes=i),
+            'wyckoff_positions': wyckoff,
+            'elastic_constants': elastic,
+            'reference': 'Author et al., Journal ' * 10,
+            'verification_notes': 'Checked convergence and k-point density. ' * 10,
+        })
+        if len(batch) == 5000:
+            db.session.execute(db.insert(Material), batch)
+            batch = []
+    if batch:
+        db.session.execute(db.insert(Material), batch)
+    db.session.commit()
+
+
+def measure(query_fn, repeat):
+    times = []
+    for _ in range(repeat):
+        db.session.remove()
+        t0 = time.perf_counter()
+        query_fn()
+        times.append(time.perf_counter() - t0)
+
+    # Память меряем отдельным прогоном: tracemalloc заметно замедляет код
+    db.session.remove()
+    tracemalloc.start()
+    query_fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            db.create_all()
+            populate(args.rows)
+
+            def browse_query(summary):
+                option = Material.summary() if summary else db.undefer_group('details')
+                return db.session.query(Material).options(option)\
+                    .filter(Material.is_public == True)\
+                    .order_by(Material.created_at.desc())
+
+            cases = [
+                ('browse page 1', lambda o: browse_query(o).limit(20).all()),
+                ('browse page 1000', lambda o: browse_query(o).offset(999 * 20).limit(20).all()),
+                ('api_materials per_page=100', lambda o: browse_query(o).limit(100).all()),
+                ('admin / export (all rows)', lambda o: browse_query(o).all()),
+            ]
+
+            print(f'{args.rows} materials')
+            print(f'{"query":<28} {"before, ms":>11} {"after, ms":>10} {"before, MB":>11} {"after, MB":>10}')
+            for name, fn in cases:
+                before_time, before_peak = measure(lambda: fn(False), args.repeat)
+                after_time, after_peak = measure(lambda: fn(True), args.repeat)
+                print(f'{name:<28} {before_time * 1000:>11.1f} {after_time * 1000:>10.1f} '
+                      f'{before_peak / 2**20:>11.1f} {after_peak / 2**20:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
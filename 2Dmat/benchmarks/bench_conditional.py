@@ -0,0 +1,95 @@
+"""
+Полный ответ против 304 Not Modified для опроса API и страницы материала:
+время запроса, размер тела и число SQL-запросов.
+
+    python benchmarks/bench_conditional.py [--materials 2000] [--requests 200]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TMP = tempfile.mkdtemp()
+# Приложение создает таблицы при импорте - во временной базе, а не в рабочей
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(TMP, 'bench.db')}"
+
+from sqlalchemy import event
+
+from app import app
+from models import db, Material, User
+from utils.spectra_storage import save_band_structure
+
+
+def populate(n_materials):
+    user = User.query.filter_by(username='admin').first()
+    rng = np.random.default_rng(0)
+    db.session.add_all(Material(
+        name=f'Material {i}', formula=f'Cr{i % 7 + 1}I{i % 5 + 2}', crystal_system='Trigonal',
+        space_group='R-3', band_gap=float(rng.uniform(0, 3)), magnetic_order='FM',
+        curie_temperature=float(rng.uniform(10, 300)), is_public=True, user_id=user.id,
+    ) for i in range(n_materials))
+    db.session.flush()
+
+    # Зонная структура для /api/material/<id>/bands
+    material = Material.query.order_by(Material.id).first()
+    kpoints = np.linspace(0, 3, 2000)
+    energies = np.linspace(-10, 10, 100) + np.cos(2 * np.pi * kpoints[:, None])
+    material.band_structure_path = save_band_structure(
+        app.config['BANDS_FOLDER'], material.id,
+        {'kpoints': kpoints, 'energies': energies, 'labels': {'G': 0.0, 'K': 3.0}})
+    db.session.commit()
+    return material.id
+
+
+def measure(client, url, requests, statements):
+    first = client.get(url)
+    etag = first.headers['ETag']
+    rows = []
+    for headers in ({}, {'If-None-Match': etag}):
+        statements.clear()
+        started = time.perf_counter()
+        for _ in range(requests):
+            response = client.get(url, headers=headers)
+        elapsed = (time.perf_counter() - started) / requests
+        rows.append((response.status_code, elapsed, len(response.data), len(statements) / requests))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--materials', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+    app.config['BANDS_FOLDER'] = os.path.join(TMP, 'bands')
+
+    statements = []
+    with app.app_context():
+        material_id = populate(args.materials)
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda *a, **kw: statements.append(None))
+
+    client = app.test_client()
+    urls = [
+        f'/api/material/{material_id}',
+        '/api/materials?per_page=100',
+        '/api/search?q=Material&per_page=50',
+        f'/api/material/{material_id}/bands',
+        f'/material/{material_id}',
+    ]
+    print(f'{args.materials} materials, {args.requests} requests per case')
+    print(f'{"URL":<36} {"status":>6} {"ms":>8} {"body, B":>9} {"SQL":>5} {"speedup":>8}')
+    for url in urls:
+        full, conditional = measure(client, url, args.requests, statements)
+        for row in (full, conditional):
+            status, elapsed, size, sql = row
+            speedup = f'{full[1] / elapsed:.1f}x' if row is conditional else ''
+            print(f'{url:<36} {status:>6} {elapsed * 1000:>8.2f} {size:>9} {sql:>5.1f} {speedup:>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Пиковая память и время до первого байта экспорта CSV: прежний вариант
+(.all() -> StringIO -> BytesIO) против потокового iter_csv.
+
+    python benchmarks/bench_export.py [--rows 200000]
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_browse import create_app, populate
+from models import db, Material
+from utils.export import CSV_HEADER, _csv_row, gzip_stream, iter_csv
+
+
+def export_all():
+    materials = Material.query.options(Material.summary()).filter_by(is_public=True).all()
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(CSV_HEADER)
+    for m in materials:
+        writer.writerow(_csv_row(m))
+    output.seek(0)
+    yield io.BytesIO(output.getvalue().encode('utf-8')).getvalue()
+
+
+def measure(make_chunks):
+    db.session.remove()
+    tracemalloc.start()
+    started = time.perf_counter()
+    first_byte = None
+    size = 0
+    for chunk in make_chunks():
+        if first_byte is None:
+            first_byte = time.perf_counter() - started
+        size += len(chunk)
+    total = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return first_byte, total, peak, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            db.create_all()
+            populate(args.rows)
+
+            cases = [
+                ('all() + StringIO', export_all),
+                ('streaming', lambda: iter_csv(db.session, Material.__table__)),
+                ('streaming + gzip', lambda: gzip_stream(iter_csv(db.session, Material.__table__))),
+            ]
+            print(f'{args.rows} materials')
+            print(f'{"export":<18} {"first byte, ms":>15} {"total, s":>9} {"peak, MB":>9} {"size, MB":>9}')
+            for name, fn in cases:
+                first_byte, total, peak, size = measure(fn)
+                print(f'{name:<18} {first_byte * 1000:>15.1f} {total:>9.2f} '
+                      f'{peak / 2**20:>9.1f} {size / 2**20:>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Время отрисовки material.html: прежний t() (сессия и Accept-Language
+разбираются при каждом вызове) против каталога языка, выбранного один раз
+за запрос.
+
+    python benchmarks/bench_material_render.py [--renders 500] [--comments 20]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TMP = tempfile.mkdtemp()
+# Приложение создает таблицы при импорте - во временной базе, а не в рабочей
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(TMP, 'bench.db')}"
+
+from flask import render_template, request, session
+
+from app import app
+from models import db, Comment, Material, User
+from translations import translations
+
+
+def legacy_t(key):
+    """t() из inject_translations до компиляции каталогов"""
+    lang = session.get('language', request.accept_languages.best_match(['en', 'ru']) or 'en')
+    return translations.get(lang, translations['en']).get(key, key)
+
+
+def populate(comments):
+    user = User.query.filter_by(username='admin').first()
+    material = Material(
+        name='Chromium(III) iodide', formula='CrI3', crystal_system='Trigonal', space_group='R-3',
+        band_gap=1.2, band_gap_type='indirect', magnetic_order='FM', magnetic_moment=3.0,
+        curie_temperature=45.0, easy_axis='c', anisotropy_energy=0.65, formation_energy=-0.9,
+        exfoliation_energy=0.3, doi='10.1038/nature22391', tags='["ferromagnet", "2D"]',
+        is_public=True, user_id=user.id,
+    )
+    db.session.add(material)
+    db.session.flush()
+    for i in range(comments):
+        db.session.add(Comment(material_id=material.id, user_id=user.id, content=f'Comment {i}'))
+    db.session.commit()
+    return material.id
+
+
+def template_context(material_id):
+    """Контекст material_detail; загружается один раз, чтобы мерить только шаблон"""
+    material = db.session.get(Material, material_id)
+    comments = Comment.query.filter_by(material_id=material_id).all()
+    for comment in comments:
+        comment.user, comment.replies
+    return dict(material=material, structure_image=None, band_structure_image=None,
+                dos_image=None, render_pending=False, views=material.views or 0,
+                downloads=material.downloads or 0, is_bookmarked=False, comments=comments)
+
+
+def render(context, t=None):
+    if t is not None:
+        # Явно переданный контекст перекрывает значения context_processor
+        context = dict(context, t=t)
+    return render_template('material.html', **context)
+
+
+def measure(material_id, renders, language, t=None):
+    headers = {'Accept-Language': 'ru-RU,ru;q=0.9,en;q=0.8' if language == 'ru' else 'en-US,en;q=0.9'}
+    calls = 0
+
+    def counted(key):
+        nonlocal calls
+        calls += 1
+        return t(key)
+
+    with app.test_request_context(f'/material/{material_id}', headers=headers):
+        context = template_context(material_id)
+        render(context, t)  # прогрев: компиляция шаблона
+        if t is not None:
+            render(context, counted)
+        started = time.perf_counter()
+        for _ in range(renders):
+            render(context, t)
+        elapsed = (time.perf_counter() - started) / renders
+    return elapsed, calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--renders', type=int, default=500)
+    parser.add_argument('--comments', type=int, default=20)
+    args = parser.parse_args()
+
+    with app.app_context():
+        material_id = populate(args.comments)
+        print(f'material.html, {args.comments} comments, {args.renders} renders')
+        print(f'{"language":<9} {"t() calls":>10} {"before, ms":>11} {"after, ms":>10} {"speedup":>8}')
+        for language in ('en', 'ru'):
+            before, calls = measure(material_id, args.renders, language, legacy_t)
+            after, _ = measure(material_id, args.renders, language)
+            print(f'{language:<9} {calls:>10} {before * 1000:>11.3f} {after * 1000:>10.3f} {before / after:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main()
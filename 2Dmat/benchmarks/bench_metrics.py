@@ -0,0 +1,94 @@
+"""
+Стоимость сбора метрик на запрос: те же запросы с включенными и
+выключенными метриками (utils/metrics.py) и время одного наблюдения.
+
+    python benchmarks/bench_metrics.py [--requests 2000] [--rounds 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TMP = tempfile.mkdtemp()
+# Приложение создает таблицы при импорте - во временной базе, а не в рабочей
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(TMP, 'bench.db')}"
+
+from app import app
+from models import db, Material, User
+from utils.metrics import metrics, request_duration
+
+
+def populate(n_materials=100):
+    user = User.query.filter_by(username='admin').first()
+    db.session.add_all(Material(name=f'Material {i}', formula=f'Cr{i % 7 + 1}I3', is_public=True,
+                                user_id=user.id) for i in range(n_materials))
+    db.session.commit()
+    return Material.query.order_by(Material.id).first().id
+
+
+def per_request(client, url, requests):
+    started = time.perf_counter()
+    for _ in range(requests):
+        client.get(url)
+    return (time.perf_counter() - started) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    with app.app_context():
+        material_id = populate()
+    client = app.test_client()
+    urls = ['/api/stats', f'/api/material/{material_id}', '/api/materials?per_page=20']
+
+    print(f'{args.requests} requests x {args.rounds} rounds, best round')
+    print(f'{"URL":<28} {"off, us":>9} {"on, us":>9} {"cost, us":>9} {"cost, %":>8}')
+    for url in urls:
+        best = {}
+        for _ in range(args.rounds):
+            # Раунды чередуются, чтобы дрейф частоты процессора делился поровну
+            for enabled in (False, True):
+                metrics.enabled = enabled
+                elapsed = per_request(client, url, args.requests)
+                best[enabled] = min(best.get(enabled, elapsed), elapsed)
+        cost = best[True] - best[False]
+        print(f'{url:<28} {best[False] * 1e6:>9.1f} {best[True] * 1e6:>9.1f} '
+              f'{cost * 1e6:>9.1f} {cost / best[False] * 100:>7.1f}%')
+
+    # Разница выше тонет в шуме; обработчики отдельно - нижняя оценка стоимости
+    n = 100000
+    metrics.enabled = True
+    hooks = {f.__name__: f for f in app.before_request_funcs[None] + app.after_request_funcs[None]}
+    with app.test_request_context('/api/stats'):
+        response = app.response_class()
+        started = time.perf_counter()
+        for _ in range(n):
+            hooks['start_request_timer']()
+            hooks['record_request_metrics'](response)
+        print(f'request hooks: {(time.perf_counter() - started) / n * 1e6:.1f} us per request')
+
+    per_statement = {}
+    with app.app_context(), db.engine.connect() as connection:
+        statement = db.text('SELECT 1')
+        for enabled in (False, True):
+            metrics.enabled = enabled
+            started = time.perf_counter()
+            for _ in range(n // 10):
+                connection.execute(statement)
+            per_statement[enabled] = (time.perf_counter() - started) / (n // 10)
+        print(f'SQL hooks: {(per_statement[True] - per_statement[False]) * 1e6:.1f} us per statement')
+
+    started = time.perf_counter()
+    for _ in range(n):
+        request_duration.observe(0.012, 'bench', 'GET', 200)
+    print(f'Histogram.observe: {(time.perf_counter() - started) / n * 1e9:.0f} ns')
+
+
+if __name__ == '__main__':
+    main()
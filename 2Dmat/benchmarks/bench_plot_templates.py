@@ -0,0 +1,158 @@
+"""
+Время PNG зонной структуры и DOS: новая фигура на каждое изображение
+(tight_layout и bbox_inches='tight', как до utils/plot_templates.py) против
+шаблона фигуры, в котором меняются только данные. Серия изображений с
+разными данными, как при перерисовке всего каталога. Отдельно - кодирование
+PNG готовых кадров: encode_png против Pillow с compress_level=1.
+
+    python benchmarks/bench_plot_templates.py [--renders 20] [--dpi 150]
+"""
+import argparse
+import base64
+import os
+import sys
+import time
+from io import BytesIO
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import matplotlib
+import numpy as np
+from PIL import Image
+
+from catalog import synthetic_bands, synthetic_dos
+from utils.lod import build_levels
+from utils.plot_templates import encode_png
+from utils.spectra_storage import dos_channels
+from utils.visualization import BandStructureVisualizer, DOSVisualizer, new_figure, save_figure
+
+
+def legacy_band_plot(data, dpi, levels=None):
+    """create_band_structure_plot до шаблонов"""
+    kpoints = np.array(data['kpoints'])
+    energies = np.array(data['energies'])
+    labels = data['labels']
+    with new_figure(figsize=(12, 8)) as fig:
+        ax = fig.subplots()
+        for band in energies.T:
+            ax.plot(kpoints, band, 'b-', linewidth=1, alpha=0.7)
+        ax.axhline(y=0, color='r', linestyle='--', linewidth=1, alpha=0.7)
+        ax.set_xlabel('Волновой вектор', fontsize=14)
+        ax.set_ylabel('Энергия (эВ)', fontsize=14)
+        ax.set_title('Зонная структура', fontsize=16, pad=20)
+        positions = [position for position in labels.values() if position in kpoints]
+        ax.set_xticks(positions)
+        ax.set_xticklabels([f'${label}$' for label, position in labels.items() if position in kpoints],
+                           fontsize=12)
+        for position in positions:
+            ax.axvline(x=position, color='gray', linestyle=':', linewidth=0.5)
+        ax.grid(True, alpha=0.3)
+        ax.legend(['Зоны', 'Уровень Ферми'], loc='upper right')
+        fig.tight_layout()
+        return save_figure(fig, None, dpi)
+
+
+def legacy_dos_plot(data, dpi, levels):
+    """create_dos_plot до шаблонов (с той же огибающей каналов)"""
+    names = list(data['partial_dos'])
+    _, energy, channels = DOSVisualizer._plot_channels(data, levels, px=int(6 * dpi))
+    total_dos, partial_dos = channels[0], dict(zip(names, channels[1:]))
+    with new_figure(figsize=(14, 6)) as fig:
+        ax1, ax2 = fig.subplots(1, 2)
+        ax1.plot(total_dos, energy, 'b-', linewidth=2)
+        ax1.axhline(y=0, color='r', linestyle='--', linewidth=1)
+        ax1.fill_betweenx(energy, 0, total_dos, where=(total_dos > 0), alpha=0.3, color='blue')
+        ax1.set_xlabel('Плотность состояний', fontsize=12)
+        ax1.set_ylabel('Энергия (эВ)', fontsize=12)
+        ax1.set_title('Общая плотность состояний', fontsize=14)
+        ax1.grid(True, alpha=0.3)
+        colors = matplotlib.colormaps['tab10'](np.linspace(0, 1, len(partial_dos)))
+        for color, (orbital, dos_values) in zip(colors, partial_dos.items()):
+            ax2.plot(dos_values, energy, label=orbital, color=color, linewidth=2)
+            ax2.fill_betweenx(energy, 0, dos_values, where=(dos_values > 0), alpha=0.3, color=color)
+        ax2.axhline(y=0, color='r', linestyle='--', linewidth=1)
+        ax2.set_xlabel('Плотность состояний', fontsize=12)
+        ax2.set_ylabel('Энергия (эВ)', fontsize=12)
+        ax2.set_title('Частичная плотность состояний', fontsize=14)
+        ax2.legend(loc='best')
+        ax2.grid(True, alpha=0.3)
+        fig.suptitle('Плотность состояний', fontsize=16, y=1.02)
+        fig.tight_layout()
+        return save_figure(fig, None, dpi)
+
+
+def per_render(fn, datasets, dpi):
+    started = time.perf_counter()
+    for data, levels in datasets:
+        if fn(data, dpi, levels) is None:
+            raise RuntimeError('Rendering failed')
+    return (time.perf_counter() - started) / len(datasets)
+
+
+def pillow_png(rgba, dpi, mode):
+    buffer = BytesIO()
+    Image.fromarray(rgba).convert(mode).save(buffer, format='png', dpi=(dpi, dpi), compress_level=1)
+    return buffer.getvalue()
+
+
+def per_encode(fn, frames):
+    started = time.perf_counter()
+    sizes = [len(fn(frame)) for frame in frames]
+    return (time.perf_counter() - started) / len(frames), sum(sizes) / len(sizes)
+
+
+def frame(data_uri):
+    """RGBA-кадр из строки data:image/png;base64"""
+    png = base64.b64decode(data_uri.split(',', 1)[1])
+    return np.asarray(Image.open(BytesIO(png)).convert('RGBA'))
+
+
+def compare_encoders(cases, dpi):
+    """Кадры шаблонов (RGBA, как buffer_rgba Agg) кодируются всеми способами"""
+    encoders = [
+        ('encode_png', lambda rgba: encode_png(rgba, dpi)),
+        ('Pillow RGB level 1', lambda rgba: pillow_png(rgba, dpi, 'RGB')),
+        ('Pillow RGBA level 1', lambda rgba: pillow_png(rgba, dpi, 'RGBA')),
+    ]
+    print(f'\n{"case":<22} {"encoder":<20} {"ms":>7} {"KiB":>7}')
+    for name, _, template, datasets in cases:
+        frames = [frame(template(data, dpi, levels)) for data, levels in datasets]
+        for encoder, fn in encoders:
+            seconds, size = per_encode(fn, frames)
+            print(f'{name:<22} {encoder:<20} {seconds * 1000:>7.1f} {size / 1024:>7.0f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--renders', type=int, default=20, help='Images per case, each with different data')
+    parser.add_argument('--dpi', type=int, default=150)
+    args = parser.parse_args()
+
+    template_band = lambda data, dpi, levels: BandStructureVisualizer.create_band_structure_plot(data, dpi=dpi)
+    template_dos = lambda data, dpi, levels: DOSVisualizer.create_dos_plot(data, dpi=dpi, levels=levels)
+    cases = [
+        (f'bands {k}k x {b}b', legacy_band_plot, template_band,
+         [(synthetic_bands(k, b, seed=seed), None) for seed in range(args.renders)])
+        for k, b in ((200, 10), (1000, 50), (2000, 200))
+    ]
+    for n in (2000, 200000):
+        datasets = [synthetic_dos(n, seed=seed) for seed in range(args.renders)]
+        # Пирамида огибающих хранится рядом с DOS (как у загруженных материалов)
+        datasets = [(data, build_levels(data['energy'], dos_channels(data))) for data in datasets]
+        cases.append((f'dos {n} points', legacy_dos_plot, template_dos, datasets))
+
+    print(f'{args.renders} images per case, dpi {args.dpi}')
+    print(f'{"case":<22} {"new figure, ms":>15} {"template, ms":>13} {"speedup":>8}')
+    for name, legacy, template, datasets in cases:
+        # Первый вызов строит шаблон - прогрев для обоих вариантов
+        legacy(datasets[0][0], args.dpi, datasets[0][1])
+        template(datasets[0][0], args.dpi, datasets[0][1])
+        before = per_render(legacy, datasets, args.dpi)
+        after = per_render(template, datasets, args.dpi)
+        print(f'{name:<22} {before * 1000:>15.1f} {after * 1000:>13.1f} {before / after:>7.1f}x')
+    compare_encoders(cases, args.dpi)
+
+
+if __name__ == '__main__':
+    main()
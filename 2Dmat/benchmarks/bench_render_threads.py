@@ -0,0 +1,110 @@
+"""
+Нагрузочная проверка визуализаторов в пуле потоков: структура, обратная
+решетка, зоны и DOS рисуются одновременно из нескольких потоков, часть
+вызовов падает уже после создания фигуры (неверная метка mathtext в
+шаблоне зон). Проверяется, что PNG из потоков совпадают с однопоточными
+(нет общего состояния между фигурами); каждые --sample-every рендеров
+печатается RSS и число живых Figure. Ограничения памяти и числа фигур
+проверяет tests/test_render_memory.py.
+
+    python benchmarks/bench_render_threads.py [--renders 10000] [--threads 8] [--dpi 60]
+"""
+import argparse
+import gc
+import hashlib
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from io import StringIO
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import numpy as np
+from matplotlib.figure import Figure
+
+from catalog import lattice_2d, synthetic_bands, synthetic_dos, write_structure
+from utils.visualization import BandStructureVisualizer, DOSVisualizer, StructureVisualizer
+
+
+def rss_mb():
+    """Текущий RSS процесса (Linux /proc), МБ"""
+    with open('/proc/self/statm') as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+def live_figures():
+    gc.collect()
+    return sum(isinstance(o, Figure) for o in gc.get_objects())
+
+
+def make_tasks(dpi, folder):
+    """(имя, функция) - разные данные, чтобы потоки рисовали разные фигуры"""
+    tasks = []
+    for seed in range(4):
+        bands = synthetic_bands(200, 10 + 10 * seed, seed=seed)
+        dos = synthetic_dos(2000, seed=seed)
+        cif = write_structure(os.path.join(folder, f'structure_{seed}.cif'),
+                              lattice_2d('MX2-2H' if seed % 2 else 'MX3', 'Cr', 'I', seed=seed))
+        tasks.append((f'bands_{seed}', lambda bands=bands: BandStructureVisualizer.create_band_structure_plot(
+            bands, dpi=dpi)))
+        tasks.append((f'dos_{seed}', lambda dos=dos: DOSVisualizer.create_dos_plot(dos, dpi=dpi)))
+        tasks.append((f'structure_{seed}', lambda cif=cif: StructureVisualizer.create_structure_plot(cif, dpi=dpi)))
+        tasks.append((f'reciprocal_{seed}', lambda cif=cif: StructureVisualizer.create_reciprocal_lattice_plot(
+            cif, dpi=dpi)))
+    # Метка разбирается mathtext при отрисовке: исключение в уже созданном шаблоне
+    broken = dict(synthetic_bands(200, 10), labels={'\\frac{': 0.0})
+    tasks.append(('broken', lambda: BandStructureVisualizer.create_band_structure_plot(broken, dpi=dpi)))
+    return tasks
+
+
+def digest(result):
+    return None if result is None else hashlib.sha256(result.encode()).hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--renders', type=int, default=10000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--dpi', type=int, default=60)
+    parser.add_argument('--sample-every', type=int, default=500)
+    args = parser.parse_args()
+
+    tasks = make_tasks(args.dpi, tempfile.mkdtemp(prefix='bench-render-threads-'))
+    # Эталон из одного потока; он же прогревает шрифты и кэши matplotlib
+    with redirect_stdout(StringIO()):
+        expected = {name: digest(fn()) for name, fn in tasks}
+    if expected['broken'] is not None or any(v is None for k, v in expected.items() if k != 'broken'):
+        raise RuntimeError('Unexpected single-threaded results')
+    baseline_rss = rss_mb()
+    print(f'{args.renders} renders, {args.threads} threads, dpi {args.dpi}; '
+          f'RSS after warm-up {baseline_rss:.1f} MB')
+    print(f'{"renders":>8} {"RSS, MB":>9} {"growth, MB":>11} {"figures":>8} {"renders/s":>10}')
+
+    mismatches = 0
+    done = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        while done < args.renders:
+            batch = min(args.sample_every, args.renders - done)
+            chosen = [tasks[(done + i) % len(tasks)] for i in range(batch)]
+            # Сообщения визуализаторов об ошибке (вызов 'broken') не печатаем
+            with redirect_stdout(StringIO()):
+                results = list(pool.map(lambda task: task[1](), chosen))
+            mismatches += sum(digest(result) != expected[name] for (name, _), result in zip(chosen, results))
+            done += batch
+            rss = rss_mb()
+            print(f'{done:>8} {rss:>9.1f} {rss - baseline_rss:>11.1f} {live_figures():>8} '
+                  f'{done / (time.perf_counter() - started):>10.1f}')
+
+    print(f'Results different from single-threaded: {mismatches}')
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
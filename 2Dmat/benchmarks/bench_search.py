@@ -0,0 +1,75 @@
+"""
+Время поиска материалов: FTS5 (search_query, первая страница по рангу)
+против прежнего formula ILIKE '%...%' с сортировкой по created_at.
+
+    python benchmarks/bench_search.py [--rows 100000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_browse import create_app, populate
+from models import db, Material
+from utils.search import create_search_index, match_expression, ranked_matches
+
+# (описание, строка поиска)
+CASES = (
+    ('rare name substring', 'Material 12345'),
+    ('formula substring', 'GeTe'),
+    ('full formula', 'MnBi2Te4'),
+    ('no matches', 'Xyzzy'),
+)
+
+
+def best_time(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        db.session.remove()
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--per-page', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            db.create_all()
+            with db.engine.begin() as connection:
+                create_search_index(connection)
+            populate(args.rows)
+
+            def base():
+                return db.session.query(Material).options(Material.summary()).filter(Material.is_public == True)
+
+            def like_page(text):
+                return base().filter(Material.formula.ilike(f'%{text}%'))\
+                    .order_by(Material.created_at.desc(), Material.id.desc()).limit(args.per_page).all()
+
+            def fts_page(text):
+                matches = ranked_matches(match_expression(text))
+                return base().join(matches, matches.c.id == Material.id).add_columns(matches.c.rank)\
+                    .order_by(matches.c.rank, Material.id).limit(args.per_page).all()
+
+            print(f'{args.rows} materials')
+            print(f'{"query":<22} {"matches":>8} {"ILIKE, ms":>10} {"FTS5, ms":>9}')
+            for name, text in CASES:
+                matches = db.session.query(ranked_matches(match_expression(text))).count()
+                like_time = best_time(lambda: like_page(text), args.repeat)
+                fts_time = best_time(lambda: fts_page(text), args.repeat)
+                print(f'{name:<22} {matches:>8} {like_time * 1000:>10.1f} {fts_time * 1000:>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Время StructureVisualizer.create_structure_plot в зависимости от числа атомов
+(подробный режим со сферами и быстрый режим scatter + Line3DCollection).
+Суперъячейки сохраняются в POSCAR: разбор больших CIF в ASE сам по себе
+занимает десятки секунд и заслонил бы время отрисовки.
+
+    python benchmarks/bench_structure_plot.py [--sizes 10 100 1000 5000] [--slow-limit 500]
+"""
+import argparse
+import math
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ase.io import read, write
+
+from utils.visualization import StructureVisualizer
+
+DATA_CIF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'CrBr3.cif')
+
+
+def make_supercell(unit, n_atoms):
+    """Суперъячейка в плоскости ab, обрезанная ровно до n_atoms атомов"""
+    reps = max(1, math.ceil(math.sqrt(n_atoms / len(unit))))
+    atoms = unit.repeat((reps, reps, 1))
+    del atoms[n_atoms:]
+    return atoms
+
+
+def time_render(structure_path, fast, dpi):
+    started = time.perf_counter()
+    with tempfile.NamedTemporaryFile(suffix='.png') as out:
+        result = StructureVisualizer.create_structure_plot(structure_path, out.name, dpi=dpi, fast=fast)
+    elapsed = time.perf_counter() - started
+    if result is None:
+        raise RuntimeError(f'Rendering failed for {structure_path}')
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 50, 100, 500, 1000, 2000, 5000])
+    parser.add_argument('--slow-limit', type=int, default=500,
+                        help='Skip the detailed mode above this many atoms')
+    parser.add_argument('--dpi', type=int, default=150)
+    args = parser.parse_args()
+
+    unit = read(DATA_CIF)
+    print(f'{"atoms":>6} {"detailed, s":>12} {"fast, s":>10} {"speedup":>8}')
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_atoms in args.sizes:
+            structure_path = os.path.join(tmp, f'supercell_{n_atoms}.vasp')
+            write(structure_path, make_supercell(unit, n_atoms), format='vasp')
+
+            fast = time_render(structure_path, True, args.dpi)
+            if n_atoms <= args.slow_limit:
+                slow = time_render(structure_path, False, args.dpi)
+                print(f'{n_atoms:>6} {slow:>12.2f} {fast:>10.2f} {slow / fast:>7.1f}x')
+            else:
+                print(f'{n_atoms:>6} {"-":>12} {fast:>10.2f} {"-":>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+"""
+Воспроизводимый синтетический каталог для бенчмарков: материалы с
+правдоподобными распределениями свойств, массивы зонной структуры и DOS
+и CIF двумерных решеток. Один и тот же seed дает тот же каталог.
+
+Строки вставляются пакетами мимо ORM (как import-materials), после чего
+индекс поиска и счетчики каталога пересчитываются. Массивы и CIF создаются только для
+первых --spectra и --structures материалов: 1M папок с .npy не нужны ни
+одному бенчмарку.
+
+    python benchmarks/catalog.py bench.db [--rows 100000] [--seed 0] [--spectra 200] [--structures 200]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ase import Atoms
+from ase.build import mx2
+from ase.io import write
+
+from models import db, Material, User
+from utils.catalog_stats import reconcile_stats
+from utils.search import create_search_index, drop_search_index
+from utils.spectra_storage import save_band_structure, save_dos
+
+BATCH_SIZE = 10000
+
+# Прототипы: (формула, кристаллическая система, пространственная группа, доля)
+METALS = ('Cr', 'V', 'Mn', 'Fe', 'Co', 'Ni', 'Mo', 'W', 'Nb', 'Ti')
+CHALCOGENS = ('S', 'Se', 'Te')
+HALOGENS = ('Cl', 'Br', 'I')
+PROTOTYPES = (
+    ('MX2-2H', 'Hexagonal', 'P-6m2', 0.35),
+    ('MX2-1T', 'Trigonal', 'P-3m1', 0.25),
+    ('MX3', 'Trigonal', 'R-3', 0.25),
+    ('MX3-C2/m', 'Monoclinic', 'C2/m', 0.15),
+)
+# None - немагнитный материал
+MAGNETIC_ORDERS = (('FM', 0.35), ('AFM', 0.25), ('ferrimagnetic', 0.05), (None, 0.35))
+TAGS = ('ferromagnet', 'antiferromagnet', 'semiconductor', 'metal', 'TMD', 'halide', 'topological', 'exfoliable')
+START_DATE = datetime(2023, 1, 1)
+
+
+def _choice(rng, options, n):
+    values = [option[0] for option in options]
+    weights = np.array([option[-1] for option in options], dtype=float)
+    return [values[i] for i in rng.choice(len(values), size=n, p=weights / weights.sum())]
+
+
+def material_rows(n, seed=0, user_id=None, offset=0):
+    """
+    n строк Material со свойствами из распределений, похожих на реальные
+    каталоги: у трети материалов нет щели, температуры Кюри/Нееля
+    логнормальны, число просмотров распределено по Ципфу
+    """
+    rng = np.random.default_rng(seed)
+    prototypes = [dict(zip(('name', 'crystal_system', 'space_group'), p[:3]))
+                  for p in (PROTOTYPES[i] for i in rng.choice(
+                      len(PROTOTYPES), size=n, p=[p[3] for p in PROTOTYPES]))]
+    metals = rng.choice(METALS, size=n)
+    chalcogens = rng.choice(CHALCOGENS, size=n)
+    halogens = rng.choice(HALOGENS, size=n)
+    orders = _choice(rng, MAGNETIC_ORDERS, n)
+
+    metallic = rng.random(n) < 0.3
+    band_gap = np.where(metallic, 0.0, np.clip(rng.lognormal(0.0, 0.6, n), 0.05, 6.0))
+    direct = rng.random(n) < 0.4
+    transition = np.clip(rng.lognormal(np.log(60), 0.9, n), 1, 1000)
+    moment = np.round(rng.uniform(0.5, 6.0, n), 2)
+    formation = rng.normal(-0.8, 0.4, n)
+    exfoliation = np.clip(rng.lognormal(np.log(20), 0.4, n), 5, 150)
+    verified = rng.random(n) < 0.25
+    score = rng.uniform(70, 100, n)
+    views = np.minimum(rng.zipf(1.8, n), 100000)
+    minutes = np.cumsum(rng.integers(1, 120, n))
+    tag_counts = rng.integers(0, 4, n)
+
+    rows = []
+    for i in range(n):
+        prototype = prototypes[i]
+        if prototype['name'].startswith('MX2'):
+            formula = f'{metals[i]}{chalcogens[i]}2'
+        else:
+            formula = f'{metals[i]}{halogens[i]}3'
+        order = orders[i]
+        magnetic = order is not None
+        rows.append({
+            'name': f"{formula} ({prototype['name']}) #{offset + i}",
+            'formula': formula,
+            'crystal_system': prototype['crystal_system'],
+            'space_group': prototype['space_group'],
+            'band_gap': round(float(band_gap[i]), 3),
+            'band_gap_type': None if metallic[i] else ('direct' if direct[i] else 'indirect'),
+            'magnetic_order': order,
+            'magnetic_moment': float(moment[i]) if magnetic else 0.0,
+            'curie_temperature': round(float(transition[i]), 1) if order in ('FM', 'ferrimagnetic') else None,
+            'neel_temperature': round(float(transition[i]), 1) if order == 'AFM' else None,
+            'formation_energy': round(float(formation[i]), 3),
+            'exfoliation_energy': round(float(exfoliation[i]), 2),
+            'calculation_method': 'DFT+U' if magnetic else 'DFT',
+            'functional': 'PBE',
+            'software': 'VASP',
+            'is_verified': bool(verified[i]),
+            'verification_score': round(float(score[i]), 1) if verified[i] else None,
+            'doi': f'10.1000/bench.{offset + i}' if i % 3 == 0 else None,
+            'tags': json.dumps(list(rng.choice(TAGS, size=tag_counts[i], replace=False))),
+            'views': int(views[i]),
+            'is_public': True,
+            'user_id': user_id,
+            'created_at': START_DATE + timedelta(minutes=int(minutes[i])),
+            'updated_at': START_DATE + timedelta(minutes=int(minutes[i])),
+        })
+    return rows
+
+
+def synthetic_bands(n_kpoints, n_bands, seed=0):
+    """Зоны-косинусы разной ширины на пути G-M-K-G длиной 3"""
+    rng = np.random.default_rng(seed)
+    kpoints = np.linspace(0, 3, n_kpoints)
+    centers = np.sort(rng.uniform(-10, 10, n_bands))
+    widths = rng.uniform(0.2, 2.0, n_bands)
+    phases = rng.uniform(0, np.pi, n_bands)
+    energies = centers + widths * np.cos(2 * np.pi * kpoints[:, None] + phases)
+    return {'kpoints': kpoints, 'energies': energies,
+            'labels': {'G': 0.0, 'M': 1.0, 'K': 2.0, "G'": 3.0}}
+
+
+def synthetic_dos(n_points, channels=('M-d', 'X-p', 'X-s'), seed=0):
+    """DOS - сумма уширенных пиков; total_dos - сумма частичных"""
+    rng = np.random.default_rng(seed)
+    energy = np.linspace(-10, 10, n_points)
+    partial = {}
+    for name in channels:
+        centers = rng.uniform(-9, 9, 12)
+        heights = rng.uniform(0.2, 2.0, 12)
+        widths = rng.uniform(0.05, 0.6, 12)
+        partial[name] = (heights * np.exp(-((energy[:, None] - centers) / widths) ** 2)).sum(axis=1)
+    total = np.sum(list(partial.values()), axis=0)
+    return {'energy': energy, 'total_dos': total, 'partial_dos': partial}
+
+
+def lattice_2d(formula_prototype, metal, anion, repeat=1, seed=0):
+    """
+    Монослой с вакуумом: MX2 (2H/1T) через ase.build.mx2, MX3 - сотовая
+    решетка металла с анионами над и под плоскостью. repeat - суперъячейка в ab.
+    """
+    rng = np.random.default_rng(seed)
+    if formula_prototype.startswith('MX2'):
+        kind = '2H' if formula_prototype.endswith('2H') else '1T'
+        atoms = mx2(formula=f'{metal}{anion}2', kind=kind, a=rng.uniform(3.1, 3.6), thickness=3.2, vacuum=9.0)
+    else:
+        # Идеализированный слой CrI3 (P-31m): анионы по три под и над металлами
+        a, dz = rng.uniform(6.0, 7.1), 0.078
+        scaled = [(1 / 3, 2 / 3, 0.5), (2 / 3, 1 / 3, 0.5),
+                  (0.36, 0.0, 0.5 - dz), (0.0, 0.36, 0.5 - dz), (0.64, 0.64, 0.5 - dz),
+                  (0.64, 0.0, 0.5 + dz), (0.0, 0.64, 0.5 + dz), (0.36, 0.36, 0.5 + dz)]
+        atoms = Atoms(f'{metal}2{anion}6', scaled_positions=scaled,
+                      cell=[[a, 0, 0], [-a / 2, a * np.sqrt(3) / 2, 0], [0, 0, 20.0]], pbc=True)
+    if repeat > 1:
+        atoms = atoms.repeat((repeat, repeat, 1))
+    return atoms
+
+
+def write_structure(path, atoms):
+    write(path, atoms, format='cif' if path.endswith('.cif') else 'vasp')
+    return path
+
+
+def attach_files(rows, ids, folder, spectra, structures, seed=0):
+    """
+    Массивы зонной структуры/DOS и CIF для первых spectra/structures
+    материалов; возвращает обновления путей {id: {колонка: путь}}
+    """
+    rng = np.random.default_rng(seed)
+    updates = {}
+    bands_folder = os.path.join(folder, 'bands')
+    dos_folder = os.path.join(folder, 'dos')
+    cif_folder = os.path.join(folder, 'cif')
+    os.makedirs(cif_folder, exist_ok=True)
+    for i, (row, material_id) in enumerate(zip(rows, ids)):
+        if i >= max(spectra, structures):
+            break
+        values = updates.setdefault(material_id, {})
+        if i < spectra:
+            n_kpoints = int(rng.choice([200, 500, 1000]))
+            n_bands = int(rng.choice([10, 30, 100]))
+            values['band_structure_path'] = save_band_structure(
+                bands_folder, material_id, synthetic_bands(n_kpoints, n_bands, seed=seed + i))
+            values['dos_path'] = save_dos(
+                dos_folder, material_id, synthetic_dos(int(rng.choice([1000, 5000, 20000])), seed=seed + i))
+        if i < structures:
+            prototype = re.search(r'\((.+)\)', row['name']).group(1)
+            metal, anion = re.match(r'([A-Z][a-z]?)([A-Z][a-z]?)\d', row['formula']).groups()
+            atoms = lattice_2d(prototype, metal, anion, repeat=int(rng.choice([1, 1, 2, 3])), seed=seed + i)
+            values['cif_file_path'] = write_structure(os.path.join(cif_folder, f'{material_id}.cif'), atoms)
+    return updates
+
+
+def populate(rows, seed=0, folder=None, spectra=200, structures=200, progress=None):
+    """
+    Добавляет rows материалов в базу текущего приложения (нужен app_context);
+    файлы пишутся в folder. Возвращает id созданных материалов.
+    Индекс FTS на время вставки удаляется и затем строится заново одним
+    проходом - триггеры на каждую строку замедляют вставку в разы.
+    """
+    user = User.query.filter_by(username='admin').first()
+    user_id = user.id if user else None
+    last_id = db.session.query(db.func.max(Material.id)).scalar() or 0
+    drop_search_index(db.session.connection())
+    db.session.commit()
+
+    first_rows = []
+    for offset in range(0, rows, BATCH_SIZE):
+        batch = material_rows(min(BATCH_SIZE, rows - offset), seed=seed + offset, user_id=user_id, offset=offset)
+        db.session.execute(db.insert(Material), batch)
+        db.session.commit()
+        if len(first_rows) < max(spectra, structures):
+            first_rows.extend(batch)
+        if progress is not None:
+            progress(min(offset + BATCH_SIZE, rows), rows)
+    # Генератор - единственный писатель, поэтому новые id идут подряд за last_id
+    ids = db.session.scalars(db.select(Material.id).where(Material.id > last_id).order_by(Material.id)).all()
+
+    if folder is not None and (spectra or structures):
+        updates = attach_files(first_rows, ids, folder, spectra, structures, seed=seed)
+        db.session.execute(db.update(Material), [dict(values, id=material_id)
+                                                 for material_id, values in updates.items()])
+        db.session.commit()
+    create_search_index(db.session.connection(), rebuild=True)
+    db.session.commit()
+    # Вставка шла мимо событий сессии
+    reconcile_stats(db.session)
+    return ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('database', help='SQLite file to create or extend')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--spectra', type=int, default=200, help='Materials with band/DOS arrays')
+    parser.add_argument('--structures', type=int, default=200, help='Materials with CIF files')
+    parser.add_argument('--files', help='Folder for arrays and CIFs (default: next to the database)')
+    args = parser.parse_args()
+
+    database = os.path.abspath(args.database)
+    folder = os.path.abspath(args.files or os.path.splitext(database)[0] + '_files')
+    # Приложение создает схему (включая FTS) при импорте
+    os.environ['DATABASE_URL'] = f'sqlite:///{database}'
+    from app import app
+
+    started = time.perf_counter()
+    with app.app_context():
+        populate(args.rows, args.seed, folder, args.spectra, args.structures,
+                 progress=lambda done, total: print(f'{done}/{total} materials, '
+                                                    f'{done / (time.perf_counter() - started):.0f} rows/s'))
+    print(f'Done in {time.perf_counter() - started:.1f} s: {database}, files in {folder}')
+
+
+if __name__ == '__main__':
+    main()
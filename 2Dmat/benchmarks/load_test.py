@@ -0,0 +1,334 @@
+"""
+Нагрузочный тест: N процессов-клиентов одновременно воспроизводят смесь
+запросов к реальным маршрутам app.py - browse со случайными фильтрами,
+страницы материалов, опрос API (с If-None-Match), экспорт CSV, закладки и
+комментарии от вошедшего пользователя. Для каждого маршрута выводятся
+пропускная способность, доля ошибок и p50/p95/p99.
+
+По умолчанию приложение запускается локально (многопоточный сервер
+Werkzeug) на синтетическом каталоге benchmarks/catalog.py во временной
+папке. --url направляет нагрузку на уже запущенный сервер (например,
+gunicorn): тест пишет в его базу закладки, комментарии и просмотры.
+
+    python benchmarks/load_test.py [--workers 1 4 16 32] [--duration 30] [--rows 5000]
+    python benchmarks/load_test.py --mix browse=50,detail=30,api=20 --think 0.5
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --user alice --password secret
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+DEFAULT_MIX = 'browse=35,detail=25,api=25,export=2,bookmark=8,comment=5'
+# Сценарии, которым нужен вошедший пользователь
+LOGGED_IN = ('bookmark', 'comment')
+
+MAGNETIC_ORDERS = ('', 'FM', 'AFM', 'ferrimagnetic')
+SEARCH_TERMS = ('', '', '', 'CrI3', 'Se2', 'VTe2', 'Br3', 'MoS2')
+CSRF_TOKEN = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+
+
+class NoRedirect(HTTPRedirectHandler):
+    """3xx записывается как ответ маршрута, а не как запрос к странице перехода"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class Client:
+    """Пользователь со своими cookie; записывает (маршрут, статус, секунды, байты)"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()), NoRedirect)
+        self.records = []
+        self.csrf_token = None
+        self.etags = {}
+
+    def request(self, route, path, data=None, headers=None):
+        body = data if data is None or isinstance(data, bytes) else urlencode(data).encode()
+        started = time.perf_counter()
+        try:
+            with self.opener.open(Request(self.base_url + path, data=body, headers=headers or {}),
+                                  timeout=120) as response:
+                status, content, response_headers = response.status, response.read(), response.headers
+        except HTTPError as e:
+            # urllib считает ошибкой и 3xx/304
+            status, content, response_headers = e.code, e.read(), e.headers
+        except (URLError, OSError):
+            status, content, response_headers = 0, b'', {}
+        self.records.append((route, status, time.perf_counter() - started, len(content)))
+        return status, content, response_headers
+
+    def login(self, username, password):
+        _, page, _ = self.request('GET /login', '/login')
+        match = CSRF_TOKEN.search(page.decode('utf-8', 'replace'))
+        if match is None:
+            raise RuntimeError('No CSRF token on /login')
+        # Токен Flask-WTF действует для всех форм этой сессии
+        self.csrf_token = match.group(1)
+        status, _, _ = self.request('POST /login', '/login', {
+            'csrf_token': self.csrf_token, 'username': username, 'password': password})
+        if status != 302:
+            raise RuntimeError(f'Login as {username} failed (HTTP {status})')
+
+
+# Сценарии: client, rng, ids
+
+def browse(client, rng, ids):
+    params = {}
+    if rng.random() < 0.5:
+        params['magnetic_order'] = rng.choice(MAGNETIC_ORDERS)
+    if rng.random() < 0.2:
+        params['verified_only'] = 'true'
+    if rng.random() < 0.3:
+        params['min_tc'] = rng.choice((20, 50, 100, 200))
+    if rng.random() < 0.3:
+        params['max_band_gap'] = rng.choice((0.5, 1, 2, 3))
+    if rng.random() < 0.3:
+        params['formula'] = rng.choice(SEARCH_TERMS)
+    client.request('GET /browse', '/browse?' + urlencode(params))
+
+
+def detail(client, rng, ids):
+    material_id = rng.choice(ids)
+    client.request('GET /material/<id>', f'/material/{material_id}')
+    if rng.random() < 0.1:
+        client.request('GET /material/<id>/visualization', f'/material/{material_id}/visualization')
+
+
+def api(client, rng, ids):
+    """Клиенты-сборщики опрашивают API, сохраняя ETag"""
+    choice = rng.random()
+    if choice < 0.4:
+        route, path = 'GET /api/materials', f"/api/materials?per_page={rng.choice((20, 100))}"
+    elif choice < 0.7:
+        route, path = 'GET /api/material/<id>', f'/api/material/{rng.choice(ids)}'
+    elif choice < 0.85:
+        route, path = 'GET /api/search', '/api/search?' + urlencode({'q': rng.choice(SEARCH_TERMS[3:])})
+    else:
+        route, path = 'GET /api/stats', '/api/stats'
+    headers = {'If-None-Match': client.etags[path]} if path in client.etags else {}
+    status, _, response_headers = client.request(route, path, headers=headers)
+    if status == 200 and response_headers.get('ETag'):
+        client.etags[path] = response_headers['ETag']
+
+
+def export(client, rng, ids):
+    client.request('GET /export/csv', '/export/csv' + ('?compression=gzip' if rng.random() < 0.5 else ''))
+
+
+def bookmark(client, rng, ids):
+    client.request('POST /material/<id>/bookmark', f'/material/{rng.choice(ids)}/bookmark', data=b'')
+
+
+def comment(client, rng, ids):
+    client.request('POST /material/<id>/comment', f'/material/{rng.choice(ids)}/comment', {
+        'csrf_token': client.csrf_token,
+        'content': f'Load test comment {rng.randrange(10 ** 6)}: checking convergence.',
+        'rating': rng.choice((0, 3, 4, 5)),
+    })
+
+
+SCENARIOS = {'browse': browse, 'detail': detail, 'api': api, 'export': export,
+             'bookmark': bookmark, 'comment': comment}
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f'Unknown scenario {name!r}; choose from {", ".join(SCENARIOS)}')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def run_user(base_url, ids, mix, start_at, duration, think, seed, username, password):
+    """Один процесс-клиент: замкнутый цикл сценариев до истечения duration"""
+    rng = random.Random(seed)
+    client = Client(base_url)
+    if any(mix.get(name) for name in LOGGED_IN):
+        client.login(username, password)
+        client.records.clear()
+    names, weights = list(mix), list(mix.values())
+    time.sleep(max(0.0, start_at - time.time()))
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        SCENARIOS[rng.choices(names, weights)[0]](client, rng, ids)
+        if think:
+            time.sleep(rng.expovariate(1 / think))
+    return client.records
+
+
+# Отчет
+
+def summarize(records, elapsed):
+    """{маршрут: статистика} и итог по всем маршрутам"""
+    by_route = {}
+    for route, status, seconds, size in records:
+        by_route.setdefault(route, []).append((status, seconds))
+    summary = {}
+    for route, items in sorted(by_route.items()) + [('TOTAL', [(s, t) for _, s, t, _ in records])]:
+        statuses = np.array([status for status, _ in items])
+        latencies = np.array([seconds for _, seconds in items]) * 1000
+        # 0 - соединение не удалось
+        errors = int(np.count_nonzero((statuses == 0) | (statuses >= 400)))
+        p50, p95, p99 = np.percentile(latencies, (50, 95, 99))
+        summary[route] = {
+            'requests': len(items), 'rps': len(items) / elapsed, 'errors': errors,
+            'not_modified': int(np.count_nonzero(statuses == 304)),
+            'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99, 'max_ms': float(latencies.max()),
+        }
+    return summary
+
+
+def print_summary(summary):
+    print(f'{"route":<36} {"requests":>9} {"req/s":>8} {"errors":>7} {"304":>6} '
+          f'{"p50, ms":>8} {"p95, ms":>8} {"p99, ms":>8} {"max, ms":>8}')
+    for route, s in summary.items():
+        print(f"{route:<36} {s['requests']:>9} {s['rps']:>8.1f} {s['errors']:>7} {s['not_modified']:>6} "
+              f"{s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f} {s['p99_ms']:>8.1f} {s['max_ms']:>8.1f}")
+
+
+# Локальный сервер
+
+def serve(port, database, files):
+    """Режим --serve: приложение в многопоточном сервере Werkzeug"""
+    os.environ['DATABASE_URL'] = f'sqlite:///{database}'
+    import app as app_module
+    from utils.render_cache import RenderCache
+    from werkzeug.serving import make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    # Рендеры и загрузки - во временной папке, а не в static/ репозитория
+    app_module.render_cache = RenderCache(os.path.join(files, 'renders'))
+    app_module.app.config['BANDS_FOLDER'] = os.path.join(files, 'bands')
+    app_module.app.config['DOS_FOLDER'] = os.path.join(files, 'dos')
+    make_server('127.0.0.1', port, app_module.app, threaded=True).serve_forever()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(args, tmp):
+    database = os.path.abspath(args.database or os.path.join(tmp, 'load.db'))
+    files = os.path.join(tmp, 'files')
+    if not args.database:
+        print(f'Generating {args.rows} materials...')
+        subprocess.run([sys.executable, os.path.join(BENCH_DIR, 'catalog.py'), database,
+                        '--rows', str(args.rows), '--files', files,
+                        '--spectra', '50', '--structures', '50'], check=True, stdout=subprocess.DEVNULL)
+    port = free_port()
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', str(port),
+                               '--database', database, '--files', files])
+    url = f'http://127.0.0.1:{port}'
+    for _ in range(300):
+        try:
+            with build_opener().open(url + '/api/stats', timeout=1):
+                return server, url
+        except (URLError, OSError):
+            if server.poll() is not None:
+                raise RuntimeError('Server exited during startup')
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError('Server did not start')
+
+
+def material_ids(url, pages=5):
+    """id публичных материалов из /api/materials (как их нашел бы внешний клиент)"""
+    ids, cursor = [], None
+    opener = build_opener()
+    for _ in range(pages):
+        query = {'per_page': 100, **({'cursor': cursor} if cursor else {})}
+        with opener.open(f'{url}/api/materials?{urlencode(query)}') as response:
+            page = json.load(response)
+        ids.extend(m['id'] for m in page['materials'])
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+    return ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16],
+                        help='Concurrent client processes; several values run one level after another')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds per level')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f'Scenario weights (default: {DEFAULT_MIX})')
+    parser.add_argument('--think', type=float, default=0.0, help='Mean pause between scenarios, seconds')
+    parser.add_argument('--url', help='Load an already running server instead of starting one')
+    parser.add_argument('--rows', type=int, default=5000, help='Materials in the generated catalog')
+    parser.add_argument('--database', help='Catalog from catalog.py for the local server (it gets written to)')
+    parser.add_argument('--user', default='admin')
+    parser.add_argument('--password', default='admin123')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Save per-level summaries as JSON')
+    parser.add_argument('--serve', type=int, metavar='PORT', help=argparse.SUPPRESS)
+    parser.add_argument('--files', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.database, args.files)
+        return
+
+    tmp = tempfile.mkdtemp(prefix='2dmat-load-')
+    server, url = (None, args.url) if args.url else start_server(args, tmp)
+    try:
+        ids = material_ids(url)
+        if not ids:
+            raise RuntimeError('No public materials to request')
+        mix = ', '.join(f'{name}={weight:g}' for name, weight in args.mix.items())
+        print(f'{url}, {len(ids)} materials, mix: {mix}')
+
+        levels = []
+        for workers in args.workers:
+            start_at = time.time() + 1.0
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(run_user, url, ids, args.mix, start_at, args.duration, args.think,
+                                       args.seed * 1000 + i, args.user, args.password)
+                           for i in range(workers)]
+                records = [record for future in futures for record in future.result()]
+            summary = summarize(records, args.duration)
+            levels.append({'workers': workers, 'duration': args.duration, 'routes': summary})
+            print(f'\n{workers} workers, {args.duration:g} s')
+            print_summary(summary)
+
+        print(f'\n{"workers":>7} {"req/s":>8} {"errors, %":>10} {"p50, ms":>8} {"p95, ms":>8} {"p99, ms":>8}')
+        for level in levels:
+            total = level['routes']['TOTAL']
+            print(f"{level['workers']:>7} {total['rps']:>8.1f} {total['errors'] / total['requests'] * 100:>10.2f} "
+                  f"{total['p50_ms']:>8.1f} {total['p95_ms']:>8.1f} {total['p99_ms']:>8.1f}")
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump({'url': url, 'mix': args.mix, 'think': args.think, 'levels': levels}, f, indent=2)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
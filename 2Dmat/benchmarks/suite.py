@@ -0,0 +1,265 @@
+"""
+Набор микробенчмарков на синтетическом каталоге (benchmarks/catalog.py):
+фильтры browse, /api/materials, /export/csv, страница материала и каждый
+визуализатор на нескольких размерах данных. Результаты сохраняются в JSON;
+сравнение с предыдущим прогоном отмечает регрессии медианы.
+
+    python benchmarks/suite.py [--rows 10000] [--seed 0] [--only browse api] [--baseline old.json]
+    python benchmarks/suite.py --database bench.db          # каталог из catalog.py
+    python benchmarks/suite.py --compare old.json new.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+GROUPS = ('browse', 'api', 'export', 'material', 'visualizers')
+
+
+def summarize(times):
+    times_ms = [t * 1000 for t in times]
+    return {
+        'runs': len(times_ms),
+        'min_ms': min(times_ms),
+        'median_ms': statistics.median(times_ms),
+        'mean_ms': statistics.fmean(times_ms),
+        'max_ms': max(times_ms),
+    }
+
+
+def run_case(fn, repeat, warmup=1, setup=None):
+    """Время fn() после warmup прогонов; setup() вызывается перед каждым прогоном вне замера"""
+    for _ in range(warmup):
+        if setup is not None:
+            setup()
+        fn()
+    times = []
+    result = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    stats = summarize(times)
+    if isinstance(result, (bytes, str)):
+        stats['bytes'] = len(result)
+    return stats
+
+
+# Сценарии
+
+def http_cases(app_module, material_ids):
+    """(группа, имя, функция, setup) для запросов через WSGI-клиент"""
+    client = app_module.app.test_client()
+
+    def get(url):
+        def fn():
+            response = client.get(url)
+            if response.status_code != 200:
+                raise RuntimeError(f'{url}: HTTP {response.status_code}')
+            return response.get_data()
+        return fn
+
+    # Без кэша числа найденных материалов мерится сам запрос COUNT
+    clear_counts = app_module.material_counts.clear
+    browse_filters = {
+        'all': '',
+        'fm': 'magnetic_order=FM',
+        'verified': 'verified_only=true',
+        'tc_over_100': 'min_tc=100',
+        'gap_under_1': 'max_band_gap=1',
+        'combined': 'magnetic_order=FM&verified_only=true&min_tc=50&max_band_gap=2',
+        'search': 'formula=CrI3',
+        'search_fm': 'formula=CrI3&magnetic_order=FM',
+    }
+    for name, query in browse_filters.items():
+        yield 'browse', name, get(f'/browse?{query}'), clear_counts
+
+    first_page = client.get('/api/materials?per_page=100').get_json()
+    yield 'api', 'materials_per_page_20', get('/api/materials?per_page=20'), None
+    yield 'api', 'materials_per_page_100', get('/api/materials?per_page=100'), None
+    yield 'api', 'materials_next_page', get(
+        f"/api/materials?per_page=100&cursor={first_page['next_cursor']}"), None
+    yield 'api', 'materials_with_total', get('/api/materials?per_page=20&with_total=true'), clear_counts
+    yield 'api', 'search', get('/api/search?q=CrI3&per_page=50'), None
+    yield 'api', 'material_detail', get(f'/api/material/{material_ids[0]}'), None
+    yield 'api', 'stats', get('/api/stats'), None
+
+    yield 'export', 'csv', get('/export/csv'), None
+    yield 'export', 'csv_gzip', get('/export/csv?compression=gzip'), None
+
+    with_files, plain = material_ids[0], material_ids[-1]
+    yield 'material', 'detail_plain', get(f'/material/{plain}'), None
+    # Изображения уже в кэше рендеров (после прогрева)
+    yield 'material', 'detail_cached_renders', get(f'/material/{with_files}'), None
+    # Изображения рисуются в запросе: кэш рендеров очищается перед каждым прогоном
+    yield 'material', 'detail_inline_renders', get(f'/material/{with_files}'), app_module.render_cache.clear
+
+
+def visualizer_cases(tmp):
+    """(группа, имя, функция, setup) для визуализаторов на разных размерах"""
+    from catalog import lattice_2d, synthetic_bands, synthetic_dos, write_structure
+    from utils.lod import build_levels
+    from utils.spectra_storage import dos_channels
+    from utils.visualization import StructureVisualizer, BandStructureVisualizer, DOSVisualizer
+
+    output = os.path.join(tmp, 'plot.png')
+    for repeat in (1, 3, 6, 12):
+        atoms = lattice_2d('MX3', 'Cr', 'I', repeat=repeat)
+        path = write_structure(os.path.join(tmp, f'CrI3_{len(atoms)}.vasp'), atoms)
+        yield 'visualizers', f'structure_plot_{len(atoms)}_atoms', (
+            lambda path=path: StructureVisualizer.create_structure_plot(path, output)), None
+    yield 'visualizers', f'reciprocal_lattice_plot_{len(atoms)}_atoms', (
+        lambda: StructureVisualizer.create_reciprocal_lattice_plot(path, output)), None
+
+    for n_kpoints, n_bands in ((200, 10), (1000, 100), (2000, 500)):
+        data = synthetic_bands(n_kpoints, n_bands)
+        size = f'{n_kpoints}k_{n_bands}b'
+        yield 'visualizers', f'band_structure_plot_{size}', (
+            lambda data=data: BandStructureVisualizer.create_band_structure_plot(data, output)), None
+        yield 'visualizers', f'interactive_bands_{size}', (
+            lambda data=data: BandStructureVisualizer.create_interactive_bands(data, zoom_url='/bands')), None
+
+    for n_points in (2000, 20000, 200000):
+        data = synthetic_dos(n_points)
+        levels = build_levels(data['energy'], dos_channels(data))
+        yield 'visualizers', f'dos_plot_{n_points}', (
+            lambda data=data, levels=levels: DOSVisualizer.create_dos_plot(data, output, levels=levels)), None
+        yield 'visualizers', f'interactive_dos_{n_points}', (
+            lambda data=data, levels=levels: DOSVisualizer.create_interactive_dos(data, levels, zoom_url='/dos')), None
+
+
+# Сравнение прогонов
+
+def compare(baseline, current, threshold, min_delta_ms):
+    """Печатает изменения медиан; возвращает список регрессий"""
+    regressions = []
+    for key in ('rows', 'seed'):
+        if baseline['meta']['catalog'].get(key) != current['meta']['catalog'].get(key):
+            print(f"Warning: catalog {key} differs ({baseline['meta']['catalog'].get(key)} vs "
+                  f"{current['meta']['catalog'].get(key)}), results are not comparable")
+    print(f'{"case":<48} {"before, ms":>11} {"after, ms":>10} {"change":>8}')
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            print(f'{name:<48} {"-":>11} {result["median_ms"]:>10.2f} {"new":>8}')
+            continue
+        old, new = before['median_ms'], result['median_ms']
+        change = (new - old) / old if old else 0.0
+        flag = ''
+        if change > threshold and new - old > min_delta_ms:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f'{name:<48} {old:>11.2f} {new:>10.2f} {change * 100:>+7.1f}%{flag}')
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000, help='Materials in a freshly generated catalog')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--database', help='Existing catalog from catalog.py (default: generate a temporary one)')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', nargs='+', choices=GROUPS, default=GROUPS)
+    parser.add_argument('--output', help=f'Result JSON (default: {os.path.relpath(RESULTS_DIR)}/<time>.json)')
+    parser.add_argument('--baseline', help='Previous result JSON to compare with')
+    parser.add_argument('--threshold', type=float, default=0.15, help='Relative median increase flagged as regression')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help='Ignore smaller absolute increases')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'), help='Only compare two result files')
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f, open(args.compare[1]) as g:
+            regressions = compare(json.load(f), json.load(g), args.threshold, args.min_delta_ms)
+        sys.exit(1 if regressions else 0)
+
+    tmp = tempfile.mkdtemp(prefix='2dmat-bench-')
+    database = os.path.abspath(args.database or os.path.join(tmp, 'bench.db'))
+    # Приложение создает таблицы при импорте - во временной базе, а не в рабочей
+    os.environ['DATABASE_URL'] = f'sqlite:///{database}'
+    import app as app_module
+    from catalog import populate
+    from models import db, Material
+    from utils.render_cache import RenderCache
+
+    app = app_module.app
+    app.config['BANDS_FOLDER'] = os.path.join(tmp, 'bands')
+    app.config['DOS_FOLDER'] = os.path.join(tmp, 'dos')
+    app_module.render_cache = RenderCache(os.path.join(tmp, 'renders'))
+
+    with app.app_context():
+        rows = db.session.query(db.func.count(Material.id)).scalar()
+        if not args.database:
+            started = time.perf_counter()
+            populate(args.rows, args.seed, os.path.join(tmp, 'files'))
+            rows = args.rows
+            print(f'Generated {rows} materials in {time.perf_counter() - started:.1f} s')
+        # Материалы с файлами - первые в каталоге, без файлов - последние
+        with_files = db.session.query(db.func.min(Material.id)).filter(Material.dos_path.isnot(None)).scalar()
+        plain = db.session.query(db.func.max(Material.id)).filter(Material.dos_path.is_(None)).scalar()
+
+    cases = []
+    if set(args.only) - {'visualizers'}:
+        cases.extend(http_cases(app_module, [with_files, plain]))
+    if 'visualizers' in args.only:
+        cases.extend(visualizer_cases(tmp))
+
+    results = {}
+    print(f'{"case":<48} {"median, ms":>11} {"min, ms":>9} {"KB":>9}')
+    for group, name, fn, setup in cases:
+        if group not in args.only:
+            continue
+        key = f'{group}/{name}'
+        # Экспорт всего каталога долгий - достаточно трех прогонов
+        repeat = min(args.repeat, 3) if group == 'export' else args.repeat
+        results[key] = stats = run_case(fn, repeat, setup=setup)
+        size = f"{stats['bytes'] / 1024:.0f}" if 'bytes' in stats else ''
+        print(f"{key:<48} {stats['median_ms']:>11.2f} {stats['min_ms']:>9.2f} {size:>9}")
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'repeat': args.repeat,
+            'catalog': {'rows': rows, 'seed': None if args.database else args.seed, 'database': args.database},
+        },
+        'results': results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Results saved to {output}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(json.load(f), report, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f'{len(regressions)} regression(s) over {args.threshold * 100:.0f}%')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,17 @@
 from flask import Flask
 from models import db, Material, User  # Added User import
+from utils.db_config import database_config, init_database_engines
 import json
 import os
 
 def create_app():
     app = Flask(__name__)
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///2dmaterials.db'
+    app.config.update(database_config())
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['SECRET_KEY'] = 'dev-secret-key-change-in-production'
     
     db.init_app(app)
+    init_database_engines(app, db)
     
     with app.app_context():
         db.create_all()
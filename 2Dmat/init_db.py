@@ -1,6 +1,7 @@
 # init_db.py
 from app import app, db
 from models import User, Material, Verification, Comment, Bookmark
+from utils.search import create_search_index
 
 def init_database():
     with app.app_context():
@@ -11,6 +12,8 @@ def init_database():
         # Create all tables
         print("Creating tables...")
         db.create_all()
+        with db.engine.begin() as connection:
+            create_search_index(connection, rebuild=True)
         
         # Create admin user
         print("Creating admin user...")
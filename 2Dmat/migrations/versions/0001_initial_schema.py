@@ -0,0 +1,26 @@
+"""initial schema
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-17 00:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Исходные таблицы создает db.create_all() при запуске app.py;
+    # эта ревизия - отправная точка для последующих миграций
+    pass
+
+
+def downgrade():
+    pass
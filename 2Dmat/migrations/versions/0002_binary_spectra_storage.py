@@ -0,0 +1,87 @@
+"""binary band structure and DOS storage
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:30:00.000000
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+from flask import current_app
+
+from utils.spectra_storage import save_band_structure, load_band_structure, save_dos, load_dos
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def _columns():
+    return {c['name'] for c in sa.inspect(op.get_bind()).get_columns('material')}
+
+
+def upgrade():
+    # Колонки могли быть уже созданы db.create_all()
+    existing = _columns()
+    with op.batch_alter_table('material') as batch_op:
+        if 'band_structure_path' not in existing:
+            batch_op.add_column(sa.Column('band_structure_path', sa.String(length=300)))
+        if 'dos_path' not in existing:
+            batch_op.add_column(sa.Column('dos_path', sa.String(length=300)))
+
+    # Перевод JSON в float32 .npy; после успешной записи JSON очищается
+    bind = op.get_bind()
+    conversions = (
+        ('band_structure_data', 'band_structure_path', save_band_structure, current_app.config['BANDS_FOLDER']),
+        ('dos_data', 'dos_path', save_dos, current_app.config['DOS_FOLDER']),
+    )
+    for data_column, path_column, save, folder in conversions:
+        rows = bind.execute(sa.text(
+            f'SELECT id, {data_column} FROM material '
+            f'WHERE {data_column} IS NOT NULL AND {path_column} IS NULL'
+        )).fetchall()
+        for material_id, text in rows:
+            try:
+                path = save(folder, material_id, json.loads(text))
+            except (ValueError, KeyError, TypeError) as e:
+                print(f'Material {material_id}: cannot convert {data_column}: {e}')
+                continue
+            bind.execute(sa.text(
+                f'UPDATE material SET {path_column} = :path, {data_column} = NULL WHERE id = :id'
+            ), {'path': path, 'id': material_id})
+
+
+def _to_json(data):
+    """Обратное преобразование массивов в исходный JSON-формат"""
+    data = dict(data)
+    for key in ('kpoints', 'energies', 'energy', 'total_dos'):
+        if key in data:
+            data[key] = data[key].tolist()
+    if 'partial_dos' in data:
+        data['partial_dos'] = {name: values.tolist() for name, values in data['partial_dos'].items()}
+    return json.dumps(data)
+
+
+def downgrade():
+    bind = op.get_bind()
+    conversions = (
+        ('band_structure_data', 'band_structure_path', load_band_structure),
+        ('dos_data', 'dos_path', load_dos),
+    )
+    for data_column, path_column, load in conversions:
+        rows = bind.execute(sa.text(
+            f'SELECT id, {path_column} FROM material WHERE {path_column} IS NOT NULL'
+        )).fetchall()
+        for material_id, path in rows:
+            text = _to_json(load(path, mmap=False))
+            bind.execute(sa.text(f'UPDATE material SET {data_column} = :text WHERE id = :id'),
+                         {'text': text, 'id': material_id})
+
+    with op.batch_alter_table('material') as batch_op:
+        batch_op.drop_column('dos_path')
+        batch_op.drop_column('band_structure_path')
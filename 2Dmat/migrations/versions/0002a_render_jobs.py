@@ -0,0 +1,38 @@
+"""render job queue for flask render-worker
+
+Revision ID: 0002a
+Revises: 0002
+Create Date: 2026-10-17 00:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002a'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Таблица могла быть уже создана db.create_all(); индексы добавляет 0003
+    if sa.inspect(op.get_bind()).has_table('render_job'):
+        return
+    op.create_table(
+        'render_job',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('material_id', sa.Integer(), sa.ForeignKey('material.id')),
+        sa.Column('status', sa.String(length=20)),
+        sa.Column('attempts', sa.Integer()),
+        sa.Column('error', sa.Text()),
+        sa.Column('duration', sa.Float()),
+        sa.Column('created_at', sa.DateTime()),
+        sa.Column('started_at', sa.DateTime()),
+        sa.Column('finished_at', sa.DateTime()),
+    )
+
+
+def downgrade():
+    op.drop_table('render_job')
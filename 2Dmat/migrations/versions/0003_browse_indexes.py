@@ -0,0 +1,63 @@
+"""indexes for browse filters, keyset pagination and related lookups
+
+Revision ID: 0003
+Revises: 0002a
+Create Date: 2026-10-17 02:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002a'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = (
+    ('material', 'ix_material_public_created', ['is_public', 'created_at', 'id']),
+    ('material', 'ix_material_public_magnetic_created', ['is_public', 'magnetic_order', 'created_at', 'id']),
+    ('material', 'ix_material_public_verified_created', ['is_public', 'is_verified', 'created_at', 'id']),
+    ('material', 'ix_material_public_curie', ['is_public', 'curie_temperature']),
+    ('material', 'ix_material_public_band_gap', ['is_public', 'band_gap']),
+    ('material', 'ix_material_created', ['created_at', 'id']),
+    ('material', 'ix_material_views', ['views']),
+    ('material', 'ix_material_user_created', ['user_id', 'created_at']),
+    ('comment', 'ix_comment_material_created', ['material_id', 'created_at']),
+    ('comment', 'ix_comment_user', ['user_id']),
+    ('comment', 'ix_comment_parent', ['parent_id']),
+    ('bookmark', 'ix_bookmark_material', ['material_id']),
+    ('verification', 'ix_verification_material', ['material_id']),
+    ('verification', 'ix_verification_expert', ['expert_id']),
+    ('render_job', 'ix_render_job_status', ['status', 'id']),
+    ('render_job', 'ix_render_job_material_status', ['material_id', 'status']),
+)
+
+
+def _existing(table):
+    return {index['name'] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    # Для новых баз индексы уже создал db.create_all()
+    existing = {}
+    for table, name, columns in INDEXES:
+        if table not in existing:
+            existing[table] = _existing(table)
+        if name not in existing[table]:
+            op.create_index(name, table, columns)
+
+    # Статистика для планировщика SQLite, чтобы он выбирал подходящий индекс
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute('ANALYZE')
+
+
+def downgrade():
+    existing = {}
+    for table, name, columns in reversed(INDEXES):
+        if table not in existing:
+            existing[table] = _existing(table)
+        if name in existing[table]:
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,26 @@
+"""full-text search index over material formula, names, tags and reference
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 03:00:00.000000
+
+"""
+from alembic import op
+
+from utils.search import create_search_index, drop_search_index
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FTS5 + триггеры только для SQLite; индекс заполняется из material
+    create_search_index(op.get_bind(), rebuild=True)
+
+
+def downgrade():
+    drop_search_index(op.get_bind())
@@ -0,0 +1,39 @@
+"""catalog statistics table for the index page and /api/stats
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 04:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from utils.catalog_stats import compute_stats
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Таблица могла быть уже создана db.create_all()
+    bind = op.get_bind()
+    if not sa.inspect(bind).has_table('catalog_stat'):
+        op.create_table(
+            'catalog_stat',
+            sa.Column('key', sa.String(length=120), primary_key=True),
+            sa.Column('value', sa.Integer(), nullable=False),
+        )
+
+    session = sa.orm.Session(bind=bind)
+    stats = compute_stats(session)
+    op.execute(sa.text('DELETE FROM catalog_stat'))
+    op.bulk_insert(sa.table('catalog_stat', sa.column('key'), sa.column('value')),
+                   [{'key': key, 'value': value} for key, value in stats.items()])
+
+
+def downgrade():
+    op.drop_table('catalog_stat')
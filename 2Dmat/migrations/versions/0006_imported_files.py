@@ -0,0 +1,35 @@
+"""imported structure files for flask import-materials
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 05:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Таблица могла быть уже создана db.create_all()
+    if sa.inspect(op.get_bind()).has_table('imported_file'):
+        return
+    op.create_table(
+        'imported_file',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('source_path', sa.String(length=500)),
+        sa.Column('material_id', sa.Integer(), sa.ForeignKey('material.id')),
+        sa.Column('imported_at', sa.DateTime()),
+        sa.UniqueConstraint('sha256'),
+    )
+
+
+def downgrade():
+    op.drop_table('imported_file')
@@ -0,0 +1,45 @@
+"""drop material range indexes that forced a sort of the whole filtered set
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+# Фильтры min_tc и max_band_gap проверяются при чтении страницы по индексу
+# (is_public, ..., created_at, id): с этими индексами SQLite выбирал их и
+# сортировал все подходящие строки ради первых 20
+INDEXES = (
+    ('ix_material_public_curie', ['is_public', 'curie_temperature']),
+    ('ix_material_public_band_gap', ['is_public', 'band_gap']),
+)
+
+
+def _existing():
+    return {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('material')}
+
+
+def upgrade():
+    existing = _existing()
+    for name, columns in INDEXES:
+        if name in existing:
+            op.drop_index(name, table_name='material')
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute('ANALYZE')
+
+
+def downgrade():
+    existing = _existing()
+    for name, columns in INDEXES:
+        if name not in existing:
+            op.create_index(name, 'material', columns)
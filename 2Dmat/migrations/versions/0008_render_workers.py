@@ -0,0 +1,32 @@
+"""render worker heartbeats
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Таблица могла быть уже создана db.create_all()
+    if sa.inspect(op.get_bind()).has_table('render_worker'):
+        return
+    op.create_table(
+        'render_worker',
+        sa.Column('name', sa.String(length=120), primary_key=True),
+        sa.Column('started_at', sa.DateTime()),
+        sa.Column('heartbeat_at', sa.DateTime()),
+    )
+
+
+def downgrade():
+    op.drop_table('render_worker')
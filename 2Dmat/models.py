@@ -3,7 +3,9 @@ from flask_login import UserMixin
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 
-db = SQLAlchemy()
+from utils.db_config import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(UserMixin, db.Model):
     """Модель пользователя"""
@@ -52,7 +54,7 @@ class Material(db.Model):
     crystal_system = db.Column(db.String(50))  # hexagonal, trigonal, etc.
     space_group = db.Column(db.String(20))
     lattice_params = db.Column(db.Text)  # JSON: a, b, c, alpha, beta, gamma
-    wyckoff_positions = db.Column(db.Text)  # JSON с позициями атомов
+    wyckoff_positions = db.deferred(db.Column(db.Text), group='details')  # JSON с позициями атомов
     
     # Вычислительные параметры
     calculation_method = db.Column(db.String(50))  # DFT, DFT+U, HSE, GW
@@ -88,7 +90,7 @@ class Material(db.Model):
     # Механические свойства
     formation_energy = db.Column(db.Float)  # eV/atom
     exfoliation_energy = db.Column(db.Float)  # meV/Å²
-    elastic_constants = db.Column(db.Text)  # JSON с тензором упругости
+    elastic_constants = db.deferred(db.Column(db.Text), group='details')  # JSON с тензором упругости
     poisson_ratio = db.Column(db.Float)
     young_modulus = db.Column(db.Float)  # GPa
     
@@ -107,17 +109,20 @@ class Material(db.Model):
     poscar_file_path = db.Column(db.String(300))
     input_files_path = db.Column(db.String(300))  # Папка с входными файлами
     output_files_path = db.Column(db.String(300))  # Папка с выходными файлами
-    band_structure_data = db.Column(db.Text)  # JSON с данными зонной структуры
-    dos_data = db.Column(db.Text)  # JSON с данными DOS
+    # Старый формат (JSON текстом); новые данные хранятся в .npy, см. utils/spectra_storage.py
+    band_structure_data = db.deferred(db.Column(db.Text), group='details')
+    dos_data = db.deferred(db.Column(db.Text), group='details')
+    band_structure_path = db.Column(db.String(300))  # Папка с массивами зонной структуры
+    dos_path = db.Column(db.String(300))  # Папка с массивами DOS
     charge_density_path = db.Column(db.String(300))
     
     # Метаданные и верификация
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     doi = db.Column(db.String(100))
-    reference = db.Column(db.Text)
+    reference = db.deferred(db.Column(db.Text), group='details')
     is_verified = db.Column(db.Boolean, default=False)
     verification_score = db.Column(db.Float)  # 0-100%
-    verification_notes = db.Column(db.Text)
+    verification_notes = db.deferred(db.Column(db.Text), group='details')
     verification_date = db.Column(db.DateTime)
     verified_by = db.Column(db.Integer, db.ForeignKey('user.id'))
     
@@ -141,6 +146,33 @@ class Material(db.Model):
     band_structure_image_path = db.Column(db.String(300))
     dos_image_path = db.Column(db.String(300))
     
+    # Колонки, которых достаточно спискам (browse, admin, profile, API, CSV).
+    # Тяжелые текстовые колонки группы 'details' грузятся только по обращению.
+    SUMMARY_COLUMNS = (
+        'id', 'name', 'formula', 'crystal_system', 'space_group',
+        'band_gap', 'band_gap_type', 'magnetic_order', 'magnetic_moment',
+        'curie_temperature', 'is_verified', 'verification_score', 'doi',
+        'user_id', 'is_public', 'views', 'created_at'
+    )
+    
+    # Индексы под фильтры browse и сортировку по (created_at, id) для
+    # keyset-пагинации; создаются миграцией 0003. Индексов по curie_temperature
+    # и band_gap нет (удалены миграцией 0007): с ними SQLite сортировал все
+    # подходящие строки во временном B-дереве вместо чтения страницы по порядку
+    __table_args__ = (
+        db.Index('ix_material_public_created', 'is_public', 'created_at', 'id'),
+        db.Index('ix_material_public_magnetic_created', 'is_public', 'magnetic_order', 'created_at', 'id'),
+        db.Index('ix_material_public_verified_created', 'is_public', 'is_verified', 'created_at', 'id'),
+        db.Index('ix_material_created', 'created_at', 'id'),
+        db.Index('ix_material_views', 'views'),
+        db.Index('ix_material_user_created', 'user_id', 'created_at'),
+    )
+    
+    @classmethod
+    def summary(cls):
+        """Опция загрузки для списков: только SUMMARY_COLUMNS"""
+        return db.load_only(*(getattr(cls, name) for name in cls.SUMMARY_COLUMNS))
+    
     def to_dict(self):
         """Преобразование в словарь для API"""
         return {
@@ -187,6 +219,10 @@ class Verification(db.Model):
     completed_at = db.Column(db.DateTime)
 
     material = db.relationship('Material', backref='verification_records')
+    __table_args__ = (
+        db.Index('ix_verification_material', 'material_id'),
+        db.Index('ix_verification_expert', 'expert_id'),
+    )
     
 class Comment(db.Model):
     """Комментарии к материалам"""
@@ -204,6 +240,11 @@ class Comment(db.Model):
     material = db.relationship('Material', backref='comments')
     user = db.relationship('User', backref='comments')
     parent = db.relationship('Comment', remote_side=[id], backref='replies')
+    __table_args__ = (
+        db.Index('ix_comment_material_created', 'material_id', 'created_at'),
+        db.Index('ix_comment_user', 'user_id'),
+        db.Index('ix_comment_parent', 'parent_id'),
+    )
 
 class Bookmark(db.Model):
     """Закладки пользователей"""
@@ -216,4 +257,61 @@ class Bookmark(db.Model):
 
     material = db.relationship('Material', backref='bookmarks')
     user = db.relationship('User', backref='bookmarks')
-    __table_args__ = (db.UniqueConstraint('user_id', 'material_id', name='unique_bookmark'),)
+    # unique_bookmark служит и индексом для поиска по user_id
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'material_id', name='unique_bookmark'),
+        db.Index('ix_bookmark_material', 'material_id'),
+    )
+
+
+class RenderJob(db.Model):
+    """Задание фоновой отрисовки изображений материала"""
+
+    id = db.Column(db.Integer, primary_key=True)
+    material_id = db.Column(db.Integer, db.ForeignKey('material.id'))
+    status = db.Column(db.String(20), default='pending')  # pending, running, done, failed
+    attempts = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+    duration = db.Column(db.Float)  # секунды
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    material = db.relationship('Material', backref='render_jobs')
+    __table_args__ = (
+        db.Index('ix_render_job_status', 'status', 'id'),
+        db.Index('ix_render_job_material_status', 'material_id', 'status'),
+    )
+
+
+class RenderWorker(db.Model):
+    """
+    Запущенный flask render-worker (host:pid) и время его последней отметки.
+    Без свежей отметки страницы не ждут фоновую отрисовку и рисуют сами.
+    """
+
+    name = db.Column(db.String(120), primary_key=True)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    heartbeat_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class CatalogStat(db.Model):
+    """
+    Счетчики каталога для главной страницы и /api/stats: 'materials',
+    'verified_materials', 'users', 'magnetic_order:<значение>',
+    'crystal_system:<значение>'. Поддерживаются событиями сессии
+    (utils/catalog_stats.py), пересчитываются командой flask reconcile-stats.
+    """
+
+    key = db.Column(db.String(120), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ImportedFile(db.Model):
+    """Файл структуры, загруженный flask import-materials (по хэшу содержимого)"""
+
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    source_path = db.Column(db.String(500))
+    material_id = db.Column(db.Integer, db.ForeignKey('material.id'))
+    imported_at = db.Column(db.DateTime, default=datetime.utcnow)
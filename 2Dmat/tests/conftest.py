@@ -0,0 +1,85 @@
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Пути загрузок в app.py относительные - как при обычном запуске из 2Dmat/
+os.chdir(ROOT)
+
+# app.py читает настройки базы из окружения при импорте: тесты работают со
+# своей временной базой, без реплики, с отдельной папкой резервных копий и
+# заголовком X-SQL-Queries (utils/query_counter.py)
+TMP = tempfile.mkdtemp(prefix='2dmat-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(TMP, 'app.db')
+os.environ.pop('DATABASE_REPLICA_URL', None)
+os.environ['BACKUP_FOLDER'] = os.path.join(TMP, 'backups')
+os.environ['SQL_QUERY_COUNT'] = '1'
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    import app as app_module
+
+    app_module.app.config.update(
+        TESTING=True,
+        WTF_CSRF_ENABLED=False,
+        BANDS_FOLDER=os.path.join(TMP, 'bands'),
+        DOS_FOLDER=os.path.join(TMP, 'dos'),
+    )
+    return app_module
+
+
+# Запросы тестового клиента открывают свой контекст приложения и свою сессию,
+# как в работающем приложении; данные для них создаются в отдельных контекстах
+@pytest.fixture
+def app(app_module):
+    return app_module.app
+
+
+@pytest.fixture
+def db(app_module):
+    return app_module.db
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def _saved(app, db, obj):
+    """Сохраняет объект; загруженные атрибуты доступны и после закрытия сессии"""
+    with app.app_context():
+        db.session.add(obj)
+        db.session.commit()
+        db.session.refresh(obj)
+    return obj
+
+
+@pytest.fixture
+def make_user(app_module, app, db):
+    def make_user(role='user', password='secret'):
+        name = f'user-{uuid.uuid4().hex[:8]}'
+        user = app_module.User(username=name, email=f'{name}@example.org', role=role)
+        user.set_password(password)
+        return _saved(app, db, user)
+    return make_user
+
+
+@pytest.fixture
+def make_material(app_module, app, db):
+    def make_material(user, **columns):
+        return _saved(app, db, app_module.Material(name=f'Material {uuid.uuid4().hex[:6]}', formula='CrI3',
+                                                   user_id=user.id, is_public=True, **columns))
+    return make_material
+
+
+@pytest.fixture
+def login(client):
+    def login(user, password='secret'):
+        response = client.post('/login', data={'username': user.username, 'password': password})
+        assert response.status_code == 302
+    return login
@@ -0,0 +1,33 @@
+import os
+
+from utils.backups import BackupManager
+
+
+def make_backups(folder, count, suffix=''):
+    """count пустых копий с возрастающим mtime; имена от старых к новым"""
+    names = []
+    for i in range(count):
+        name = f'backup_20260101_{i:06d}{suffix}.db.gz'
+        path = folder / name
+        path.write_bytes(b'')
+        os.utime(path, (1_000_000 + i, 1_000_000 + i))
+        names.append(name)
+    return names
+
+
+def test_retention_counts_pre_restore_backups_separately(tmp_path):
+    scheduled = make_backups(tmp_path, 5)
+    pre_restore = make_backups(tmp_path, 4, suffix='_pre_restore')
+    manager = BackupManager(str(tmp_path), keep=2, keep_pre_restore=3)
+
+    removed = manager.apply_retention()
+
+    assert sorted(removed) == sorted(scheduled[:3] + pre_restore[:1])
+    assert sorted(os.listdir(tmp_path)) == sorted(scheduled[3:] + pre_restore[1:])
+
+
+def test_zero_keeps_all(tmp_path):
+    make_backups(tmp_path, 3)
+    make_backups(tmp_path, 3, suffix='_pre_restore')
+    assert BackupManager(str(tmp_path), keep=0, keep_pre_restore=0).apply_retention() == []
+    assert len(os.listdir(tmp_path)) == 6
@@ -0,0 +1,103 @@
+"""
+Интерактивная зонная структура материалов с 10, 100 и 1000 зонами: размер
+страницы визуализации и ответа API ограничен сверху, все зоны окна идут
+одним trace, а точек на зону не больше цели LTTB.
+"""
+import base64
+import json
+
+import numpy as np
+import pytest
+
+from utils.spectra_storage import save_band_structure
+from utils.visualization import BandStructureVisualizer
+
+KPOINTS = 2000
+# Верхние границы в байтах: страница с графиком и JSON окна. Trace на каждую
+# зону со всеми точками давал 48.8 МБ HTML при 1000 зонах
+MAX_BYTES = {
+    10: (150_000, 170_000),
+    100: (1_300_000, 1_700_000),
+    1000: (3_200_000, 4_200_000),
+}
+
+
+def band_data(n_bands, seed=0):
+    rng = np.random.default_rng(seed)
+    kpoints = np.linspace(0, 3, KPOINTS)
+    centers = np.linspace(-10, 10, n_bands)
+    energies = centers + rng.uniform(0.2, 2.0, n_bands) * np.cos(2 * np.pi * kpoints[:, None]
+                                                                 + rng.uniform(0, np.pi, n_bands))
+    return {'kpoints': kpoints, 'energies': energies, 'labels': {'G': 0.0, 'K': 3.0}}
+
+
+def lttb_target(n_bands, px=BandStructureVisualizer.INTERACTIVE_PX):
+    return max(3, min(px, BandStructureVisualizer.INTERACTIVE_MAX_POINTS // n_bands))
+
+
+def plotted_traces(html):
+    """Traces из вызова Plotly.newPlot(id, data, layout) в HTML графика"""
+    start = html.index('Plotly.newPlot(')
+    traces, _ = json.JSONDecoder().raw_decode(html[html.index(',', start) + 1:].lstrip())
+    return traces
+
+
+def values(array):
+    """Массив trace: список или типизированный {'dtype', 'bdata'} plotly"""
+    if isinstance(array, dict):
+        return np.frombuffer(base64.b64decode(array['bdata']), dtype=array['dtype'])
+    return np.array([np.nan if v is None else v for v in array], dtype=np.float64)
+
+
+def segments(y):
+    """Длины кривых, разделенных NaN"""
+    breaks = np.flatnonzero(np.isnan(y))
+    return np.diff(np.concatenate(([-1], breaks, [len(y)]))) - 1
+
+
+@pytest.fixture
+def band_material(app_module, app, db, make_user, make_material):
+    def band_material(n_bands):
+        material = make_material(make_user())
+        path = save_band_structure(app.config['BANDS_FOLDER'], material.id, band_data(n_bands))
+        with app.app_context():
+            db.session.get(app_module.Material, material.id).band_structure_path = path
+            db.session.commit()
+        return material
+    return band_material
+
+
+@pytest.mark.parametrize('n_bands', sorted(MAX_BYTES))
+def test_visualization_page(client, make_user, login, band_material, n_bands):
+    material = band_material(n_bands)
+    login(make_user())
+    response = client.get(f'/material/{material.id}/visualization')
+    assert response.status_code == 200
+    assert len(response.data) < MAX_BYTES[n_bands][0]
+
+    html = response.get_data(as_text=True)
+    bands = [trace for trace in plotted_traces(html) if trace.get('name') == 'Зоны']
+    assert len(bands) == 1
+    lengths = segments(values(bands[0]['y']))
+    assert len(lengths) == n_bands
+    assert lengths.max() <= lttb_target(n_bands)
+    # Обзор прорежен - при масштабировании график догружает окно
+    assert f'/api/material/{material.id}/bands' in html
+
+
+@pytest.mark.parametrize('n_bands', sorted(MAX_BYTES))
+@pytest.mark.parametrize('window', [{}, {'kmin': 1.0, 'kmax': 1.3, 'px': 400}])
+def test_bands_api(client, band_material, n_bands, window):
+    material = band_material(n_bands)
+    response = client.get(f'/api/material/{material.id}/bands', query_string=window)
+    assert response.status_code == 200
+    assert len(response.data) < MAX_BYTES[n_bands][1]
+
+    payload = response.get_json()
+    x, y = values(payload['x']), values(payload['y'])
+    assert len(x) == len(y)
+    lengths = segments(y)
+    assert len(lengths) == n_bands
+    assert lengths.max() <= lttb_target(n_bands, window.get('px', BandStructureVisualizer.INTERACTIVE_PX))
+    if window:
+        assert np.nanmin(x) >= window['kmin'] - 0.01 and np.nanmax(x) <= window['kmax'] + 0.01
@@ -0,0 +1,40 @@
+"""
+Условные GET для /api/material/<id>: ETag строится из updated_at, поэтому
+в ответе не должно быть полей, которые меняются без updated_at.
+"""
+
+
+def test_api_material_not_modified_after_counter_flush(app_module, app, db, client, make_user, make_material):
+    material = make_material(make_user())
+    url = f'/api/material/{material.id}'
+    first = client.get(url)
+    assert first.status_code == 200
+    assert not {'views', 'downloads'} & set(first.get_json())
+
+    # Буфер счетчиков записывает приращения, не трогая updated_at
+    app_module.material_counters.add('views', material.id, 5)
+    app_module.material_counters.add('downloads', material.id, 2)
+    app_module.material_counters.flush()
+    with app.app_context():
+        assert db.session.get(app_module.Material, material.id).views == 5
+
+    assert client.get(url, headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+    # 304 верен, только если полный ответ действительно не изменился
+    again = client.get(url)
+    assert again.headers['ETag'] == first.headers['ETag']
+    assert again.data == first.data
+
+
+def test_api_material_changes_with_material(app_module, app, db, client, make_user, make_material):
+    material = make_material(make_user())
+    url = f'/api/material/{material.id}'
+    etag = client.get(url).headers['ETag']
+
+    with app.app_context():
+        db.session.get(app_module.Material, material.id).band_gap = 1.5
+        db.session.commit()
+
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['band_gap'] == 1.5
+    assert response.headers['ETag'] != etag
@@ -0,0 +1,51 @@
+import os
+
+import numpy as np
+
+from utils.spectra_storage import save_band_structure, save_dos
+
+
+def test_delete_material_removes_spectra(app_module, app, db, client, make_user, make_material, login):
+    owner = make_user()
+    material = make_material(owner)
+    band_path = save_band_structure(app.config['BANDS_FOLDER'], material.id, {
+        'kpoints': np.linspace(0, 1, 20), 'energies': np.random.default_rng(0).normal(size=(20, 4)),
+    })
+    dos_path = save_dos(app.config['DOS_FOLDER'], material.id, {
+        'energy': np.linspace(-5, 5, 50), 'total_dos': np.ones(50), 'partial_dos': {'M-d': np.ones(50)},
+    })
+    with app.app_context():
+        db.session.get(app_module.Material, material.id).band_structure_path = band_path
+        db.session.get(app_module.Material, material.id).dos_path = dos_path
+        db.session.commit()
+
+    login(owner)
+    response = client.post(f'/material/{material.id}/delete')
+
+    assert response.status_code == 302
+    with app.app_context():
+        assert db.session.get(app_module.Material, material.id) is None
+    assert not os.path.exists(band_path)
+    assert not os.path.exists(dos_path)
+
+
+def test_download_counts_without_login(app_module, app, db, client, make_user, make_material, login, tmp_path):
+    cif = tmp_path / 'CrI3.cif'
+    cif.write_text('data_CrI3\n')
+    public = make_material(make_user(), cif_file_path=str(cif))
+    hidden = make_material(make_user(), cif_file_path=str(cif))
+    with app.app_context():
+        db.session.get(app_module.Material, hidden.id).is_public = False
+        db.session.commit()
+
+    response = client.get(f'/material/{public.id}/download/cif')
+    assert response.status_code == 200
+    assert response.data == b'data_CrI3\n'
+    app_module.material_counters.flush()
+    with app.app_context():
+        assert db.session.get(app_module.Material, public.id).downloads == 1
+
+    assert client.get(f'/material/{hidden.id}/download/cif').status_code == 403
+    assert client.get(f'/material/{public.id}/download/poscar').status_code == 404
+    login(make_user())
+    assert client.get(f'/material/{hidden.id}/download/cif').status_code == 200
@@ -0,0 +1,101 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import numpy as np
+import pytest
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from PIL import Image
+
+from utils.plot_templates import PlotTemplate, _fill_polygons, band_structure_png, dos_png, encode_png
+
+
+def decode(png):
+    image = Image.open(BytesIO(png))
+    image.load()
+    return image
+
+
+def test_encode_png_round_trip():
+    rgba = np.random.default_rng(0).integers(0, 256, size=(37, 53, 4), dtype=np.uint8)
+    image = decode(encode_png(rgba, dpi=150))
+    assert image.mode == 'RGB'
+    assert image.size == (53, 37)
+    # pHYs хранит целое число точек на метр
+    assert image.info['dpi'] == pytest.approx((150, 150), abs=0.05)
+    assert np.array_equal(np.asarray(image), rgba[..., :3])
+
+
+def dos_data(seed=0):
+    rng = np.random.default_rng(seed)
+    energy = np.linspace(-10, 10, 500)
+    # Отрицательные участки: заливка where=dos > 0 распадается на части
+    total = np.sin(energy * rng.uniform(1, 3)) + 0.3
+    partial = {name: np.abs(np.cos(energy * rng.uniform(1, 3))) for name in ('M-d', 'X-p')}
+    return energy, total, partial
+
+
+@pytest.mark.parametrize('channels', [2, 0])
+def test_dos_png(channels):
+    energy, total, partial = dos_data()
+    partial = dict(list(partial.items())[:channels])
+    first = dos_png(energy, total, partial, dpi=40)
+    # Второе изображение из того же шаблона с другими данными
+    other = dos_png(*dos_data(seed=1)[:2], {name: values[::-1] for name, values in partial.items()}, dpi=40)
+    assert decode(first).size == decode(other).size
+    assert first != other
+    assert dos_png(energy, total, partial, dpi=40) == first
+
+
+def test_band_structure_png():
+    kpoints = np.linspace(0, 3, 100)
+    energies = np.sin(np.outer(kpoints, np.arange(1, 6)))
+    png = band_structure_png(kpoints, energies, {'\\Gamma': 0.0, 'K': kpoints[-1]}, dpi=40)
+    assert decode(png).size == (480, 320)
+    with pytest.raises(ValueError):
+        band_structure_png(kpoints, energies[:-1], {}, dpi=40)
+
+
+def test_wide_tick_labels_fall_back_to_relayout(monkeypatch):
+    relayouts = []
+    png_relayout = PlotTemplate.png_relayout
+    monkeypatch.setattr(PlotTemplate, 'png_relayout', lambda self: relayouts.append(self) or png_relayout(self))
+    kpoints = np.linspace(0, 3, 100)
+    energies = np.sin(np.outer(kpoints, np.arange(1, 6)))
+    labels = {'\\Gamma': 0.0, 'K': kpoints[-1]}
+    png = band_structure_png(kpoints, energies, labels, dpi=40)
+    assert not relayouts
+
+    # Подписи вида -100000 заходят на подпись оси энергии
+    wide = band_structure_png(kpoints, energies * 1e5, labels, dpi=40)
+    assert len(relayouts) == 1
+    assert decode(wide).size == decode(png).size
+    # Раскладка шаблона восстановлена: следующее изображение как до отката
+    assert band_structure_png(kpoints, energies, labels, dpi=40) == png
+
+
+def test_threads_match_single_thread():
+    """У каждого потока свои шаблоны: PNG не зависят от того, в каком потоке нарисованы"""
+    kpoints = np.linspace(0, 3, 100)
+    renders = [
+        lambda: band_structure_png(kpoints, np.sin(np.outer(kpoints, np.arange(1, 6))), {'\\Gamma': 0.0}, dpi=40),
+        lambda: band_structure_png(kpoints, np.cos(np.outer(kpoints, np.arange(1, 9))), {'K': 3.0}, dpi=40),
+        lambda: dos_png(*dos_data(seed=0), dpi=40),
+        lambda: dos_png(*dos_data(seed=1)[:2], {}, dpi=40),
+    ]
+    expected = [render() for render in renders]
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda render: render(), renders * 4))
+    assert results == expected * 4
+
+
+def test_fill_polygons_match_fill_betweenx():
+    energy, total, _ = dos_data()
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    fill = figure.subplots().fill_betweenx(energy, 0, total, where=total > 0)
+    expected = [path.vertices[:-1] for path in fill.get_paths()]  # без замыкающей вершины
+    polygons = _fill_polygons(energy, total)
+    assert len(polygons) == len(expected) > 1
+    for polygon, vertices in zip(polygons, expected):
+        assert np.allclose(polygon, vertices)
@@ -0,0 +1,78 @@
+"""
+Число SQL-запросов страниц со списками не зависит от числа строк (нет N+1).
+Каждая страница запрашивается при двух размерах списка; строки создаются
+разными пользователями, чтобы ленивая загрузка авторов дала лишние запросы.
+"""
+import pytest
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+
+from utils.query_counter import QueryBudgetExceeded, init_query_counter
+
+SMALL, LARGE = 2, 6
+
+
+def sql_queries(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    return int(response.headers['X-SQL-Queries'])
+
+
+def counts_at_two_sizes(client, url, grow):
+    """Число запросов url после grow(SMALL) и после еще grow(LARGE - SMALL)"""
+    grow(SMALL)
+    sql_queries(client, url)  # прогрев кэшей счетчиков и сессии входа
+    small = sql_queries(client, url)
+    grow(LARGE - SMALL)
+    return small, sql_queries(client, url)
+
+
+def test_profile_bookmarks_and_verifications(app_module, app, db, client, make_user, make_material, login):
+    expert = make_user(role='expert')
+    login(expert)
+
+    def grow(n):
+        # Разные материалы: загруженные одним списком не должны скрывать запросы другого
+        bookmarked = [make_material(make_user()) for _ in range(n)]
+        verified = [make_material(make_user()) for _ in range(n)]
+        with app.app_context():
+            for material in bookmarked:
+                db.session.add(app_module.Bookmark(user_id=expert.id, material_id=material.id))
+            for material in verified:
+                db.session.add(app_module.Verification(material_id=material.id, expert_id=expert.id,
+                                                       overall_score=4.0))
+            db.session.commit()
+
+    small, large = counts_at_two_sizes(client, '/profile', grow)
+    assert small == large
+
+
+@pytest.mark.parametrize('url', ['/admin', '/browse', '/api/materials'])
+def test_material_lists(client, make_user, make_material, login, url):
+    login(make_user(role='admin'))
+
+    def grow(n):
+        for _ in range(n):
+            make_material(make_user())
+
+    small, large = counts_at_two_sizes(client, url, grow)
+    assert small == large
+
+
+def test_query_budget(tmp_path):
+    """SQL_QUERY_BUDGET: запрос сверх бюджета завершается ошибкой с именем эндпоинта"""
+    app = Flask(__name__)
+    app.config.update(TESTING=True, SQLALCHEMY_DATABASE_URI=f'sqlite:///{tmp_path / "budget.db"}', SQL_QUERY_BUDGET=2)
+    db = SQLAlchemy(app)
+    init_query_counter(app, db)
+
+    @app.route('/queries/<int:n>')
+    def queries(n):
+        for _ in range(n):
+            db.session.execute(db.text('SELECT 1'))
+        return ''
+
+    client = app.test_client()
+    assert client.get('/queries/2').headers['X-SQL-Queries'] == '2'
+    with pytest.raises(QueryBudgetExceeded, match=r'GET /queries/3 \(queries\) executed 3 SQL statements'):
+        client.get('/queries/3')
@@ -0,0 +1,88 @@
+"""
+Планы запросов страниц browse (EXPLAIN QUERY PLAN, SQLite): страница
+читается по индексу в порядке (created_at, id) и заканчивается через
+per_page + 1 строк. Сортировка во временном B-дереве означает, что читаются
+и сортируются все подходящие строки, поэтому такой план - ошибка.
+"""
+import itertools
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from utils.pagination import encode_cursor, keyset_query
+
+CURSOR = encode_cursor(datetime(2024, 1, 1), 1000)
+# formula, magnetic_order, verified_only, min_tc, max_band_gap; 'Cr' короче
+# трех символов и ищется подстрокой в формуле, 'CrI' - через FTS
+FILTERS = list(itertools.product(('', 'Cr'), ('', 'FM'), (False, True), (0, 100.0), (10, 2.0)))
+
+
+def explain(db, query):
+    sql = query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+    return [row[-1] for row in db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+
+
+def expected_indexes(magnetic_order, verified_only):
+    """Индексы, равенства которых совпадают с фильтрами, а хвост - с порядком страницы"""
+    indexes = set()
+    if magnetic_order:
+        indexes.add('ix_material_public_magnetic_created')
+    if verified_only:
+        indexes.add('ix_material_public_verified_created')
+    return indexes or {'ix_material_public_created'}
+
+
+@pytest.fixture(scope='module')
+def catalog(app_module):
+    """
+    Материалы с разными фильтруемыми значениями. Без ANALYZE, как база из
+    db.create_all(): без статистики планировщик сильнее всего склонен
+    выбирать индекс по фильтру и сортировать результат
+    """
+    db, start = app_module.db, datetime(2023, 1, 1)
+    with app_module.app.app_context():
+        user = app_module.User(username='plan-author', email='plan-author@example.org')
+        user.set_password('secret')
+        db.session.add(user)
+        db.session.flush()
+        for i in range(300):
+            db.session.add(app_module.Material(
+                name=f'Plan {i}', formula=('CrI3', 'MoS2', 'FeCl2')[i % 3], user_id=user.id,
+                is_public=i % 10 != 0, magnetic_order=('FM', 'AFM', None)[i % 3],
+                is_verified=i % 4 == 0, curie_temperature=i % 200, band_gap=(i % 50) / 10,
+                created_at=start + timedelta(hours=i),
+            ))
+        db.session.commit()
+
+
+@pytest.mark.parametrize('cursor', [None, CURSOR], ids=['first', 'cursor'])
+@pytest.mark.parametrize('formula,magnetic_order,verified_only,min_tc,max_band_gap', FILTERS)
+def test_browse_page_uses_ordered_index(app_module, app, db, catalog, cursor,
+                                        formula, magnetic_order, verified_only, min_tc, max_band_gap):
+    with app.app_context():
+        query = app_module.browse_query(formula, magnetic_order=magnetic_order, verified_only=verified_only,
+                                        min_tc=min_tc, max_band_gap=max_band_gap)
+        plan = explain(db, keyset_query(query, app_module.Material, 20, cursor))
+    assert not [step for step in plan if 'TEMP B-TREE' in step], plan
+    assert len(plan) == 1, plan
+    step = plan[0]
+    assert step.startswith('SEARCH material USING INDEX '), plan
+    assert step.split()[4] in expected_indexes(magnetic_order, verified_only), plan
+    if cursor:
+        assert 'created_at<?' in step, plan
+
+
+@pytest.mark.parametrize('magnetic_order,verified_only,min_tc,max_band_gap',
+                         list(itertools.product(('', 'FM'), (False, True), (0, 100.0), (10, 2.0))))
+def test_search_reads_matches_first(app_module, app, db, catalog, magnetic_order, verified_only, min_tc, max_band_gap):
+    """
+    Поиск упорядочен по bm25, поэтому сортируются только совпадения FTS:
+    план начинается с material_fts, а material читается по первичному ключу
+    """
+    with app.app_context():
+        query, rank = app_module.search_query('CrI', magnetic_order=magnetic_order, verified_only=verified_only,
+                                              min_tc=min_tc, max_band_gap=max_band_gap)
+        plan = explain(db, query.order_by(rank, app_module.Material.id).limit(21))
+    assert plan[0].startswith('SCAN material_fts VIRTUAL TABLE'), plan
+    assert plan[1] == 'SEARCH material USING INTEGER PRIMARY KEY (rowid=?)', plan
@@ -0,0 +1,72 @@
+"""
+Заглушка "Визуализации готовятся" на странице материала: только пока
+render-worker жив и задание не устарело, иначе страница рисует сама.
+"""
+import re
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from utils.render_cache import RenderCache
+from utils.spectra_storage import save_band_structure
+
+PLACEHOLDER = 'Визуализации готовятся'
+
+
+@pytest.fixture
+def queued_material(app_module, app, db, make_user, make_material, tmp_path, monkeypatch):
+    """Материал с зонной структурой и заданием отрисовки в очереди; кэш рендеров во временной папке"""
+    monkeypatch.setattr(app_module, 'render_cache', RenderCache(str(tmp_path / 'renders'), max_bytes=10 ** 8))
+    material = make_material(make_user())
+    path = save_band_structure(app.config['BANDS_FOLDER'], material.id, {
+        'kpoints': np.linspace(0, 1, 50), 'energies': np.random.default_rng(0).normal(size=(50, 4)),
+    })
+    with app.app_context():
+        db.session.get(app_module.Material, material.id).band_structure_path = path
+        db.session.add(app_module.RenderJob(material_id=material.id))
+        db.session.commit()
+    yield material
+    with app.app_context():
+        app_module.RenderWorker.query.delete()
+        db.session.commit()
+
+
+def heartbeat(app_module, app, db, age=0):
+    with app.app_context():
+        db.session.add(app_module.RenderWorker(name=f'test:{age}',
+                                               heartbeat_at=datetime.utcnow() - timedelta(seconds=age)))
+        db.session.commit()
+
+
+def page(client, material):
+    response = client.get(f'/material/{material.id}')
+    assert response.status_code == 200
+    return response.get_data(as_text=True)
+
+
+def test_placeholder_while_worker_alive(app_module, app, db, client, queued_material):
+    heartbeat(app_module, app, db)
+    html = page(client, queued_material)
+    assert PLACEHOLDER in html
+    assert '/static/renders/' not in html
+
+
+@pytest.mark.parametrize('worker_age', [None, 3600], ids=['no-worker', 'dead-worker'])
+def test_renders_inline_without_worker(app_module, app, db, client, queued_material, worker_age):
+    if worker_age is not None:
+        heartbeat(app_module, app, db, age=worker_age)
+    html = page(client, queued_material)
+    assert PLACEHOLDER not in html
+    assert re.search(r'<img src="/static/renders/[^"]+" alt="Band Structure"', html)
+
+
+def test_renders_inline_for_old_job(app_module, app, db, client, queued_material):
+    heartbeat(app_module, app, db)
+    with app.app_context():
+        app_module.RenderJob.query.filter_by(material_id=queued_material.id).update(
+            {'created_at': datetime.utcnow() - timedelta(seconds=app.config['RENDER_JOB_MAX_AGE'] + 1)})
+        db.session.commit()
+    html = page(client, queued_material)
+    assert PLACEHOLDER not in html
+    assert re.search(r'<img src="/static/renders/[^"]+" alt="Band Structure"', html)
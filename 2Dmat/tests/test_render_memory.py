@@ -0,0 +1,108 @@
+"""
+Память визуализаторов в пуле потоков: после N изображений всех четырех
+видов (структура, обратная решетка, зоны, DOS) число живых Figure не
+растет, а RSS ограничен. Часть вызовов падает уже после создания фигуры:
+при записи PNG (new_figure/save_figure и шаблоны) и при отрисовке
+неверной метки mathtext внутри шаблона зонной структуры.
+"""
+import gc
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from ase.build import mx2
+from ase.io import write
+from matplotlib.figure import Figure
+
+from utils.structure_cache import structure_cache
+from utils.visualization import BandStructureVisualizer, DOSVisualizer, StructureVisualizer
+
+THREADS = 4
+# Проходов по всем вызовам; нагрузочный прогон на 10000 изображений:
+# RENDER_STRESS_ROUNDS=1250 python -m pytest tests/test_render_memory.py
+ROUNDS = int(os.environ.get('RENDER_STRESS_ROUNDS', 6))
+DPI = 30
+# Шаблонов на поток: зоны и DOS с двумя каналами
+TEMPLATES_PER_THREAD = 2
+# Рост RSS после прогрева, МБ; утекающая фигура на вызов дала бы больше
+MAX_RSS_GROWTH_MB = 25
+
+pytestmark = pytest.mark.skipif(not os.path.exists('/proc/self/statm'), reason='RSS is read from /proc')
+
+
+def rss_mb():
+    with open('/proc/self/statm') as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+def live_figures():
+    gc.collect()
+    return sum(isinstance(o, Figure) for o in gc.get_objects())
+
+
+@pytest.fixture
+def tasks(tmp_path, monkeypatch):
+    """(имя, вызов, ожидается ли PNG) для всех видов графиков, с ошибками после создания фигуры"""
+    monkeypatch.setattr(structure_cache, 'sidecar_dir', None)
+    cif = str(tmp_path / 'MoS2.cif')
+    write(cif, mx2('MoS2', vacuum=8.0))
+    unwritable = str(tmp_path / 'missing' / 'plot.png')
+
+    rng = np.random.default_rng(0)
+    kpoints = np.linspace(0, 3, 200)
+    bands = {'kpoints': kpoints, 'energies': np.sin(np.outer(kpoints, np.arange(1, 9))) + rng.normal(size=8),
+             'labels': {'\\Gamma': 0.0, 'K': 3.0}}
+    # Метка разбирается mathtext только при отрисовке шаблона
+    bad_label = dict(bands, labels={'\\frac{': 0.0})
+    energy = np.linspace(-10, 10, 2000)
+    dos = {'energy': energy, 'total_dos': np.abs(np.sin(energy)),
+           'partial_dos': {'Mo-d': np.abs(np.cos(energy)), 'S-p': np.abs(np.sin(2 * energy))}}
+
+    return [
+        ('structure', lambda: StructureVisualizer.create_structure_plot(cif, dpi=DPI), True),
+        ('structure-save-fails', lambda: StructureVisualizer.create_structure_plot(cif, unwritable, dpi=DPI), False),
+        ('reciprocal', lambda: StructureVisualizer.create_reciprocal_lattice_plot(cif, dpi=DPI), True),
+        ('reciprocal-save-fails',
+         lambda: StructureVisualizer.create_reciprocal_lattice_plot(cif, unwritable, dpi=DPI), False),
+        ('bands', lambda: BandStructureVisualizer.create_band_structure_plot(bands, dpi=DPI), True),
+        ('bands-bad-label', lambda: BandStructureVisualizer.create_band_structure_plot(bad_label, dpi=DPI), False),
+        ('dos', lambda: DOSVisualizer.create_dos_plot(dos, dpi=DPI), True),
+        ('dos-save-fails', lambda: DOSVisualizer.create_dos_plot(dos, unwritable, dpi=DPI), False),
+    ]
+
+
+def test_figures_and_rss_stay_flat(tasks, capsys):
+    # Шаблоны, оставшиеся от других тестов в других потоках
+    before = live_figures()
+
+    def run(task):
+        name, render, ok = task
+        assert (render() is not None) == ok, name
+
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        # Прогрев в каждом потоке пула: шаблоны зон и DOS у каждого потока свои
+        barrier = threading.Barrier(THREADS)
+
+        def warm_up():
+            barrier.wait()
+            for task in tasks:
+                run(task)
+
+        for future in [pool.submit(warm_up) for _ in range(THREADS)]:
+            future.result()
+        baseline = rss_mb()
+
+        # Замер после каждой половины прогона
+        samples = []
+        for _ in range(2):
+            list(pool.map(run, tasks * max(ROUNDS // 2, 1)))
+            samples.append((live_figures(), rss_mb() - baseline))
+
+    capsys.readouterr()
+    # Живы только шаблоны потоков: упавший шаблон закрывается, а новый
+    # строится при следующем вызове
+    assert all(figures - before <= THREADS * TEMPLATES_PER_THREAD for figures, _ in samples), (before, samples)
+    assert all(growth < MAX_RSS_GROWTH_MB for _, growth in samples), samples
@@ -0,0 +1,91 @@
+"""
+Кэш структур: .npz рядом с разобранными файлами удаляются вместе с
+материалом или при замене файла, а папка .npz ограничена по объему.
+"""
+import io
+import os
+
+import pytest
+from ase.build import mx2
+from ase.io import write
+
+from utils.structure_cache import StructureCache, structure_cache
+
+
+def write_cif(path, formula='MoS2'):
+    write(str(path), mx2(formula, vacuum=8.0))
+    return str(path)
+
+
+@pytest.fixture
+def sidecars(tmp_path, monkeypatch):
+    """Общий кэш процесса с папкой .npz во временном каталоге"""
+    folder = tmp_path / 'structures'
+    folder.mkdir()
+    monkeypatch.setattr(structure_cache, 'sidecar_dir', str(folder))
+    monkeypatch.setattr(structure_cache, '_sidecar_size', None)
+    return folder
+
+
+def test_forget_removes_sidecar(tmp_path):
+    cache = StructureCache(sidecar_dir=str(tmp_path / 'structures'))
+    os.makedirs(cache.sidecar_dir)
+    cif = write_cif(tmp_path / 'MoS2.cif')
+    cache.read(cif)
+    assert len(os.listdir(cache.sidecar_dir)) == 1
+
+    cache.forget(cif)
+    assert os.listdir(cache.sidecar_dir) == []
+    assert cache.stats()['entries'] == 0
+    # Файла в кэше уже нет - повторный вызов ничего не делает
+    cache.forget(cif)
+
+
+def test_sidecars_are_bounded(tmp_path):
+    cache = StructureCache(sidecar_dir=str(tmp_path / 'structures'))
+    os.makedirs(cache.sidecar_dir)
+    cifs = [write_cif(tmp_path / f'{formula}.cif', formula) for formula in ('MoS2', 'WS2', 'MoSe2', 'WSe2')]
+    cache.read(cifs[0])
+    [sidecar] = os.listdir(cache.sidecar_dir)
+    # Места хватает на два .npz
+    cache.sidecar_max_bytes = 2 * os.path.getsize(os.path.join(cache.sidecar_dir, sidecar)) + 100
+
+    for cif in cifs[1:]:
+        cache.read(cif)
+    assert sorted(os.listdir(cache.sidecar_dir)) == sorted(os.path.basename(cache._sidecar_path(os.path.realpath(cif)))
+                                                           for cif in cifs[2:])
+
+
+def test_delete_material_removes_sidecar(app_module, app, db, client, make_user, make_material, login,
+                                         sidecars, tmp_path):
+    owner = make_user()
+    cif = write_cif(tmp_path / 'MoS2.cif')
+    material = make_material(owner, cif_file_path=cif)
+    structure_cache.read(cif)
+    assert len(os.listdir(sidecars)) == 1
+
+    login(owner)
+    assert client.post(f'/material/{material.id}/delete').status_code == 302
+    assert os.listdir(sidecars) == []
+
+
+def test_replaced_structure_removes_sidecar(app_module, app, db, client, make_user, make_material, login,
+                                           sidecars, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    (tmp_path / 'cif').mkdir()
+    owner = make_user()
+    cif = write_cif(tmp_path / 'MoS2.cif')
+    material = make_material(owner, cif_file_path=cif)
+    structure_cache.read(cif)
+    assert len(os.listdir(sidecars)) == 1
+
+    login(owner)
+    with open(write_cif(tmp_path / 'WS2.cif', 'WS2'), 'rb') as f:
+        response = client.post(f'/material/{material.id}/edit', data={
+            'name': material.name, 'formula': 'WS2', 'cif_file': (io.BytesIO(f.read()), 'WS2.cif'),
+            **dict.fromkeys(('crystal_system', 'calculation_method', 'band_gap_type', 'magnetic_order'), ''),
+        }, content_type='multipart/form-data')
+    assert response.status_code == 302
+    with app.app_context():
+        assert db.session.get(app_module.Material, material.id).cif_file_path != cif
+    assert os.listdir(sidecars) == []
@@ -1,3 +1,5 @@
+from types import MappingProxyType
+
 translations = {
     'en': {
         'home': 'Home',
@@ -72,6 +74,8 @@ translations = {
         'total': 'Total',
         'no_materials_found': 'No materials found with current filters',
         'show_all': 'Show All',
+        'next_page': 'Next',
+        'first_page': 'First page',
         'verified_experts': 'Verified by Experts',
         'verified_only': 'Verified Only',
         'all': 'All',
@@ -206,9 +210,10 @@ translations = {
         'download': 'Download',
         'no_backups': 'No backups available',
         'backup_info': 'Backup Information',
-        'backup_info_1': 'Backups are stored in the /backups folder',
-        'backup_info_2': 'Before restoring, a backup of current database is created',
+        'backup_info_1': 'Backups are stored in the /backups folder, compressed; only the newest are kept',
+        'backup_info_2': 'Before restoring, a backup of current database is created and kept',
         'backup_info_3': 'Only administrators can create and restore backups',
+        'backup_in_progress': 'Backup or restore in progress',
         'back': 'Back',
     },
     'ru': {
@@ -281,6 +286,8 @@ translations = {
         'total': 'Всего',
         'no_materials_found': 'Материалы по заданным фильтрам не найдены',
         'show_all': 'Показать все',
+        'next_page': 'Далее',
+        'first_page': 'В начало',
         'verified_experts': 'Верифицировано экспертами',
         'verified_only': 'Только верифицированные',
         'all': 'Все',
@@ -403,13 +410,87 @@ translations = {
         'first_material': 'Добавьте первый материал',
         'verification_list': 'Лист верификации',
         'pending_materials': 'Материалы на верификации',
+        'approved': 'Одобрено',
+        'rejected': 'Отклонено',
+        'in_progress': 'В процессе',
+        'logout_success': 'Вы вышли из системы',
+        'backup': 'Резервная копия',
+        'database_backups': 'Резервные копии базы данных',
+        'create_backup': 'Создать резервную копию',
+        'available_backups': 'Доступные резервные копии',
+        'filename': 'Имя файла',
+        'size': 'Размер',
+        'created': 'Создана',
+        'restore': 'Восстановить',
+        'no_backups': 'Резервных копий нет',
+        'backup_info': 'О резервных копиях',
+        'backup_info_1': 'Резервные копии хранятся в папке /backups в сжатом виде; хранятся только последние',
+        'backup_info_2': 'Перед восстановлением создается и сохраняется копия текущей базы данных',
+        'backup_info_3': 'Создавать и восстанавливать резервные копии могут только администраторы',
+        'back': 'Назад',
+        'backup_in_progress': 'Выполняется резервное копирование или восстановление',
     }
 }
 
-def get_locale():
+LANGUAGES = ('en', 'ru')
+DEFAULT_LANGUAGE = 'en'
+
+
+class Catalog:
+    """
+    Скомпилированный каталог одного языка: неизменяемый плоский словарь,
+    в котором недостающие переводы уже заменены английскими.
+    catalog(key) возвращает перевод, а для неизвестного ключа - сам ключ
+    (ключи шаблонов без перевода находит flask check-translations).
+    """
+
+    __slots__ = ('language', 'messages', 'missing')
+
+    def __init__(self, language, messages, missing):
+        self.language = language
+        self.messages = MappingProxyType(messages)
+        self.missing = frozenset(missing)
+
+    def __call__(self, key):
+        return self.messages.get(key, key)
+
+    def __contains__(self, key):
+        return key in self.messages
+
+
+def compile_catalogs(source=translations, default=DEFAULT_LANGUAGE):
+    """Каталоги всех языков из словаря translations (один раз при запуске)"""
+    base = source[default]
+    catalogs = {}
+    for language, messages in source.items():
+        compiled = dict(base)
+        compiled.update(messages)
+        catalogs[language] = Catalog(language, compiled, set(base) - set(messages))
+    return MappingProxyType(catalogs)
+
+
+CATALOGS = compile_catalogs()
+
+
+def resolve_locale():
+    """Язык из сессии или заголовка Accept-Language"""
     from flask import session, request
-    return session.get('language', request.accept_languages.best_match(['en', 'ru']))
+    language = session.get('language') or request.accept_languages.best_match(LANGUAGES)
+    return language if language in CATALOGS else DEFAULT_LANGUAGE
+
+
+def get_locale():
+    """Язык текущего запроса; определяется один раз и хранится в g"""
+    from flask import g
+    locale = g.get('locale')
+    if locale is None:
+        locale = g.locale = resolve_locale()
+    return locale
+
+
+def get_catalog():
+    return CATALOGS[get_locale()]
+
 
 def t(key):
-    lang = get_locale() or 'en'
-    return translations.get(lang, translations['en']).get(key, key)
+    return get_catalog()(key)
@@ -0,0 +1,283 @@
+"""
+Резервные копии SQLite без остановки приложения.
+
+Копия снимается через sqlite3.Connection.backup по pages страниц за шаг.
+В режиме WAL источник держит одну транзакцию чтения на всю копию: все шаги
+читают один снимок базы, а запись идет параллельно (без нее SQLite начинал
+бы копию заново после каждой записи другого соединения). В режиме журнала
+отката блокировка чтения снимается между шагами, и запись проходит между
+ними, но изменение источника перезапускает копию.
+Готовый файл проверяется PRAGMA quick_check, сжимается потоково (gzip или
+zstd при установленном пакете zstandard) и атомарно переименовывается;
+лишние старые копии удаляются по политике хранения: keep последних плановых
+копий и keep_pre_restore последних копий, снятых перед восстановлением.
+
+Задания выполняются фоновым потоком, ход выполнения пишется в
+<folder>/status.json и доступен всем процессам приложения.
+
+Восстановление не перезаписывает файл под работающим движком: сначала
+снимается копия текущей базы, затем содержимое резервной копии переносится
+в рабочую базу тем же backup API (SQLite держит блокировку записи, поэтому
+другие соединения видят либо старую, либо новую базу целиком), после чего
+пул соединений движка пересоздается.
+"""
+import gzip
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:  # сжатие zstd недоступно
+    zstandard = None
+
+BACKUP_NAME = re.compile(r'^backup_\d{8}_\d{6}(_pre_restore)?\.db(\.gz|\.zst)?$')
+COMPRESSION_SUFFIXES = {'none': '', 'gzip': '.gz', 'zstd': '.zst'}
+CHUNK_SIZE = 1024 * 1024
+
+
+def zstd_available():
+    return zstandard is not None
+
+
+def is_backup_name(filename):
+    return bool(BACKUP_NAME.match(filename))
+
+
+def _open_compressed(path, mode, compression):
+    if compression == 'gzip':
+        return gzip.open(path, mode, compresslevel=6)
+    if compression == 'zstd':
+        if mode == 'wb':
+            return zstandard.ZstdCompressor(level=3, threads=-1).stream_writer(open(path, 'wb'))
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'))
+    return open(path, mode)
+
+
+def _compression_of(filename):
+    if filename.endswith('.gz'):
+        return 'gzip'
+    if filename.endswith('.zst'):
+        return 'zstd'
+    return 'none'
+
+
+def copy_database(source, target, pages=1024, pause=0.0, progress=None):
+    """
+    Копирует базу source (sqlite3.Connection) в target по pages страниц
+    за шаг; progress(remaining, total) вызывается после каждого шага
+    """
+    def step(status, remaining, total):
+        if progress is not None:
+            progress(remaining, total)
+        if pause and remaining:
+            # Даем запросам на запись пройти между шагами
+            time.sleep(pause)
+
+    source.backup(target, pages=pages, progress=step)
+
+
+class BackupManager:
+    """Резервное копирование и восстановление базы SQLite в фоновом потоке"""
+
+    def __init__(self, folder, keep=10, keep_pre_restore=3, compression='gzip', pages=1024, pause=0.0):
+        self.folder = folder
+        self.keep = keep
+        self.keep_pre_restore = keep_pre_restore
+        self.compression = compression
+        self.pages = pages
+        self.pause = pause
+        self.engine = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def init_app(self, app, db):
+        with app.app_context():
+            self.engine = db.engine
+        self.folder = app.config.get('BACKUP_FOLDER', self.folder)
+        self.keep = app.config.get('BACKUP_KEEP', self.keep)
+        self.keep_pre_restore = app.config.get('BACKUP_KEEP_PRE_RESTORE', self.keep_pre_restore)
+        self.compression = app.config.get('BACKUP_COMPRESSION', self.compression)
+        self.pages = app.config.get('BACKUP_PAGES_PER_STEP', self.pages)
+        self.pause = app.config.get('BACKUP_STEP_PAUSE', self.pause)
+        os.makedirs(self.folder, exist_ok=True)
+
+    def database_path(self):
+        if self.engine is None or self.engine.dialect.name != 'sqlite':
+            raise RuntimeError('Online backups are supported for SQLite only; use pg_dump for PostgreSQL')
+        path = self.engine.url.database
+        if not path or path == ':memory:':
+            raise RuntimeError('In-memory database cannot be backed up')
+        return path
+
+    # Состояние задания
+
+    @property
+    def _status_path(self):
+        return os.path.join(self.folder, 'status.json')
+
+    def status(self):
+        """Последнее задание: state (running/done/failed), kind, file, progress и т.д."""
+        try:
+            with open(self._status_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'state': 'idle'}
+
+    def _write_status(self, **status):
+        fd, tmp_path = tempfile.mkstemp(dir=self.folder, prefix='.status-')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(status, f)
+        os.replace(tmp_path, self._status_path)
+
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, kind, filename=None):
+        """
+        Запускает задание kind ('backup' или 'restore' из filename) в фоновом
+        потоке; False, если другое задание этого процесса еще выполняется
+        """
+        self.database_path()  # ошибка конфигурации - сразу, а не в потоке
+        if kind == 'restore' and not self.exists(filename):
+            raise FileNotFoundError(filename)
+        with self._lock:
+            if self.running():
+                return False
+            target = self.backup if kind == 'backup' else lambda: self.restore(filename)
+            self._thread = threading.Thread(target=self._run, args=(kind, filename, target),
+                                            name=f'database-{kind}', daemon=True)
+            self._thread.start()
+        return True
+
+    def _run(self, kind, filename, target):
+        try:
+            target()
+        except Exception as e:
+            self._write_status(state='failed', kind=kind, file=filename,
+                               error=f'{type(e).__name__}: {e}', finished_at=time.time())
+            print(f"Ошибка {'резервного копирования' if kind == 'backup' else 'восстановления'}: {e}")
+
+    # Резервные копии
+
+    def list(self):
+        """Резервные копии от новых к старым: name, size, mtime"""
+        backups = []
+        for name in os.listdir(self.folder):
+            if is_backup_name(name):
+                stat = os.stat(os.path.join(self.folder, name))
+                backups.append({'name': name, 'size': stat.st_size, 'mtime': stat.st_mtime})
+        backups.sort(key=lambda b: (b['mtime'], b['name']), reverse=True)
+        return backups
+
+    def exists(self, filename):
+        return bool(filename) and is_backup_name(filename) and os.path.isfile(os.path.join(self.folder, filename))
+
+    def backup(self, suffix='', compression=None, progress=None):
+        """Снимает резервную копию; возвращает имя файла"""
+        compression = compression or self.compression
+        if compression == 'zstd' and zstandard is None:
+            raise RuntimeError('zstd compression needs the zstandard package')
+        name = f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}{suffix}.db{COMPRESSION_SUFFIXES[compression]}"
+        started = time.time()
+
+        def report(remaining, total):
+            self._write_status(state='running', kind='backup', file=name, started_at=started,
+                               pages_total=total, pages_done=total - remaining)
+            if progress is not None:
+                progress(remaining, total)
+
+        fd, snapshot = tempfile.mkstemp(dir=self.folder, prefix='.snapshot-', suffix='.db')
+        os.close(fd)
+        try:
+            source = sqlite3.connect(self.database_path(), isolation_level=None)
+            target = sqlite3.connect(snapshot)
+            try:
+                if source.execute('PRAGMA journal_mode').fetchone()[0] == 'wal':
+                    source.execute('BEGIN')
+                    source.execute('SELECT count(*) FROM sqlite_master').fetchone()
+                copy_database(source, target, self.pages, self.pause, report)
+                check = target.execute('PRAGMA quick_check').fetchone()[0]
+                if check != 'ok':
+                    raise RuntimeError(f'Backup integrity check failed: {check}')
+            finally:
+                target.close()
+                source.close()
+
+            tmp_path = os.path.join(self.folder, f'.{name}.tmp')
+            with open(snapshot, 'rb') as src, _open_compressed(tmp_path, 'wb', compression) as dst:
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+            os.replace(tmp_path, os.path.join(self.folder, name))
+        finally:
+            if os.path.exists(snapshot):
+                os.remove(snapshot)
+
+        removed = self.apply_retention()
+        self._write_status(state='done', kind='backup', file=name, started_at=started,
+                           finished_at=time.time(), removed=removed,
+                           size=os.path.getsize(os.path.join(self.folder, name)))
+        return name
+
+    def apply_retention(self):
+        """
+        Удаляет плановые копии сверх keep и копии перед восстановлением сверх
+        keep_pre_restore. Счет раздельный, чтобы частые плановые копии не
+        вытесняли копии перед восстановлением; 0 - хранить все копии вида.
+        """
+        names = [b['name'] for b in self.list()]
+        removed = []
+        for keep, pre_restore in ((self.keep, False), (self.keep_pre_restore, True)):
+            if keep:
+                removed += [name for name in names if ('_pre_restore' in name) == pre_restore][keep:]
+        for name in removed:
+            os.remove(os.path.join(self.folder, name))
+        return removed
+
+    def restore(self, filename, progress=None):
+        """Заменяет содержимое рабочей базы резервной копией filename"""
+        if not self.exists(filename):
+            raise FileNotFoundError(filename)
+        started = time.time()
+
+        # Текущее состояние сохраняется; из таких копий хранятся keep_pre_restore последних
+        pre_restore = self.backup(suffix='_pre_restore')
+
+        def report(remaining, total):
+            self._write_status(state='running', kind='restore', file=filename, started_at=started,
+                               pre_restore=pre_restore, pages_total=total, pages_done=total - remaining)
+            if progress is not None:
+                progress(remaining, total)
+
+        fd, snapshot = tempfile.mkstemp(dir=self.folder, prefix='.restore-', suffix='.db')
+        os.close(fd)
+        try:
+            with _open_compressed(os.path.join(self.folder, filename), 'rb', _compression_of(filename)) as src, \
+                    open(snapshot, 'wb') as dst:
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+            source = sqlite3.connect(snapshot)
+            try:
+                check = source.execute('PRAGMA quick_check').fetchone()[0]
+                if check != 'ok':
+                    raise RuntimeError(f'Backup integrity check failed: {check}')
+                target = sqlite3.connect(self.database_path(), timeout=30)
+                try:
+                    # Один шаг (-1): рабочая база заменяется одной транзакцией
+                    copy_database(source, target, pages=-1, progress=report)
+                finally:
+                    target.close()
+            finally:
+                source.close()
+        finally:
+            os.remove(snapshot)
+
+        # Соединения пула могли закэшировать схему и страницы старой базы
+        self.engine.dispose()
+        self._write_status(state='done', kind='restore', file=filename, started_at=started,
+                           finished_at=time.time(), pre_restore=pre_restore)
+        return pre_restore
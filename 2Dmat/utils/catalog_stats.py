@@ -0,0 +1,154 @@
+"""
+Счетчики каталога (таблица CatalogStat), поддерживаемые событиями сессии.
+
+before_flush вычисляет изменения счетчиков по новым, измененным и удаленным
+Material/User, after_flush применяет их одним INSERT ... ON CONFLICT в той же
+транзакции. Массовые вставки мимо ORM (db.insert) счетчики не обновляют -
+после них нужен reconcile_stats().
+
+Счетчик VERSION_KEY увеличивается при любом изменении материалов через ORM
+(и при reconcile_stats) - это версия коллекции для ETag списков материалов.
+"""
+from collections import Counter
+
+from sqlalchemy import event, func, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import Material, User, CatalogStat
+
+# Колонки Material, от которых зависят счетчики
+TRACKED_COLUMNS = ('is_verified', 'magnetic_order', 'crystal_system')
+
+# Версия коллекции материалов (не число материалов)
+VERSION_KEY = 'materials_version'
+
+_DELTAS_KEY = 'catalog_stat_deltas'
+
+# INSERT ... ON CONFLICT DO UPDATE есть только в этих диалектах
+_UPSERT_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+def material_keys(is_verified, magnetic_order, crystal_system):
+    """Ключи счетчиков, в которые входит материал с такими свойствами"""
+    keys = ['materials']
+    if is_verified:
+        keys.append('verified_materials')
+    if magnetic_order:
+        keys.append(f'magnetic_order:{magnetic_order}')
+    if crystal_system:
+        keys.append(f'crystal_system:{crystal_system}')
+    return keys
+
+
+def _committed_value(state, name):
+    history = state.attrs[name].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return None
+
+
+def _collect_deltas(session, flush_context, instances):
+    deltas = session.info.setdefault(_DELTAS_KEY, Counter())
+    if any(isinstance(obj, Material) for obj in session.new) \
+            or any(isinstance(obj, Material) for obj in session.deleted) \
+            or any(isinstance(obj, Material) and session.is_modified(obj, include_collections=False)
+                   for obj in session.dirty):
+        deltas[VERSION_KEY] += 1
+    for obj in session.new:
+        if isinstance(obj, Material):
+            deltas.update(material_keys(*(getattr(obj, name) for name in TRACKED_COLUMNS)))
+        elif isinstance(obj, User):
+            deltas['users'] += 1
+    for obj in session.deleted:
+        if isinstance(obj, Material):
+            deltas.subtract(material_keys(*(getattr(obj, name) for name in TRACKED_COLUMNS)))
+        elif isinstance(obj, User):
+            deltas['users'] -= 1
+    for obj in session.dirty:
+        if not isinstance(obj, Material) or obj in session.deleted:
+            continue
+        state = inspect(obj)
+        if not any(state.attrs[name].history.has_changes() for name in TRACKED_COLUMNS):
+            continue
+        deltas.subtract(material_keys(*(_committed_value(state, name) for name in TRACKED_COLUMNS)))
+        deltas.update(material_keys(*(getattr(obj, name) for name in TRACKED_COLUMNS)))
+
+
+def _apply_deltas(session, flush_context):
+    deltas = session.info.pop(_DELTAS_KEY, None)
+    if deltas:
+        add_to_stats(session.connection(), deltas)
+
+
+def _clear_deltas(session, *args):
+    session.info.pop(_DELTAS_KEY, None)
+
+
+def add_to_stats(connection, deltas):
+    """Прибавляет deltas (ключ -> изменение) к счетчикам атомарно на стороне БД"""
+    rows = [{'key': key, 'value': value} for key, value in deltas.items() if value]
+    if not rows:
+        return
+    insert = _UPSERT_INSERTS.get(connection.dialect.name)
+    if insert is None:
+        raise NotImplementedError(f'CatalogStat upsert is not implemented for {connection.dialect.name}')
+    table = CatalogStat.__table__
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(index_elements=[table.c.key],
+                                      set_={'value': table.c.value + stmt.excluded.value})
+    connection.execute(stmt, rows)
+
+
+def init_catalog_stats(session):
+    """Подключает обновление счетчиков к сессии (db.session)"""
+    # Старое значение нужно при изменении, даже если атрибут еще не был загружен
+    for name in TRACKED_COLUMNS:
+        event.listen(getattr(Material, name), 'set', lambda *args: None, active_history=True)
+    event.listen(session, 'before_flush', _collect_deltas)
+    event.listen(session, 'after_flush', _apply_deltas)
+    event.listen(session, 'after_rollback', _clear_deltas)
+
+
+def compute_stats(session):
+    """Счетчики, пересчитанные по таблицам material и user"""
+    stats = Counter()
+    rows = session.query(
+        Material.is_verified, Material.magnetic_order, Material.crystal_system, func.count(Material.id)
+    ).group_by(Material.is_verified, Material.magnetic_order, Material.crystal_system).all()
+    for is_verified, magnetic_order, crystal_system, count in rows:
+        for key in material_keys(is_verified, magnetic_order, crystal_system):
+            stats[key] += count
+    stats['users'] = session.query(func.count(User.id)).scalar()
+    stats.setdefault('materials', 0)
+    stats.setdefault('verified_materials', 0)
+    return stats
+
+
+def reconcile_stats(session):
+    """
+    Пересчитывает CatalogStat с нуля. Возвращает {ключ: (было, стало)}
+    для расхождений.
+    """
+    current = dict(session.query(CatalogStat.key, CatalogStat.value).all())
+    fresh = compute_stats(session)
+    changes = {key: (current.get(key, 0), fresh.get(key, 0))
+               for key in set(current) | set(fresh)
+               if current.get(key, 0) != fresh.get(key, 0) and key != VERSION_KEY}
+    # Пересчет запускают после правок мимо ORM - версию коллекции увеличиваем
+    fresh[VERSION_KEY] = current.get(VERSION_KEY, 0) + 1
+    session.query(CatalogStat).delete()
+    session.bulk_insert_mappings(CatalogStat, [{'key': key, 'value': value} for key, value in fresh.items()])
+    session.commit()
+    return changes
+
+
+def materials_version(session):
+    """Версия коллекции материалов для ETag списков"""
+    return session.query(CatalogStat.value).filter(CatalogStat.key == VERSION_KEY).scalar() or 0
+
+
+def read_stats(session):
+    """Все счетчики одним запросом"""
+    return dict(session.query(CatalogStat.key, CatalogStat.value).all())
@@ -0,0 +1,67 @@
+"""
+Условные GET-запросы: сильные ETag и Last-Modified.
+
+ETag - хэш версии ресурса (updated_at материала, пути готовых изображений,
+версия коллекции и т.п.), а не тела ответа: версия читается легким
+запросом, и при совпадении с If-None-Match ответ 304 отдается без загрузки
+тяжелых колонок, отрисовки и сериализации. If-None-Match имеет приоритет
+над If-Modified-Since (RFC 9110, 13.2.2).
+
+Ответы с validators получают Cache-Control: no-cache - клиент может хранить
+копию, но перед использованием обязан ее проверить.
+"""
+import hashlib
+import os
+from datetime import timezone
+
+from flask import Response, request
+
+
+def make_etag(*parts):
+    """Сильный ETag (без кавычек) из частей версии ресурса"""
+    return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()[:32]
+
+
+def file_version(paths):
+    """Версия набора файлов по их размерам и mtime (для шаблонов страниц)"""
+    parts = []
+    for path in paths:
+        stat = os.stat(path)
+        parts.append((os.path.basename(path), stat.st_size, stat.st_mtime_ns))
+    return make_etag(*parts)
+
+
+def _utc(value):
+    # В базе время хранится без зоны (UTC); заголовки HTTP - с точностью до секунды
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.replace(microsecond=0)
+
+
+def is_not_modified(etag, last_modified=None):
+    """Актуальна ли копия клиента (по If-None-Match или If-Modified-Since)"""
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return _utc(last_modified) <= request.if_modified_since
+    return False
+
+
+def with_validators(response, etag, last_modified=None, private=False):
+    """Добавляет ETag, Last-Modified и Cache-Control к ответу"""
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = _utc(last_modified)
+    response.cache_control.no_cache = True
+    if private:
+        response.cache_control.private = True
+    else:
+        response.cache_control.public = True
+    return response
+
+
+def not_modified(etag, last_modified=None, private=False):
+    """Ответ 304 с теми же validators, что и у полного ответа"""
+    return with_validators(Response(status=304), etag, last_modified, private)
@@ -0,0 +1,145 @@
+"""
+Буферизованные счетчики просмотров и скачиваний материалов.
+
+Приращения копятся в памяти процесса и раз в flush_interval секунд
+записываются фоновым потоком пакетом UPDATE material SET views = views + n
+в одной транзакции. Запрос страницы не берет блокировку записи SQLite,
+а параллельные приращения не теряются (сложение выполняется в БД).
+При нормальном завершении процесса (atexit) буфер сбрасывается.
+"""
+import atexit
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+
+from sqlalchemy import bindparam, update
+
+
+class CounterBuffer:
+    """Приращения колонок-счетчиков таблицы с периодическим сбросом в БД"""
+
+    def __init__(self, table, columns=('views', 'downloads'), flush_interval=5.0):
+        self.table = table
+        self.columns = columns
+        self.flush_interval = flush_interval
+        self.engine = None
+        self._pending = defaultdict(Counter)  # колонка -> {id: n}
+        self._oldest = None  # время самого старого несброшенного приращения
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.flushed = 0
+        self.failures = 0
+        self.last_flush_at = None
+        self.last_flush_duration = 0.0
+
+    @property
+    def _keep_onupdate(self):
+        # Просмотр не изменяет материал: колонки с onupdate (updated_at) не трогаем
+        return {c.name: c for c in self.table.c if c.onupdate is not None}
+
+    def init_app(self, app, db):
+        with app.app_context():
+            self.engine = db.engine
+        self.flush_interval = app.config.get('COUNTER_FLUSH_INTERVAL', self.flush_interval)
+        atexit.register(self.stop)
+
+    def add(self, column, row_id, n=1):
+        if column not in self.columns:
+            raise ValueError(f'Unknown counter column: {column}')
+        self._ensure_thread()
+        with self._lock:
+            self._pending[column][row_id] += n
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+
+    def pending(self, column, row_id):
+        """Еще не записанные в БД приращения (для показа актуального значения)"""
+        with self._lock:
+            return self._pending[column].get(row_id, 0)
+
+    def flush(self):
+        """Записывает накопленные приращения; возвращает число обновленных строк"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, defaultdict(Counter)
+                oldest, self._oldest = self._oldest, None
+            if not any(batch.values()):
+                return 0
+
+            started = time.monotonic()
+            try:
+                with self.engine.begin() as connection:
+                    for column, increments in batch.items():
+                        if not increments:
+                            continue
+                        stmt = update(self.table).where(self.table.c.id == bindparam('row_id')).values(
+                            {column: self.table.c[column] + bindparam('n'), **self._keep_onupdate}
+                        )
+                        connection.execute(stmt, [{'row_id': row_id, 'n': n}
+                                                  for row_id, n in increments.items()])
+            except Exception as e:
+                # Возвращаем приращения в буфер, следующий сброс повторит запись
+                with self._lock:
+                    for column, increments in batch.items():
+                        self._pending[column].update(increments)
+                    if oldest is not None and (self._oldest is None or oldest < self._oldest):
+                        self._oldest = oldest
+                    self.failures += 1
+                print(f"Ошибка записи счетчиков: {e}")
+                return 0
+
+            rows = sum(len(increments) for increments in batch.values())
+            with self._lock:
+                self.flushed += sum(sum(increments.values()) for increments in batch.values())
+                self.last_flush_at = time.time()
+                self.last_flush_duration = time.monotonic() - started
+            return rows
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'pending_increments': sum(sum(c.values()) for c in self._pending.values()),
+                'pending_rows': sum(len(c) for c in self._pending.values()),
+                # Сколько секунд самое старое приращение ждет записи
+                'flush_lag_seconds': time.monotonic() - self._oldest if self._oldest is not None else 0.0,
+                'flushed_increments': self.flushed,
+                'flush_failures': self.failures,
+                'last_flush_at': self.last_flush_at,
+                'last_flush_duration_seconds': self.last_flush_duration,
+            }
+
+    def stop(self):
+        """Останавливает фоновый поток и сбрасывает остаток буфера"""
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=self.flush_interval + 5)
+        if self.engine is not None:
+            self.flush()
+
+    def _ensure_thread(self):
+        # После fork (gunicorn, ProcessPoolExecutor) поток родителя не существует
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid:
+            return
+        if self._pid is not None and self._pid != pid:
+            # Буфер и блокировки родителя в дочернем процессе не нужны
+            self._lock = threading.Lock()
+            self._flush_lock = threading.Lock()
+            self._pending = defaultdict(Counter)
+            self._oldest = None
+            self._stop = threading.Event()
+            self._thread = None
+        with self._lock:
+            if self._thread is not None and self._pid == pid:
+                return
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name='counter-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
@@ -0,0 +1,107 @@
+"""
+Настройка базы данных из переменных окружения.
+
+DATABASE_URL              основная база (по умолчанию sqlite:///2dmaterials.db)
+DATABASE_REPLICA_URL      реплика только для чтения (PostgreSQL), необязательна
+DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE
+                          пул соединений PostgreSQL
+SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_MMAP_SIZE, SQLITE_BUSY_TIMEOUT_MS
+                          PRAGMA для каждого нового соединения SQLite
+
+Эндпоинты, помеченные @read_only_endpoint, читают через реплику, если она
+задана; запись (flush) и остальные запросы всегда идут в основную базу.
+"""
+import os
+from functools import wraps
+
+from flask import g, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql import Select
+
+DEFAULT_DATABASE_URL = 'sqlite:///2dmaterials.db'
+REPLICA_BIND = 'replica'
+
+
+def _normalize_url(url):
+    # Heroku и docker-образы задают postgres://, SQLAlchemy понимает только postgresql://
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def database_config(environ=os.environ):
+    """Ключи конфигурации Flask-SQLAlchemy для текущего окружения"""
+    # Пустая переменная (DATABASE_URL=) - то же, что не заданная
+    url = _normalize_url(environ.get('DATABASE_URL') or DEFAULT_DATABASE_URL)
+    config = {
+        'SQLALCHEMY_DATABASE_URI': url,
+        'SQLITE_JOURNAL_MODE': environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'SQLITE_SYNCHRONOUS': environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'SQLITE_MMAP_SIZE': int(environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+        'SQLITE_BUSY_TIMEOUT_MS': int(environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    }
+
+    if url.startswith('sqlite'):
+        # timeout драйвера sqlite3 - то же ожидание блокировки, что и busy_timeout
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            'connect_args': {'timeout': config['SQLITE_BUSY_TIMEOUT_MS'] / 1000},
+        }
+    else:
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            'pool_size': int(environ.get('DB_POOL_SIZE', 10)),
+            'max_overflow': int(environ.get('DB_MAX_OVERFLOW', 20)),
+            'pool_timeout': int(environ.get('DB_POOL_TIMEOUT', 30)),
+            'pool_recycle': int(environ.get('DB_POOL_RECYCLE', 1800)),
+            'pool_pre_ping': True,
+        }
+
+    replica_url = environ.get('DATABASE_REPLICA_URL') or None
+    if replica_url:
+        config['SQLALCHEMY_BINDS'] = {REPLICA_BIND: _normalize_url(replica_url)}
+    return config
+
+
+def init_database_engines(app, db):
+    """PRAGMA для соединений SQLite; вызывается после db.init_app(app)"""
+    pragmas = (
+        f"PRAGMA journal_mode={app.config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA synchronous={app.config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA mmap_size={int(app.config['SQLITE_MMAP_SIZE'])}",
+        f"PRAGMA busy_timeout={int(app.config['SQLITE_BUSY_TIMEOUT_MS'])}",
+    )
+
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', set_sqlite_pragmas)
+
+
+def read_only_endpoint(view):
+    """Эндпоинт только читает данные: SELECT могут уходить на реплику"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_replica = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+class RoutingSession(Session):
+    """Сессия Flask-SQLAlchemy, направляющая SELECT эндпоинтов @read_only_endpoint на реплику"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing
+                and (clause is None or isinstance(clause, Select))
+                and has_request_context() and g.get('read_replica')):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
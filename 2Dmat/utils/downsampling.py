@@ -0,0 +1,107 @@
+"""
+Прореживание кривых для интерактивных графиков.
+
+lttb - Largest-Triangle-Three-Buckets: из каждой корзины точек оставляет ту,
+что образует треугольник наибольшей площади с уже выбранной точкой и
+средним следующей корзины. Пики и перегибы зон сохраняются, а число точек
+ограничено шириной графика в пикселях. Все зоны имеют общую ось k, поэтому
+корзины одинаковы и выбор выполняется сразу для всех зон.
+
+pack_traces склеивает кривые в один массив, разделяя их NaN: plotly рисует
+его одним trace с разрывами.
+"""
+import numpy as np
+
+from utils.lod import envelope, select_window
+
+# Уровень пирамиды выбирается так, чтобы на входе LTTB было не больше
+# LTTB_INPUT_FACTOR * (точек на зону) корзин
+LTTB_INPUT_FACTOR = 4
+
+
+def lttb(x, y, n_out):
+    """
+    Индексы точек, оставляемых LTTB.
+    x: (n,) общая ось, y: (n, m) - m кривых; результат (n_out, m).
+    Если точек не больше n_out, возвращаются все индексы.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if y.ndim == 1:
+        y = y[:, None]
+    n, m = y.shape
+    if n_out >= n or n_out < 3:
+        return np.broadcast_to(np.arange(n)[:, None], (n, m))
+
+    # n_out - 2 корзины между первой и последней точками
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    columns = np.arange(m)
+    indices = np.empty((n_out, m), dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    selected = np.zeros(m, dtype=np.int64)
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_lo, next_hi = hi, edges[i + 2]
+        else:
+            next_lo, next_hi = n - 1, n
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean(axis=0)
+        ax = x[selected]
+        ay = y[selected, columns]
+        bucket_x = x[lo:hi, None]
+        area = np.abs((ax - avg_x) * (y[lo:hi] - ay) - (ax - bucket_x) * (avg_y - ay))
+        selected = lo + area.argmax(axis=0)
+        indices[i + 1] = selected
+    return indices
+
+
+def pack_traces(x, y, indices=None, dtype=np.float32):
+    """
+    Кривые y[:, j] над общей осью x одним массивом с NaN между кривыми.
+    indices - результат lttb (по умолчанию все точки).
+    """
+    y = np.asarray(y)
+    if y.ndim == 1:
+        y = y[:, None]
+    if indices is None:
+        indices = np.broadcast_to(np.arange(y.shape[0])[:, None], y.shape)
+    points, curves = indices.shape
+    columns = np.arange(curves)
+    packed_x = np.full((curves, points + 1), np.nan, dtype=dtype)
+    packed_y = np.full((curves, points + 1), np.nan, dtype=dtype)
+    packed_x[:, :points] = np.asarray(x)[indices].T
+    packed_y[:, :points] = y[indices, columns].T
+    # Разделитель после последней кривой не нужен
+    return packed_x.ravel()[:-1], packed_y.ravel()[:-1]
+
+
+def band_window(kpoints, energies, kmin=None, kmax=None, px=800, max_points=200000, levels=None):
+    """
+    Видимый диапазон k зонной структуры, прореженный до px точек на зону
+    (и не более max_points всего). Возвращает (x, y, full_resolution).
+    levels - пирамида min/max (utils.lod): для широкого окна LTTB получает
+    огибающую с уровня детализации вместо всех исходных точек.
+    """
+    kpoints = np.asarray(kpoints)
+    if np.ndim(energies) == 1:
+        energies = np.asarray(energies)[:, None]
+    per_band = max(3, min(int(px), max_points // max(energies.shape[1], 1)))
+    level, kpoints, minimum, maximum = select_window(
+        kpoints, lambda start, stop: np.asarray(energies[start:stop]).T, levels or [],
+        kmin, kmax, px=LTTB_INPUT_FACTOR * per_band
+    )
+    if level:
+        kpoints, bands = envelope(kpoints, minimum, maximum)
+    else:
+        bands = minimum
+    indices = lttb(kpoints, bands.T, per_band)
+    x, y = pack_traces(kpoints, bands.T, indices)
+    return x, y, not level and indices.shape[0] == len(kpoints)
+
+
+def json_points(values, decimals=5):
+    """Список для JSON: NaN-разделители становятся null (plotly рисует разрыв)"""
+    values = np.round(np.asarray(values, dtype=np.float64), decimals)
+    return [None if v != v else v for v in values.tolist()]
@@ -0,0 +1,185 @@
+"""
+Потоковый экспорт каталога: CSV (при желании gzip) и Parquet / Arrow IPC.
+
+Строки читаются курсором пакетами по batch_size (yield_per; для PostgreSQL -
+серверный курсор) и сразу отдаются генератором, поэтому память не зависит
+от числа материалов, а первые байты уходят клиенту сразу.
+Parquet/Arrow требуют необязательного пакета pyarrow.
+"""
+import csv
+import io
+import zlib
+
+from sqlalchemy import Boolean, DateTime, Float, Integer, select
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # экспорт Parquet/Arrow недоступен
+    pa = None
+    pq = None
+
+CSV_HEADER = [
+    'ID', 'Formula', 'Name', 'Crystal System', 'Space Group',
+    'Band Gap (eV)', 'Band Gap Type', 'Magnetic Order',
+    'Magnetic Moment (μB)', 'Curie Temperature (K)',
+    'Is Verified', 'Verification Score (%)', 'DOI', 'Created At'
+]
+CSV_COLUMNS = (
+    'id', 'formula', 'name', 'crystal_system', 'space_group', 'band_gap', 'band_gap_type',
+    'magnetic_order', 'magnetic_moment', 'curie_temperature', 'is_verified',
+    'verification_score', 'doi', 'created_at'
+)
+
+# Текстовые колонки, которые попадают в Parquet вместе со всеми числовыми
+TABLE_TEXT_COLUMNS = (
+    'formula', 'name', 'crystal_system', 'space_group', 'band_gap_type',
+    'magnetic_order', 'easy_axis', 'anisotropy_type', 'calculation_method',
+    'functional', 'software', 'doi'
+)
+# Служебные ссылки на пользователей в выгрузку не попадают
+TABLE_EXCLUDED_COLUMNS = ('user_id', 'verified_by')
+
+
+def arrow_available():
+    return pa is not None
+
+
+def _csv_row(m):
+    return [
+        m.id,
+        m.formula,
+        m.name or '',
+        m.crystal_system or '',
+        m.space_group or '',
+        f"{m.band_gap:.3f}" if m.band_gap is not None else '',
+        m.band_gap_type or '',
+        m.magnetic_order or '',
+        f"{m.magnetic_moment:.2f}" if m.magnetic_moment is not None else '',
+        f"{m.curie_temperature:.1f}" if m.curie_temperature is not None else '',
+        'Yes' if m.is_verified else 'No',
+        f"{m.verification_score:.1f}" if m.verification_score is not None else '',
+        m.doi or '',
+        m.created_at.strftime('%Y-%m-%d %H:%M:%S') if m.created_at else ''
+    ]
+
+
+def _batches(session, table, columns, batch_size):
+    stmt = select(*(table.c[name] for name in columns))\
+        .where(table.c.is_public == True)\
+        .order_by(table.c.id)\
+        .execution_options(yield_per=batch_size)
+    result = session.execute(stmt)
+    try:
+        for rows in result.partitions():
+            yield rows
+    finally:
+        result.close()
+
+
+def iter_csv(session, table, batch_size=1000):
+    """Генератор CSV (bytes, UTF-8) по одному куску на пакет строк"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    yield buffer.getvalue().encode('utf-8')
+    for rows in _batches(session, table, CSV_COLUMNS, batch_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(_csv_row(row) for row in rows)
+        yield buffer.getvalue().encode('utf-8')
+
+
+def gzip_stream(chunks, level=6):
+    """Сжимает поток кусков в формат gzip на лету"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def table_columns(table):
+    """Колонки Parquet/Arrow: все числовые и логические, ключевые текстовые, даты"""
+    columns = []
+    for column in table.c:
+        if column.name in TABLE_EXCLUDED_COLUMNS:
+            continue
+        if isinstance(column.type, (Integer, Float, Boolean, DateTime)) or column.name in TABLE_TEXT_COLUMNS:
+            columns.append(column.name)
+    return columns
+
+
+def arrow_schema(table, columns):
+    types = []
+    for name in columns:
+        column_type = table.c[name].type
+        if isinstance(column_type, Boolean):
+            types.append(pa.bool_())
+        elif isinstance(column_type, Integer):
+            types.append(pa.int64())
+        elif isinstance(column_type, Float):
+            types.append(pa.float64())
+        elif isinstance(column_type, DateTime):
+            types.append(pa.timestamp('us'))
+        else:
+            types.append(pa.string())
+    return pa.schema(list(zip(columns, types)))
+
+
+class _ChunkSink:
+    """Файл только для записи, из которого генератор забирает записанные куски"""
+
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+        self.position = 0
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_arrow(session, table, fmt='parquet', batch_size=10000):
+    """
+    Генератор Parquet (fmt='parquet', группа строк на пакет) или потока
+    Arrow IPC (fmt='arrow', record batch на пакет)
+    """
+    if pa is None:
+        raise RuntimeError('pyarrow is required for Parquet/Arrow export')
+    columns = table_columns(table)
+    schema = arrow_schema(table, columns)
+    sink = _ChunkSink()
+    stream = pa.PythonFile(sink, mode='w')
+    if fmt == 'parquet':
+        writer = pq.ParquetWriter(stream, schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_stream(stream, schema)
+    try:
+        for rows in _batches(session, table, columns, batch_size):
+            arrays = [pa.array([row[i] for row in rows], type=schema.field(i).type)
+                      for i in range(len(columns))]
+            writer.write_batch(pa.record_batch(arrays, schema=schema))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
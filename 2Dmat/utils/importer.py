@@ -0,0 +1,165 @@
+"""
+Разбор файлов для flask import-materials.
+
+Источник - каталог (рекурсивно: *.cif, *.vasp, POSCAR*, CONTCAR*) или
+манифест (.csv/.json/.jsonl со столбцом path и свойствами материала).
+Рядом с файлом структуры может лежать файл свойств с тем же именем
+(X.json или X.csv с одной строкой данных); свойства манифеста и файла
+свойств переопределяют определенные по структуре.
+
+parse_structure_file выполняется в дочернем процессе и принимает/возвращает
+только простые данные.
+"""
+import csv
+import hashlib
+import json
+import os
+import shutil
+
+from ase.io import read
+
+STRUCTURE_SUFFIXES = ('.cif', '.vasp', '.poscar')
+STRUCTURE_PREFIXES = ('POSCAR', 'CONTCAR')
+
+# Свойства Material, которые можно задать в манифесте или файле свойств
+IMPORT_FIELDS = {
+    'name': str, 'formula': str, 'iupac_name': str, 'cas_number': str,
+    'crystal_system': str, 'space_group': str, 'calculation_method': str,
+    'functional': str, 'software': str, 'pseudopotential': str, 'kpoints': str,
+    'cut_off_energy': float, 'band_gap': float, 'band_gap_type': str,
+    'fermi_energy': float, 'work_function': float, 'magnetic_order': str,
+    'magnetic_moment': float, 'easy_axis': str, 'anisotropy_energy': float,
+    'curie_temperature': float, 'neel_temperature': float, 'j1': float,
+    'j2': float, 'j3': float, 'dmi_constant': float, 'anisotropy_type': str,
+    'formation_energy': float, 'exfoliation_energy': float, 'poisson_ratio': float,
+    'young_modulus': float, 'debye_temperature': float, 'heat_capacity': float,
+    'thermal_conductivity': float, 'refractive_index': float,
+    'absorption_coefficient': float, 'photoluminescence': float, 'doi': str,
+    'reference': str, 'tags': list, 'is_public': bool,
+}
+
+
+def is_structure_file(filename):
+    name = os.path.basename(filename)
+    return name.lower().endswith(STRUCTURE_SUFFIXES) or name.startswith(STRUCTURE_PREFIXES)
+
+
+def structure_format(path):
+    return 'cif' if path.lower().endswith('.cif') else 'vasp'
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def collect_sources(source):
+    """
+    Список (путь к файлу структуры, свойства из манифеста).
+    Пути манифеста считаются относительно его каталога.
+    """
+    if os.path.isdir(source):
+        entries = []
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for filename in sorted(files):
+                if is_structure_file(filename):
+                    entries.append((os.path.join(root, filename), {}))
+        return entries
+
+    base = os.path.dirname(os.path.abspath(source))
+    if source.lower().endswith('.csv'):
+        with open(source, newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+    elif source.lower().endswith('.jsonl'):
+        with open(source, encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    else:
+        with open(source, encoding='utf-8') as f:
+            rows = json.load(f)
+    entries = []
+    for row in rows:
+        row = dict(row)
+        path = row.pop('path', None)
+        if not path:
+            raise ValueError(f'Manifest entry without path: {row}')
+        entries.append((os.path.join(base, path), row))
+    return entries
+
+
+def read_sidecar(path):
+    """Свойства из X.json / X.csv рядом с файлом структуры X.*"""
+    stem = os.path.splitext(path)[0]
+    if os.path.exists(stem + '.json'):
+        with open(stem + '.json', encoding='utf-8') as f:
+            return json.load(f)
+    if os.path.exists(stem + '.csv'):
+        with open(stem + '.csv', newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+        return rows[0] if rows else {}
+    return {}
+
+
+def clean_properties(properties):
+    """Приводит свойства к типам колонок; неизвестный ключ - ValueError"""
+    values = {}
+    for key, value in properties.items():
+        if key not in IMPORT_FIELDS:
+            raise ValueError(f'Unknown property: {key}')
+        if value is None or value == '':
+            continue
+        kind = IMPORT_FIELDS[key]
+        if kind is float:
+            value = float(value)
+        elif kind is bool:
+            value = value if isinstance(value, bool) else str(value).lower() in ('1', 'true', 'yes')
+        elif kind is list:
+            if isinstance(value, str):
+                value = [tag.strip() for tag in value.split(',') if tag.strip()]
+            value = json.dumps(list(value))
+        else:
+            value = str(value)
+        values[key] = value
+    return values
+
+
+def parse_structure_file(task):
+    """
+    task: {'path', 'sha256', 'properties', 'upload_folder'}.
+    Возвращает {'path', 'sha256', 'values'} со значениями колонок Material
+    или {'path', 'error'}.
+    """
+    path = task['path']
+    try:
+        fmt = structure_format(path)
+        atoms = read(path, format=fmt)
+        formula = atoms.symbols.formula.reduce()[0].format('metal')
+        a, b, c, alpha, beta, gamma = (round(float(x), 6) for x in atoms.cell.cellpar())
+        values = {
+            'name': formula,
+            'formula': formula,
+            'lattice_params': json.dumps({'a': a, 'b': b, 'c': c,
+                                          'alpha': alpha, 'beta': beta, 'gamma': gamma}),
+        }
+        try:
+            values['crystal_system'] = atoms.cell.get_bravais_lattice().crystal_family.capitalize()
+        except Exception:
+            pass
+
+        properties = read_sidecar(path)
+        properties.update(task['properties'])
+        values.update(clean_properties(properties))
+
+        # Копия под именем из хэша: повторный импорт перезапишет тот же файл
+        folder = os.path.join(task['upload_folder'], 'cif' if fmt == 'cif' else 'poscar')
+        os.makedirs(folder, exist_ok=True)
+        filename = f"{task['sha256'][:16]}_{os.path.basename(path)}"
+        shutil.copyfile(path, os.path.join(folder, filename))
+        column = 'cif_file_path' if fmt == 'cif' else 'poscar_file_path'
+        values[column] = os.path.join('static/uploads', 'cif' if fmt == 'cif' else 'poscar', filename)
+        return {'path': path, 'sha256': task['sha256'], 'values': values}
+    except Exception as e:
+        return {'path': path, 'error': f'{type(e).__name__}: {e}'}
@@ -0,0 +1,85 @@
+"""
+Пирамида уровней детализации (min/max) для DOS и зонной структуры.
+
+Уровень L объединяет по 2**L соседних точек исходной оси: хранится среднее
+значение оси и минимум/максимум каждого канала в корзине. Уровень - одна
+матрица float32 (1 + 2C, n_L): строка оси, C строк минимумов, C строк
+максимумов. Уровни строятся, пока в них больше LOD_MIN_POINTS точек;
+вместе они занимают не больше удвоенного объема исходных данных.
+
+Окно [lo, hi] отдается с самого подробного уровня, где в него попадает не
+больше px точек, поэтому ответ содержит ~px..2px значений на канал
+независимо от размера исходных данных, а пики не теряются.
+"""
+import numpy as np
+
+LOD_MIN_POINTS = 256
+
+
+def build_levels(axis, values, min_points=LOD_MIN_POINTS):
+    """
+    Уровни 1..N для монотонной оси axis (n,) и каналов values (C, n).
+    Возвращает список матриц (1 + 2C, n_L).
+    """
+    axis = np.asarray(axis, dtype=np.float32)
+    values = np.asarray(values, dtype=np.float32).reshape(-1, axis.size)
+    levels = []
+    current_axis, current_min, current_max = axis, values, values
+    while current_axis.size > min_points:
+        if current_axis.size % 2:
+            # Нечетная длина: последняя точка образует корзину сама с собой
+            current_axis = np.append(current_axis, current_axis[-1])
+            current_min = np.concatenate([current_min, current_min[:, -1:]], axis=1)
+            current_max = np.concatenate([current_max, current_max[:, -1:]], axis=1)
+        current_axis = current_axis.reshape(-1, 2).mean(axis=1)
+        current_min = current_min.reshape(current_min.shape[0], -1, 2).min(axis=2)
+        current_max = current_max.reshape(current_max.shape[0], -1, 2).max(axis=2)
+        levels.append(np.vstack([current_axis, current_min, current_max]).astype(np.float32))
+    return levels
+
+
+def _window(axis, lo, hi):
+    # Точка за каждой границей окна, чтобы линия доходила до края графика
+    start = 0 if lo is None else max(int(np.searchsorted(axis, lo, side='left')) - 1, 0)
+    stop = axis.size if hi is None else min(int(np.searchsorted(axis, hi, side='right')) + 1, axis.size)
+    return start, stop
+
+
+def select_window(axis, read, levels, lo=None, hi=None, px=800):
+    """
+    Окно [lo, hi] с подходящего уровня: (уровень, ось, min, max), где min и
+    max - (C, k). read(start, stop) возвращает исходные каналы (C, k) в
+    диапазоне индексов - они читаются только на уровне 0, где min и max
+    совпадают.
+    """
+    axis = np.asarray(axis)
+    start, stop = _window(axis, lo, hi)
+    if stop - start <= px or not levels:
+        window = read(start, stop)
+        return 0, axis[start:stop], window, window
+
+    for level, matrix in enumerate(levels, start=1):
+        start, stop = _window(matrix[0], lo, hi)
+        if stop - start <= px or level == len(levels):
+            break
+    channels = (matrix.shape[0] - 1) // 2
+    return (level, matrix[0, start:stop], matrix[1:1 + channels, start:stop],
+            matrix[1 + channels:, start:stop])
+
+
+def envelope(axis, minimum, maximum):
+    """
+    Линия через min и max каждой корзины (ось повторяется дважды) -
+    на графике совпадает с огибающей исходных данных
+    """
+    return np.repeat(axis, 2), np.stack([minimum, maximum], axis=-1).reshape(minimum.shape[0], -1)
+
+
+def sort_by_axis(axis, values):
+    """Ось и каналы, упорядоченные по возрастанию оси (старые данные в JSON)"""
+    axis = np.asarray(axis)
+    values = np.asarray(values).reshape(-1, axis.size)
+    if axis.size > 1 and np.any(np.diff(axis) < 0):
+        order = np.argsort(axis, kind='stable')
+        return axis[order], values[:, order]
+    return axis, values
@@ -0,0 +1,225 @@
+"""
+Метрики процесса в формате Prometheus (text exposition 0.0.4).
+
+Для каждого HTTP-запроса записываются: время обработки по endpoint, методу
+и статусу, число SQL-запросов и их суммарное время (события engine
+SQLAlchemy), время в функциях, отмеченных @timed (визуализаторы, разбор
+структур ASE). Значения копятся в гистограммах с фиксированными корзинами
+в памяти процесса: каждый процесс gunicorn отдает свои метрики, дочерние
+процессы render-worker в них не попадают.
+
+Наблюдение - поиск корзины bisect и пара сложений под одной блокировкой;
+стоимость на запрос измеряет benchmarks/bench_metrics.py.
+Время потоковых ответов (экспорт) измеряется до начала передачи тела.
+"""
+import functools
+import math
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+# Корзины по умолчанию клиентов Prometheus, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_local = threading.local()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Гистограмма с метками: по набору корзин на каждое сочетание значений меток"""
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # значения меток -> [счетчики корзин + (+Inf)], сумма
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def snapshot(self):
+        """{значения меток: (накопленные счетчики корзин, сумма)}"""
+        with self._lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+        result = {}
+        for labels, (counts, total) in series.items():
+            cumulative, running = [], 0
+            for count in counts:
+                running += count
+                cumulative.append(running)
+            result[labels] = (cumulative, total)
+        return result
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        bounds = self.buckets + (math.inf,)
+        for labels, (cumulative, total) in sorted(self.snapshot().items()):
+            for bound, count in zip(bounds, cumulative):
+                le = f'le="{_number(bound)}"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, le)} {count}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {cumulative[-1]}')
+        return lines
+
+
+class Metrics:
+    """Реестр гистограмм процесса и источников мгновенных значений"""
+
+    def __init__(self, prefix='app'):
+        self.prefix = prefix
+        self.enabled = True
+        self._histograms = {}
+        self._collectors = []
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        name = f'{self.prefix}_{name}'
+        if name not in self._histograms:
+            self._histograms[name] = Histogram(name, help, labelnames, buckets)
+        return self._histograms[name]
+
+    def add_collector(self, collect):
+        """
+        collect() возвращает [(имя, тип gauge/counter, описание, значение)];
+        вызывается при каждом чтении метрик
+        """
+        self._collectors.append(collect)
+
+    def expose(self):
+        """Все метрики текстом в формате Prometheus"""
+        lines = []
+        for histogram in self._histograms.values():
+            lines.extend(histogram.expose())
+        for collect in self._collectors:
+            for name, kind, help, value in collect():
+                if value is None:
+                    continue
+                name = f'{self.prefix}_{name}'
+                if kind == 'counter' and not name.endswith('_total'):
+                    name += '_total'
+                lines.extend([f'# HELP {name} {help}', f'# TYPE {name} {kind}', f'{name} {_number(value)}'])
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+request_duration = metrics.histogram(
+    'http_request_duration_seconds', 'Request handling time',
+    ('endpoint', 'method', 'status'))
+request_sql_statements = metrics.histogram(
+    'http_request_sql_statements', 'SQL statements executed per request',
+    ('endpoint',), SQL_COUNT_BUCKETS)
+request_sql_duration = metrics.histogram(
+    'http_request_sql_duration_seconds', 'Time spent in SQL per request', ('endpoint',))
+request_timed_duration = metrics.histogram(
+    'http_request_render_duration_seconds', 'Time spent in @timed functions (rendering, parsing) per request',
+    ('endpoint',))
+function_duration = metrics.histogram(
+    'function_duration_seconds', 'Duration of @timed functions', ('function',))
+
+
+def timed(fn):
+    """
+    Время вызова в function_duration_seconds{function="Класс.метод"}.
+    Внутри HTTP-запроса время внешнего вызова добавляется к времени
+    отрисовки запроса (вложенные вызовы не считаются дважды).
+    """
+    name = fn.__qualname__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not metrics.enabled:
+            return fn(*args, **kwargs)
+        depth = getattr(_local, 'depth', 0)
+        _local.depth = depth + 1
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            _local.depth = depth
+            function_duration.observe(elapsed, name)
+            if depth == 0 and has_request_context():
+                g.metrics_timed_seconds = g.get('metrics_timed_seconds', 0.0) + elapsed
+
+    return wrapper
+
+
+def init_metrics(app, db):
+    """
+    Включает сбор метрик запросов (METRICS_ENABLED, по умолчанию включен).
+    SQL считается на всех engine приложения, включая реплику для чтения.
+    Обработчики проверяют metrics.enabled, так что сбор можно выключить на ходу.
+    """
+    metrics.enabled = app.config.get('METRICS_ENABLED', True)
+    if not metrics.enabled:
+        return
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        if metrics.enabled:
+            conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+    def after_execute(conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get('metrics_started')
+        if not stack:
+            return
+        elapsed = time.perf_counter() - stack.pop()
+        if has_request_context():
+            g.metrics_sql_statements = g.get('metrics_sql_statements', 0) + 1
+            g.metrics_sql_seconds = g.get('metrics_sql_seconds', 0.0) + elapsed
+
+    def handle_error(exception_context):
+        # after_cursor_execute не вызывается для запроса с ошибкой
+        stack = exception_context.connection.info.get('metrics_started') if exception_context.connection else None
+        if stack:
+            stack.pop()
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', before_execute)
+            event.listen(engine, 'after_cursor_execute', after_execute)
+            event.listen(engine, 'handle_error', handle_error)
+
+    @app.before_request
+    def start_request_timer():
+        if metrics.enabled:
+            g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.get('metrics_started')
+        if started is None:
+            return response
+        endpoint = request.endpoint or 'none'
+        request_duration.observe(time.perf_counter() - started, endpoint, request.method, response.status_code)
+        request_sql_statements.observe(g.get('metrics_sql_statements', 0), endpoint)
+        request_sql_duration.observe(g.get('metrics_sql_seconds', 0.0), endpoint)
+        request_timed_duration.observe(g.get('metrics_timed_seconds', 0.0), endpoint)
+        return response
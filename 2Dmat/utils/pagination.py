@@ -0,0 +1,114 @@
+"""
+Keyset-пагинация списков материалов по (created_at, id), а результатов
+поиска - по (rank, id).
+
+Курсор - непрозрачная строка с (created_at, id) последней строки страницы;
+следующая страница выбирается условием "строго раньше курсора", поэтому
+глубокие страницы стоят столько же, сколько первая, в отличие от OFFSET.
+"""
+import base64
+import json
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+
+def encode_cursor(created_at, id):
+    raw = json.dumps([created_at.isoformat(), id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Возвращает (created_at, id); ValueError для поврежденного курсора"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(created_at), int(id)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f'Invalid cursor: {cursor!r}') from e
+
+
+def keyset_query(query, model, per_page, cursor=None):
+    """Запрос страницы (на одну строку больше per_page) в порядке (created_at, id) по убыванию"""
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        # Сравнение кортежей, чтобы условие было диапазоном по индексу (created_at, id)
+        query = query.filter(tuple_(model.created_at, model.id) < tuple_(created_at, last_id))
+    # Одна лишняя строка показывает, есть ли следующая страница, без COUNT
+    return query.order_by(model.created_at.desc(), model.id.desc()).limit(per_page + 1)
+
+
+def keyset_page(query, model, per_page, cursor=None):
+    """
+    Одна страница query в порядке (created_at, id) по убыванию.
+    Возвращает (строки, курсор следующей страницы или None).
+    """
+    rows = keyset_query(query, model, per_page, cursor).all()
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows, next_cursor
+
+
+def encode_rank_cursor(rank, id):
+    raw = json.dumps(['rank', rank, id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_rank_cursor(cursor):
+    """Возвращает (rank, id); ValueError для поврежденного курсора"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        kind, rank, id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if kind != 'rank':
+            raise ValueError(kind)
+        return float(rank), int(id)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f'Invalid cursor: {cursor!r}') from e
+
+
+def rank_page(query, rank, id_column, per_page, cursor=None):
+    """
+    Страница результатов поиска в порядке (rank, id) по возрастанию;
+    query должен выбирать сущность и rank. Возвращает (строки, ранги,
+    курсор следующей страницы или None).
+    """
+    if cursor:
+        last_rank, last_id = decode_rank_cursor(cursor)
+        query = query.filter(tuple_(rank, id_column) > tuple_(last_rank, last_id))
+    rows = query.order_by(rank, id_column).limit(per_page + 1).all()
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_rank_cursor(rows[-1][1], rows[-1][0].id)
+    return [row[0] for row in rows], [row[1] for row in rows], next_cursor
+
+
+class CountCache:
+    """Кэш COUNT(*) по ключу фильтров с ограниченным временем жизни"""
+
+    def __init__(self, ttl=60, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, query):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                return entry[1]
+        total = query.order_by(None).count()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[key] = (now, total)
+        return total
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,358 @@
+"""
+Шаблоны фигур для PNG зонной структуры и DOS.
+
+Фигура, оси, подписи, сетка, легенда и раскладка строятся один раз на тип
+графика, dpi и число каналов DOS. Для материала в шаблоне заменяются только
+данные линий и заливок, пределы осей и метки делений; заранее нарисованный
+фон с заголовками копируется в буфер Agg, поверх рисуются оси, и буфер
+кодируется в PNG (без tight_layout и bbox_inches='tight', каждый из которых -
+лишняя отрисовка, и без повторной растеризации неизменного текста).
+
+Раскладка фиксируется при создании шаблона, поэтому размер изображения
+постоянный. Если подписи делений не помещаются в поля (необычно широкие
+числа), изображение рисуется целиком с пересчитанной раскладкой.
+
+Шаблоны изменяемые, поэтому у каждого потока свои.
+"""
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+
+import matplotlib
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.cbook import contiguous_regions
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+from matplotlib.ticker import AutoLocator, ScalarFormatter
+
+# Метки точек вида $\Gamma$ разбирает mathtext через один на процесс парсер
+# pyparsing, и одновременный разбор из двух потоков падает с ParseException.
+# Поэтому зонные структуры (единственные графики с такими метками) рисуются
+# по очереди, а DOS и остальные изображения - параллельно
+MATHTEXT_LOCK = threading.Lock()
+
+# Шаблонов на поток (разные dpi и числа каналов DOS)
+MAX_TEMPLATES = 16
+
+_local = threading.local()
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def _chunk(kind, body):
+    return struct.pack('>I', len(body)) + kind + body + struct.pack('>I', zlib.crc32(kind + body))
+
+
+def encode_png(rgba, dpi, level=1):
+    """
+    PNG (RGB, 8 бит) из буфера Agg. Строки без фильтров PNG: белый фон и
+    линии графиков сжимаются и так. Примерно вдвое быстрее Pillow даже с
+    compress_level=1 (адаптивные фильтры) при близком размере файла - см.
+    benchmarks/bench_plot_templates.py. zlib отпускает GIL, поэтому потоки
+    кодируют параллельно.
+    """
+    height, width = rgba.shape[:2]
+    # Первый байт строки - тип фильтра (0)
+    raw = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    raw[:, 1:] = rgba[..., :3].reshape(height, -1)
+    pixels_per_meter = round(dpi / 0.0254)
+    return b''.join([
+        PNG_SIGNATURE,
+        _chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)),
+        _chunk(b'pHYs', struct.pack('>IIB', pixels_per_meter, pixels_per_meter, 1)),
+        _chunk(b'IDAT', zlib.compress(raw, level)),
+        _chunk(b'IEND', b''),
+    ])
+
+
+class PlotTemplate:
+    """
+    Фигура с холстом Agg и зафиксированной раскладкой. Неизменные подписи
+    (заголовки, подписи осей) рисуются один раз в фон; для изображения фон
+    копируется в буфер и поверх рисуются только оси с данными.
+    """
+
+    def __init__(self, dpi, figsize):
+        self.figure = Figure(figsize=figsize, dpi=dpi)
+        FigureCanvasAgg(self.figure)
+        self.build()
+        # Раскладка по типичным данным; дальше поля не пересчитываются
+        self.layout_sample()
+        self.figure.tight_layout()
+        self.subplotpars = {name: getattr(self.figure.subplotpars, name)
+                            for name in ('left', 'right', 'bottom', 'top', 'wspace', 'hspace')}
+        self.capture_background()
+
+    def build(self):
+        raise NotImplementedError
+
+    def layout_sample(self):
+        """Данные, по подписям которых рассчитываются поля"""
+        raise NotImplementedError
+
+    def static_texts(self):
+        """Подписи, одинаковые для всех материалов"""
+        return [text for ax in self.figure.axes for text in (ax.title, ax.xaxis.label, ax.yaxis.label)]
+
+    def capture_background(self):
+        canvas = self.figure.canvas
+        # Полная отрисовка образца ставит подписи осей на их места
+        canvas.draw()
+        renderer = canvas.get_renderer()
+        self.label_boxes = [(ax, ax.xaxis.label.get_window_extent(renderer),
+                             ax.yaxis.label.get_window_extent(renderer)) for ax in self.figure.axes]
+        renderer.clear()
+        self.figure.patch.draw(renderer)
+        for text in self.static_texts():
+            text.draw(renderer)
+        self.background = canvas.copy_from_bbox(self.figure.bbox)
+        self.set_static_visible(False)
+
+    def set_static_visible(self, visible):
+        for text in self.static_texts():
+            text.set_visible(visible)
+
+    def fits(self, renderer):
+        """Подписи делений не заходят на подписи осей в фоне"""
+        for ax, xlabel, ylabel in self.label_boxes:
+            for axis, inside in ((ax.xaxis, lambda box: box.y0 >= xlabel.y1),
+                                 (ax.yaxis, lambda box: box.x0 >= ylabel.x1)):
+                low, high = sorted(axis.get_view_interval())
+                margin = (high - low) * 1e-9
+                for tick in axis.get_major_ticks():
+                    # Метки вне пределов оси не рисуются
+                    if (low - margin <= tick.get_loc() <= high + margin and tick.label1.get_text() and
+                            not inside(tick.label1.get_window_extent(renderer))):
+                        return False
+        return True
+
+    def png(self):
+        """Фон, поверх - оси с данными; PNG-байты"""
+        canvas = self.figure.canvas
+        renderer = canvas.get_renderer()
+        canvas.restore_region(self.background)
+        for ax in self.figure.axes:
+            ax.draw(renderer)
+        if not self.fits(renderer):
+            return self.png_relayout()
+        return encode_png(np.asarray(renderer.buffer_rgba()), self.figure.dpi)
+
+    def png_relayout(self):
+        """Необычно широкие подписи делений: полная отрисовка с новой раскладкой"""
+        self.set_static_visible(True)
+        try:
+            self.figure.tight_layout()
+            self.figure.canvas.draw()
+            return encode_png(np.asarray(self.figure.canvas.buffer_rgba()), self.figure.dpi)
+        finally:
+            # Следующие изображения снова с полями шаблона и его фоном: результат
+            # не зависит от того, что рисовалось раньше
+            self.figure.subplots_adjust(**self.subplotpars)
+            self.set_static_visible(False)
+
+    def close(self):
+        self.figure.clear()
+
+
+def _fill_polygons(energy, dos):
+    """
+    Многоугольники fill_betweenx(energy, 0, dos, where=dos > 0) в том же
+    порядке вершин. FillBetweenPolyCollection.set_data есть только с
+    matplotlib 3.10, а set_verts - у PolyCollection любой версии.
+    """
+    polygons = []
+    for start, stop in contiguous_regions(dos > 0):
+        n = stop - start
+        polygon = np.empty((2 * n + 2, 2))
+        polygon[0] = dos[start], energy[start]
+        polygon[1:n + 1, 0] = 0
+        polygon[1:n + 1, 1] = energy[start:stop]
+        polygon[n + 1] = dos[stop - 1], energy[stop - 1]
+        polygon[n + 2:, 0] = dos[start:stop][::-1]
+        polygon[n + 2:, 1] = energy[start:stop][::-1]
+        polygons.append(polygon)
+    return polygons
+
+
+def _autoscale(ax, x, y):
+    """Пределы по точкам (x, y) с обычными полями autoscale"""
+    ax.dataLim.set_points(np.array([[np.min(x), np.min(y)], [np.max(x), np.max(y)]], dtype=float))
+    ax.ignore_existing_data_limits = False
+    ax.autoscale_view()
+
+
+class BandPlotTemplate(PlotTemplate):
+    """Зонная структура: все зоны одной LineCollection, уровень Ферми, метки точек"""
+
+    FIGSIZE = (12, 8)
+
+    def __init__(self, dpi):
+        super().__init__(dpi, self.FIGSIZE)
+
+    def build(self):
+        ax = self.ax = self.figure.subplots()
+        self.bands = LineCollection([], colors='b', linewidths=1, alpha=0.7, zorder=2)
+        ax.add_collection(self.bands, autolim=False)
+        fermi = ax.axhline(y=0, color='r', linestyle='--', linewidth=1, alpha=0.7)
+        # Вертикальные линии в высокосимметричных точках: x в данных, y на всю высоту осей
+        self.symmetry_lines = LineCollection([], colors='gray', linestyles=':', linewidths=0.5,
+                                             transform=ax.get_xaxis_transform())
+        ax.add_collection(self.symmetry_lines, autolim=False)
+
+        ax.set_xlabel('Волновой вектор', fontsize=14)
+        ax.set_ylabel('Энергия (эВ)', fontsize=14)
+        ax.set_title('Зонная структура', fontsize=16, pad=20)
+        ax.grid(True, alpha=0.3)
+        band_handle = Line2D([], [], color='b', linewidth=1, alpha=0.7)
+        ax.legend([band_handle, fermi], ['Зоны', 'Уровень Ферми'], loc='upper right')
+
+    def layout_sample(self):
+        # Метки энергии вида «−12.5», самые широкие из типичных
+        self.set_data(np.array([0.0, 3.0]), np.array([[-10.0], [10.0]]), {'G': 0.0, 'K': 3.0})
+
+    def set_data(self, kpoints, energies, labels):
+        ax = self.ax
+        if energies.ndim == 1:
+            energies = energies[:, None]
+        # (зоны, k-точки, 2)
+        self.bands.set_segments(np.stack(np.broadcast_arrays(kpoints[None, :], energies.T), axis=-1))
+
+        if labels:
+            # Как и раньше, подписываются только точки, совпадающие с k-точками пути
+            ticks = [(position, f'${label}$') for label, position in labels.items() if position in kpoints]
+            ax.set_xticks([position for position, _ in ticks], [text for _, text in ticks])
+            ax.tick_params(axis='x', labelsize=12)
+            self.symmetry_lines.set_segments([[(position, 0), (position, 1)] for position, _ in ticks])
+        else:
+            ax.xaxis.set_major_locator(AutoLocator())
+            ax.xaxis.set_major_formatter(ScalarFormatter())
+            ax.tick_params(axis='x', labelsize=matplotlib.rcParams['xtick.labelsize'])
+            self.symmetry_lines.set_segments([])
+
+        # Уровень Ферми (y=0) входит в пределы, как axhline при автомасштабе
+        _autoscale(ax, kpoints, [energies.min(), energies.max(), 0.0])
+
+    def render(self, kpoints, energies, labels):
+        self.set_data(kpoints, energies, labels)
+        return self.png()
+
+
+class DOSPlotTemplate(PlotTemplate):
+    """Общая DOS и (если есть каналы) частичная DOS с легендой"""
+
+    def __init__(self, dpi, n_partial):
+        self.n_partial = n_partial
+        # Без частичной DOS - только левая половина прежнего графика
+        super().__init__(dpi, (14, 6) if n_partial else (7, 6))
+
+    def build(self):
+        if self.n_partial:
+            self.ax_total, self.ax_partial = self.figure.subplots(1, 2)
+        else:
+            self.ax_total, self.ax_partial = self.figure.subplots(), None
+
+        ax = self.ax_total
+        empty = np.zeros(0)
+        self.total_line, = ax.plot(empty, empty, 'b-', linewidth=2)
+        ax.axhline(y=0, color='r', linestyle='--', linewidth=1)
+        self.total_fill = ax.fill_betweenx(empty, 0, empty, alpha=0.3, color='blue')
+        ax.set_xlabel('Плотность состояний', fontsize=12)
+        ax.set_ylabel('Энергия (эВ)', fontsize=12)
+        ax.set_title('Общая плотность состояний', fontsize=14)
+        ax.grid(True, alpha=0.3)
+
+        self.partial = []
+        if self.n_partial:
+            ax = self.ax_partial
+            colors = matplotlib.colormaps['tab10'](np.linspace(0, 1, self.n_partial))
+            for color in colors:
+                line, = ax.plot(empty, empty, color=color, linewidth=2)
+                fill = ax.fill_betweenx(empty, 0, empty, alpha=0.3, color=color)
+                self.partial.append((line, fill))
+            ax.axhline(y=0, color='r', linestyle='--', linewidth=1)
+            ax.set_xlabel('Плотность состояний', fontsize=12)
+            ax.set_ylabel('Энергия (эВ)', fontsize=12)
+            ax.set_title('Частичная плотность состояний', fontsize=14)
+            self.legend = ax.legend([line for line, _ in self.partial],
+                                    [f'channel {i}' for i in range(self.n_partial)], loc='best')
+            ax.grid(True, alpha=0.3)
+
+        self.suptitle = self.figure.suptitle('Плотность состояний', fontsize=16)
+
+    def static_texts(self):
+        return super().static_texts() + [self.suptitle]
+
+    def layout_sample(self):
+        # Обычное окно DOS: метки вида «−12.5», самые широкие из типичных
+        energy = np.array([-10.0, 10.0])
+        dos = np.array([0.0, 10.0])
+        self.set_data(energy, dos, {f'channel {i}': dos for i in range(self.n_partial)})
+
+    @staticmethod
+    def _set_channel(line, fill, energy, dos):
+        line.set_data(dos, energy)
+        fill.set_verts(_fill_polygons(energy, dos))
+
+    @staticmethod
+    def _autoscale_channels(ax, energy, channels):
+        """Пределы по линиям, оси 0 заливки и y=0 уровня Ферми"""
+        x = [0.0] if any((dos > 0).any() for dos in channels) else []
+        x += [min(dos.min() for dos in channels), max(dos.max() for dos in channels)]
+        _autoscale(ax, x, [energy.min(), energy.max(), 0.0])
+
+    def set_data(self, energy, total_dos, partial_dos):
+        self._set_channel(self.total_line, self.total_fill, energy, total_dos)
+        self._autoscale_channels(self.ax_total, energy, [total_dos])
+        if self.n_partial:
+            for (line, fill), text, (name, dos) in zip(self.partial, self.legend.get_texts(),
+                                                       partial_dos.items()):
+                self._set_channel(line, fill, energy, dos)
+                text.set_text(name)
+            self._autoscale_channels(self.ax_partial, energy, list(partial_dos.values()))
+
+    def render(self, energy, total_dos, partial_dos):
+        self.set_data(energy, total_dos, partial_dos)
+        return self.png()
+
+
+def _template(cls, dpi, *args):
+    """Шаблон текущего потока; лишние по давности использования закрываются"""
+    templates = getattr(_local, 'templates', None)
+    if templates is None:
+        templates = _local.templates = OrderedDict()
+    key = (cls, dpi) + args
+    template = templates.get(key)
+    if template is None:
+        template = templates[key] = cls(dpi, *args)
+        while len(templates) > MAX_TEMPLATES:
+            templates.popitem(last=False)[1].close()
+    templates.move_to_end(key)
+    return template
+
+
+def _render(cls, dpi, args, data):
+    template = _template(cls, dpi, *args)
+    try:
+        return template.render(*data)
+    except Exception:
+        # Шаблон мог остаться наполовину обновленным - следующий вызов построит новый
+        _local.templates.pop((cls, dpi) + args, None)
+        template.close()
+        raise
+
+
+def band_structure_png(kpoints, energies, labels, dpi):
+    """PNG зонной структуры; energies - (k-точки,) или (k-точки, зоны)"""
+    if energies.shape[0] != len(kpoints):
+        # До изменения шаблона, чтобы не строить его заново из-за плохих данных
+        raise ValueError(f'{len(kpoints)} k-points but energies of shape {energies.shape}')
+    with MATHTEXT_LOCK:
+        return _render(BandPlotTemplate, dpi, (), (kpoints, energies, labels))
+
+
+def dos_png(energy, total_dos, partial_dos, dpi):
+    """PNG плотности состояний; partial_dos - {канал: значения} (может быть пустым)"""
+    return _render(DOSPlotTemplate, dpi, (len(partial_dos),), (energy, total_dos, partial_dos))
@@ -0,0 +1,40 @@
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+
+class QueryBudgetExceeded(Exception):
+    """Страница выполнила больше SQL-запросов, чем разрешено SQL_QUERY_BUDGET"""
+
+
+def init_query_counter(app, db):
+    """
+    Считает SQL-запросы каждого HTTP-запроса по всем базам (основной и
+    реплике DATABASE_REPLICA_URL) и отдает их в заголовке X-SQL-Queries.
+    N+1 ловят тесты (tests/test_query_counts.py): число запросов страницы
+    со списком не должно расти с числом строк. SQL_QUERY_BUDGET, если задан,
+    дополнительно завершает ошибкой запрос, превысивший бюджет.
+    Предназначено для тестов и отладки; включается SQL_QUERY_COUNT или
+    SQL_QUERY_BUDGET.
+    """
+    budget = app.config.get('SQL_QUERY_BUDGET')
+    if not budget and not app.config.get('SQL_QUERY_COUNT'):
+        return
+
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            g.sql_query_count = g.get('sql_query_count', 0) + 1
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', count_query)
+
+    @app.after_request
+    def check_query_budget(response):
+        count = g.get('sql_query_count', 0)
+        response.headers['X-SQL-Queries'] = str(count)
+        if budget and count > budget:
+            raise QueryBudgetExceeded(
+                f'{request.method} {request.path} ({request.endpoint}) executed '
+                f'{count} SQL statements, budget is {budget}'
+            )
+        return response
@@ -0,0 +1,135 @@
+import hashlib
+import os
+import threading
+import time
+
+
+class RenderCache:
+    """Дисковый кэш отрисованных PNG, адресуемый по содержимому источника"""
+
+    def __init__(self, root, max_bytes=512 * 1024 * 1024, failure_ttl=600):
+        self.root = root
+        self.max_bytes = max_bytes
+        # Сколько секунд не повторять неудавшуюся отрисовку того же источника
+        self.failure_ttl = failure_ttl
+        self._size = None  # приблизительный объем кэша, байт
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def make_key(source, renderer, version, dpi):
+        """
+        Ключ кэша: sha256 от (содержимое источника, рендерер, версия рендерера, dpi)
+        """
+        if isinstance(source, str):
+            source = source.encode('utf-8')
+        digest = hashlib.sha256(source)
+        digest.update(f'\0{renderer}\0{version}\0{dpi}'.encode('utf-8'))
+        return digest.hexdigest()
+
+    def relpath(self, key):
+        return f'{key[:2]}/{key}.png'
+
+    def _failed_recently(self, marker):
+        try:
+            return time.time() - os.path.getmtime(marker) < self.failure_ttl
+        except OSError:
+            return False
+
+    @staticmethod
+    def _mark_failed(marker):
+        """Пустой файл-метка рядом с ключом: при другом источнике ключ другой"""
+        try:
+            with open(marker, 'w'):
+                pass
+        except OSError:
+            pass
+
+    def get_or_render(self, source, renderer, version, dpi, render):
+        """
+        Возвращает путь к PNG относительно корня кэша, при промахе вызывая
+        render(output_path). None, если отрисовка не удалась; неудача
+        запоминается на failure_ttl секунд, и в это время render не вызывается.
+        """
+        key = self.make_key(source, renderer, version, dpi)
+        rel = self.relpath(key)
+        path = os.path.join(self.root, rel)
+        marker = f'{path[:-4]}.failed'
+
+        if os.path.exists(path):
+            # Обновляем mtime - по нему работает вытеснение LRU
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            return rel
+        if self._failed_recently(marker):
+            return None
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path[:-4]}.{os.getpid()}.{threading.get_ident()}.tmp.png'
+        try:
+            if not render(tmp_path) or not os.path.exists(tmp_path):
+                self._mark_failed(marker)
+                return None
+            os.replace(tmp_path, path)
+        except Exception:
+            self._mark_failed(marker)
+            raise
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        try:
+            os.remove(marker)
+        except OSError:
+            pass
+
+        self._account(os.path.getsize(path))
+        return rel
+
+    def _account(self, added):
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += added
+            if self._size > self.max_bytes:
+                self._size = self._evict()
+
+    def _entries(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                # Метки неудач (0 байт) вытесняются вместе со старыми PNG
+                if name.endswith(('.png', '.failed')):
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    yield st.st_mtime, st.st_size, path
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """Удаляет давно не использованные файлы, пока кэш не уложится в лимит"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        return total
+
+    def clear(self):
+        with self._lock:
+            for _, _, path in list(self._entries()):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._size = 0
@@ -0,0 +1,76 @@
+import json
+import os
+import time
+
+from utils.render_cache import RenderCache
+from utils.spectra_storage import load_band_structure, load_dos, load_levels
+from utils.visualization import StructureVisualizer, BandStructureVisualizer, DOSVisualizer
+
+# Кэши рендеров этого процесса. Первая запись в RenderCache обходит весь его
+# каталог (os.walk), поэтому объект создается один раз и служит всем заданиям
+_caches = {}
+
+
+def process_cache(folder, max_bytes, failure_ttl):
+    """RenderCache процесса для этих настроек"""
+    key = (folder, max_bytes, failure_ttl)
+    if key not in _caches:
+        _caches[key] = RenderCache(folder, max_bytes=max_bytes, failure_ttl=failure_ttl)
+    return _caches[key]
+
+
+def render_material_images(payload):
+    """
+    Отрисовывает все изображения материала в кэш рендеров.
+    Выполняется в дочернем процессе, поэтому принимает только простые данные:
+    structure_path, band_structure_path, dos_path (или старые band_structure_data,
+    dos_data), cache_folder, cache_max_bytes, cache_failure_ttl, dpi.
+    Возвращает (пути относительно кэша по колонкам Material, список ошибок,
+    длительность в секундах).
+    """
+    started = time.perf_counter()
+    cache = process_cache(payload['cache_folder'], payload['cache_max_bytes'],
+                          payload.get('cache_failure_ttl', 600))
+    dpi = payload['dpi']
+    results = {}
+    errors = []
+
+    def render(column, source, renderer, version, fn):
+        try:
+            rel = cache.get_or_render(source, renderer, version, dpi, fn)
+        except Exception as e:
+            errors.append(f'{renderer}: {type(e).__name__}: {e}')
+            return
+        if rel is None:
+            errors.append(f'{renderer}: rendering failed')
+        else:
+            results[column] = rel
+
+    structure_path = payload.get('structure_path')
+    if structure_path and os.path.exists(structure_path):
+        with open(structure_path, 'rb') as f:
+            source = f.read()
+        render('structure_image_path', source, 'structure', StructureVisualizer.RENDER_VERSION,
+               lambda out: StructureVisualizer.create_structure_plot(structure_path, out, dpi=dpi))
+        render('reciprocal_lattice_image_path', source, 'reciprocal_lattice', StructureVisualizer.RENDER_VERSION,
+               lambda out: StructureVisualizer.create_reciprocal_lattice_plot(structure_path, out, dpi=dpi))
+
+    # Путь к .npy содержит хэш данных и годится как источник ключа кэша;
+    # band_structure_data/dos_data - старый JSON для еще не переведенных строк
+    band_path = payload.get('band_structure_path')
+    band_text = payload.get('band_structure_data')
+    if band_path or band_text:
+        render('band_structure_image_path', band_path or band_text, 'band_structure',
+               BandStructureVisualizer.RENDER_VERSION,
+               lambda out: BandStructureVisualizer.create_band_structure_plot(
+                   load_band_structure(band_path) if band_path else json.loads(band_text), out, dpi=dpi))
+
+    dos_path = payload.get('dos_path')
+    dos_text = payload.get('dos_data')
+    if dos_path or dos_text:
+        render('dos_image_path', dos_path or dos_text, 'dos', DOSVisualizer.RENDER_VERSION,
+               lambda out: DOSVisualizer.create_dos_plot(
+                   load_dos(dos_path) if dos_path else json.loads(dos_text), out, dpi=dpi,
+                   levels=load_levels(dos_path) if dos_path else None))
+
+    return results, errors, time.perf_counter() - started
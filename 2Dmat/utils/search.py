@@ -0,0 +1,93 @@
+"""
+Полнотекстовый поиск материалов на SQLite FTS5.
+
+Таблица material_fts (external content над material) индексирует formula,
+name, iupac_name, tags и reference токенизатором trigram, поэтому MATCH
+находит любые подстроки длиной от 3 символов, в том числе части формул
+("rI3" в "CrI3"). Триггеры на material поддерживают индекс при вставке,
+изменении этих колонок и удалении, включая массовые операции мимо ORM.
+Результаты упорядочены по bm25 с весами колонок SEARCH_WEIGHTS.
+"""
+from sqlalchemy import column, literal_column, select, table, text
+
+# Колонки индекса и их веса в bm25 (формула важнее названия и ссылок)
+SEARCH_COLUMNS = ('formula', 'name', 'iupac_name', 'tags', 'reference')
+SEARCH_WEIGHTS = (10.0, 5.0, 3.0, 2.0, 1.0)
+
+# Токенизатор trigram не находит строки короче трех символов
+MIN_TERM_LENGTH = 3
+
+_columns = ', '.join(SEARCH_COLUMNS)
+_new_values = ', '.join(f'new.{name}' for name in SEARCH_COLUMNS)
+_old_values = ', '.join(f'old.{name}' for name in SEARCH_COLUMNS)
+
+SEARCH_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS material_fts USING fts5("
+    f"{_columns}, content='material', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS material_fts_insert AFTER INSERT ON material BEGIN "
+    f"INSERT INTO material_fts(rowid, {_columns}) VALUES (new.id, {_new_values}); END",
+    f"CREATE TRIGGER IF NOT EXISTS material_fts_delete AFTER DELETE ON material BEGIN "
+    f"INSERT INTO material_fts(material_fts, rowid, {_columns}) VALUES ('delete', old.id, {_old_values}); END",
+    # Только при изменении индексируемых колонок: счетчик просмотров индекс не трогает
+    f"CREATE TRIGGER IF NOT EXISTS material_fts_update AFTER UPDATE OF {_columns} ON material BEGIN "
+    f"INSERT INTO material_fts(material_fts, rowid, {_columns}) VALUES ('delete', old.id, {_old_values}); "
+    f"INSERT INTO material_fts(rowid, {_columns}) VALUES (new.id, {_new_values}); END",
+)
+
+DROP_DDL = (
+    'DROP TRIGGER IF EXISTS material_fts_update',
+    'DROP TRIGGER IF EXISTS material_fts_delete',
+    'DROP TRIGGER IF EXISTS material_fts_insert',
+    'DROP TABLE IF EXISTS material_fts',
+)
+
+material_fts = table('material_fts', column('rowid'), *(column(name) for name in SEARCH_COLUMNS))
+
+
+def search_supported(bind):
+    return bind.dialect.name == 'sqlite'
+
+
+def create_search_index(bind, rebuild=False):
+    """
+    Создает таблицу FTS и триггеры, если их нет. Индекс заполняется
+    из material при создании таблицы или при rebuild=True.
+    """
+    if not search_supported(bind):
+        return
+    exists = bind.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'material_fts'"
+    )).first() is not None
+    for statement in SEARCH_DDL:
+        bind.execute(text(statement))
+    if rebuild or not exists:
+        bind.execute(text("INSERT INTO material_fts(material_fts) VALUES ('rebuild')"))
+
+
+def drop_search_index(bind):
+    if search_supported(bind):
+        for statement in DROP_DDL:
+            bind.execute(text(statement))
+
+
+def match_expression(query):
+    """
+    Строка MATCH из пользовательского запроса: каждое слово - фраза в кавычках,
+    слова объединяются через AND. None, если FTS не может обработать запрос
+    (пусто или есть слово короче MIN_TERM_LENGTH).
+    """
+    terms = query.split()
+    if not terms or any(len(term) < MIN_TERM_LENGTH for term in terms):
+        return None
+    return ' '.join('"{}"'.format(term.replace('"', '""')) for term in terms)
+
+
+def ranked_matches(expression):
+    """
+    Подзапрос (id, rank) совпадений FTS; меньший rank - лучшее совпадение
+    """
+    weights = ', '.join(str(weight) for weight in SEARCH_WEIGHTS)
+    return select(
+        material_fts.c.rowid.label('id'),
+        literal_column(f'bm25(material_fts, {weights})').label('rank')
+    ).where(literal_column('material_fts').op('MATCH')(expression)).subquery('search')
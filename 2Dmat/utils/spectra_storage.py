@@ -0,0 +1,219 @@
+"""
+Бинарное хранение зонной структуры и DOS.
+
+Массивы каждого набора данных лежат в отдельной папке
+<folder>/<material_id>-<digest>/ в виде несжатых float32 .npy, поэтому читаются
+через np.load(mmap_mode='r') без копирования. Имя папки включает хэш
+содержимого: новые данные пишутся в новую папку, а путь к ней атомарно
+меняется в строке Material.
+
+Рядом с данными лежит пирамида уровней детализации lod1.npy, lod2.npy, ...
+(см. utils.lod) - ее строят при сохранении, а графики читают только нужный
+уровень и окно.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from utils.lod import build_levels, sort_by_axis
+
+
+def _save_arrays(folder, material_id, arrays, meta):
+    digest = hashlib.sha256()
+    for name in sorted(arrays):
+        digest.update(name.encode('utf-8'))
+        digest.update(str(arrays[name].shape).encode('utf-8'))
+        digest.update(arrays[name].tobytes())
+    digest.update(json.dumps(meta, sort_keys=True).encode('utf-8'))
+
+    path = os.path.join(folder, f'{material_id}-{digest.hexdigest()[:16]}')
+    if os.path.isdir(path):
+        return path
+
+    os.makedirs(folder, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=folder, prefix='.tmp-')
+    try:
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_dir, f'{name}.npy'), array)
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.rename(tmp_dir, path)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.isdir(path):
+            raise
+    return path
+
+
+def _with_levels(arrays, axis, values):
+    for level, matrix in enumerate(build_levels(axis, values), start=1):
+        arrays[f'lod{level}'] = matrix
+    return arrays
+
+
+def _load_arrays(path, names, mmap):
+    mode = 'r' if mmap else None
+    arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mode) for name in names}
+    with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    return arrays, meta
+
+
+def save_band_structure(folder, material_id, data):
+    """
+    Сохраняет зонную структуру (словарь с ключами 'kpoints', 'energies', 'labels')
+    и возвращает путь к папке с данными
+    """
+    kpoints = np.asarray(data.get('kpoints', []), dtype=np.float32)
+    energies = np.asarray(data.get('energies', []), dtype=np.float32)
+    if kpoints.size == 0 or energies.size == 0:
+        raise ValueError('Band structure data must contain kpoints and energies')
+    arrays = {'kpoints': kpoints, 'energies': energies}
+    if energies.ndim == 2:
+        _with_levels(arrays, kpoints, energies.T)
+    return _save_arrays(folder, material_id, arrays, {'labels': data.get('labels', {})})
+
+
+def load_band_structure(path, mmap=True):
+    """Загружает зонную структуру в том же виде, что принимают визуализаторы"""
+    arrays, meta = _load_arrays(path, ('kpoints', 'energies'), mmap)
+    return {'kpoints': arrays['kpoints'], 'energies': arrays['energies'],
+            'labels': meta.get('labels', {})}
+
+
+def save_dos(folder, material_id, data):
+    """
+    Сохраняет DOS (словарь с ключами 'energy', 'total_dos', 'partial_dos')
+    и возвращает путь к папке с данными. Частичные DOS хранятся одной
+    матрицей каналов x энергий.
+    """
+    energy = np.asarray(data.get('energy', []), dtype=np.float32)
+    total_dos = np.asarray(data.get('total_dos', []), dtype=np.float32)
+    if energy.size == 0 or total_dos.size == 0:
+        raise ValueError('DOS data must contain energy and total_dos')
+
+    partial = data.get('partial_dos') or {}
+    names = list(partial)
+    if names:
+        partial_dos = np.asarray([partial[name] for name in names], dtype=np.float32)
+    else:
+        partial_dos = np.zeros((0, energy.size), dtype=np.float32)
+    if energy.size > 1 and np.any(np.diff(energy) < 0):
+        # Пирамида и выбор окна требуют возрастающей оси энергии
+        order = np.argsort(energy, kind='stable')
+        energy, total_dos, partial_dos = energy[order], total_dos[order], partial_dos[:, order]
+    arrays = {'energy': energy, 'total_dos': total_dos, 'partial_dos': partial_dos}
+    _with_levels(arrays, energy, dos_channels(arrays))
+    return _save_arrays(folder, material_id, arrays, {'partial_dos': names})
+
+
+def load_dos(path, mmap=True):
+    """Загружает DOS; каналы partial_dos - строки-представления общей матрицы"""
+    arrays, meta = _load_arrays(path, ('energy', 'total_dos', 'partial_dos'), mmap)
+    partial = arrays['partial_dos']
+    return {'energy': arrays['energy'], 'total_dos': arrays['total_dos'],
+            'partial_dos': {name: partial[i] for i, name in enumerate(meta.get('partial_dos', []))}}
+
+
+def dos_channels(data, start=None, stop=None):
+    """
+    Каналы DOS одной матрицей: total_dos, затем partial_dos в порядке имен.
+    start/stop - диапазон индексов энергии (читается только он).
+    """
+    window = slice(start, stop)
+    partial = data['partial_dos']
+    if isinstance(partial, dict):
+        partial = list(partial.values())
+    rows = [np.asarray(data['total_dos'][window], dtype=np.float32)]
+    rows.extend(np.asarray(channel[window], dtype=np.float32) for channel in partial)
+    return np.vstack(rows)
+
+
+def load_levels(path, mmap=True):
+    """Пирамида уровней детализации набора данных; [] для папок без нее"""
+    mode = 'r' if mmap else None
+    levels = []
+    while os.path.exists(os.path.join(path, f'lod{len(levels) + 1}.npy')):
+        levels.append(np.load(os.path.join(path, f'lod{len(levels) + 1}.npy'), mmap_mode=mode))
+    return levels
+
+
+def build_missing_levels(path, kind):
+    """
+    Строит пирамиду для папки, сохраненной до ее появления (kind: 'bands'
+    или 'dos'). Возвращает число записанных уровней.
+    """
+    if load_levels(path):
+        return 0
+    if kind == 'bands':
+        data = load_band_structure(path, mmap=False)
+        if np.ndim(data['energies']) != 2:
+            return 0
+        levels = build_levels(data['kpoints'], np.asarray(data['energies']).T)
+    else:
+        data = load_dos(path, mmap=False)
+        levels = build_levels(*sort_by_axis(data['energy'], dos_channels(data)))
+    # Уровни записываются с конца: lod1.npy появляется последним, и
+    # load_levels не увидит недописанную пирамиду
+    for level in range(len(levels), 0, -1):
+        tmp_path = os.path.join(path, f'.lod{level}.tmp.npy')
+        np.save(tmp_path, levels[level - 1])
+        os.replace(tmp_path, os.path.join(path, f'lod{level}.npy'))
+    return len(levels)
+
+
+def remove_spectra(path):
+    """Удаляет папку с данными (например, после замены на новую версию)"""
+    if path and os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def parse_band_structure_upload(filename, content):
+    """
+    Разбирает загруженный файл зонной структуры.
+    JSON: {'kpoints': [...], 'energies': [[...]], 'labels': {...}};
+    CSV/TXT: первый столбец - k, остальные - зоны.
+    """
+    if filename.lower().endswith('.json'):
+        return json.loads(content)
+    table = _read_table(content)
+    return {'kpoints': table[:, 0], 'energies': table[:, 1:], 'labels': {}}
+
+
+def parse_dos_upload(filename, content):
+    """
+    Разбирает загруженный файл DOS.
+    JSON: {'energy': [...], 'total_dos': [...], 'partial_dos': {...}};
+    CSV/TXT: energy, total_dos и далее частичные DOS, имена берутся из заголовка.
+    """
+    if filename.lower().endswith('.json'):
+        return json.loads(content)
+    header, table = _read_table(content, with_header=True)
+    names = header[2:] if header else [f'channel {i + 1}' for i in range(table.shape[1] - 2)]
+    return {'energy': table[:, 0], 'total_dos': table[:, 1],
+            'partial_dos': {name: table[:, i + 2] for i, name in enumerate(names)}}
+
+
+def _read_table(content, with_header=False):
+    if isinstance(content, bytes):
+        content = content.decode('utf-8')
+    rows = []
+    for line in content.splitlines():
+        line = line.strip()
+        if line and not line.startswith('#'):
+            rows.append(line.replace(',', ' ').replace(';', ' ').split())
+    header = None
+    try:
+        float(rows[0][0])
+    except ValueError:
+        header = [name.strip() for name in rows.pop(0)]
+    except IndexError:
+        raise ValueError('Empty data file')
+    table = np.array(rows, dtype=np.float64)
+    if table.ndim != 2 or table.shape[1] < 2:
+        raise ValueError('Data file needs at least two columns')
+    return (header, table) if with_header else table
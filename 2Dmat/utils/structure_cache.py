@@ -0,0 +1,214 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from ase import Atoms
+from ase.io import read
+
+from utils.metrics import timed
+
+
+class StructureCache:
+    """
+    Общий для процесса кэш разобранных структур (CIF/POSCAR).
+    Ключ - путь + mtime + размер файла; хранятся только массивы
+    positions/numbers/cell/pbc, объем ограничен max_bytes (LRU).
+    При заданном sidecar_dir массивы дополнительно сохраняются в .npz,
+    чтобы новый процесс не разбирал файл заново; объем папки ограничен
+    sidecar_max_bytes (LRU по mtime, как в RenderCache), а forget(path)
+    удаляет .npz файла, который больше не нужен.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, sidecar_dir=None, sidecar_max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.sidecar_dir = sidecar_dir
+        self.sidecar_max_bytes = sidecar_max_bytes
+        self._sidecar_size = None  # приблизительный объем .npz, байт
+        self._entries = OrderedDict()  # path -> (stat_key, arrays, nbytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.sidecar_hits = 0
+
+    def configure(self, max_bytes=None, sidecar_dir=None, sidecar_max_bytes=None):
+        if max_bytes is not None:
+            self.max_bytes = max_bytes
+        if sidecar_dir is not None:
+            os.makedirs(sidecar_dir, exist_ok=True)
+            self.sidecar_dir = sidecar_dir
+            self._sidecar_size = None
+        if sidecar_max_bytes is not None:
+            self.sidecar_max_bytes = sidecar_max_bytes
+
+    def read(self, path):
+        """Возвращает новый объект Atoms для файла структуры"""
+        path = os.path.realpath(path)
+        st = os.stat(path)
+        stat_key = (st.st_mtime_ns, st.st_size)
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == stat_key:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return self._to_atoms(entry[1])
+            self.misses += 1
+
+        arrays = self._load_sidecar(path, stat_key)
+        if arrays is None:
+            arrays = self._parse(path)
+            self._save_sidecar(path, stat_key, arrays)
+        else:
+            with self._lock:
+                self.sidecar_hits += 1
+
+        self._store(path, stat_key, arrays)
+        return self._to_atoms(arrays)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'sidecar_hits': self.sidecar_hits,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def forget(self, path):
+        """Убирает файл из кэша и удаляет его .npz (материал удален или файл заменен)"""
+        path = os.path.realpath(path)
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is not None:
+                self._bytes -= entry[2]
+        if not self.sidecar_dir:
+            return
+        sidecar = self._sidecar_path(path)
+        try:
+            size = os.path.getsize(sidecar)
+            os.remove(sidecar)
+        except OSError:
+            return
+        with self._lock:
+            if self._sidecar_size is not None:
+                self._sidecar_size -= size
+
+    @staticmethod
+    @timed
+    def _parse(path):
+        """Разбор файла ASE - массивы, которые хранит кэш"""
+        atoms = read(path)
+        return {
+            'positions': atoms.get_positions(),
+            'numbers': atoms.get_atomic_numbers().astype(np.uint8),
+            'cell': atoms.get_cell().array,
+            'pbc': atoms.get_pbc(),
+        }
+
+    @staticmethod
+    def _to_atoms(arrays):
+        # Atoms копирует массивы, так что кэш не изменится вызывающим кодом
+        return Atoms(numbers=arrays['numbers'], positions=arrays['positions'],
+                     cell=arrays['cell'], pbc=arrays['pbc'])
+
+    def _store(self, path, stat_key, arrays):
+        nbytes = sum(a.nbytes for a in arrays.values())
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[path] = (stat_key, arrays, nbytes)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+    def _sidecar_path(self, path):
+        name = hashlib.sha1(path.encode('utf-8')).hexdigest()
+        return os.path.join(self.sidecar_dir, f'{name}.npz')
+
+    def _load_sidecar(self, path, stat_key):
+        if not self.sidecar_dir:
+            return None
+        sidecar = self._sidecar_path(path)
+        try:
+            with np.load(sidecar) as data:
+                if tuple(data['stat_key']) != stat_key:
+                    return None
+                arrays = {name: data[name] for name in ('positions', 'numbers', 'cell', 'pbc')}
+        except (OSError, KeyError, ValueError):
+            return None
+        # Обновляем mtime - по нему работает вытеснение LRU
+        try:
+            os.utime(sidecar)
+        except OSError:
+            pass
+        return arrays
+
+    def _save_sidecar(self, path, stat_key, arrays):
+        if not self.sidecar_dir:
+            return
+        sidecar = self._sidecar_path(path)
+        tmp_path = f'{sidecar[:-4]}.{os.getpid()}.{threading.get_ident()}.tmp.npz'
+        try:
+            np.savez(tmp_path, stat_key=np.array(stat_key, dtype=np.int64), **arrays)
+            os.replace(tmp_path, sidecar)
+        except OSError as e:
+            print(f"Не удалось сохранить кэш структуры {path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._account_sidecar(os.path.getsize(sidecar))
+
+    def _account_sidecar(self, added):
+        with self._lock:
+            if self._sidecar_size is None:
+                self._sidecar_size = sum(size for _, size, _ in self._sidecars())
+            else:
+                self._sidecar_size += added
+            if self._sidecar_size > self.sidecar_max_bytes:
+                self._sidecar_size = self._evict_sidecars()
+
+    def _sidecars(self):
+        for name in os.listdir(self.sidecar_dir):
+            # Временные .tmp.npz пишутся другими потоками и процессами
+            if name.endswith('.npz') and not name.endswith('.tmp.npz'):
+                path = os.path.join(self.sidecar_dir, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield st.st_mtime, st.st_size, path
+
+    def _evict_sidecars(self):
+        """Удаляет давно не читавшиеся .npz, пока папка не уложится в лимит"""
+        entries = sorted(self._sidecars())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.sidecar_max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        return total
+
+
+# Кэш процесса, используется визуализаторами
+structure_cache = StructureCache()
+
+
+def read_structure(path):
+    return structure_cache.read(path)
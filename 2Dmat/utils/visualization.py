@@ -1,216 +1,293 @@
-import matplotlib
-matplotlib.use('Agg')  # Для использования без GUI
-import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 import numpy as np
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import json
 import base64
+from contextlib import contextmanager
 from io import BytesIO
 import ase
 from ase import Atoms
-from ase.io import read, write
 from ase.visualize.plot import plot_atoms
 import matplotlib.patches as mpatches
 
+from utils.metrics import timed
+from utils.structure_cache import read_structure
+from utils.downsampling import band_window
+from utils.lod import build_levels, select_window, envelope, sort_by_axis
+from utils.spectra_storage import dos_channels
+from utils.plot_templates import band_structure_png, dos_png
+
+
+# Фигуры создаются без pyplot: его глобальный список фигур и "текущие" оси
+# общие для всех потоков. Отдельная Figure с холстом Agg делит с другими
+# потоками только парсер mathtext, которым пользуются лишь метки зонной
+# структуры (см. MATHTEXT_LOCK в utils/plot_templates.py), поэтому
+# визуализаторы можно вызывать из пула потоков.
+
+@contextmanager
+def new_figure(**kwargs):
+    """Figure с холстом Agg; очищается и при исключении при отрисовке"""
+    fig = Figure(**kwargs)
+    FigureCanvasAgg(fig)
+    try:
+        yield fig
+    finally:
+        # Разрывает ссылки фигуры на оси и artists, не дожидаясь сборщика циклов
+        fig.clear()
+
+
+def save_figure(fig, output_path, dpi):
+    """PNG в output_path (возвращает путь) или строкой data:image/png;base64"""
+    if output_path:
+        fig.savefig(output_path, dpi=dpi, bbox_inches='tight')
+        return output_path
+    buf = BytesIO()
+    fig.savefig(buf, format='png', dpi=dpi, bbox_inches='tight')
+    img_str = base64.b64encode(buf.getvalue()).decode('utf-8')
+    return f"data:image/png;base64,{img_str}"
+
+
+def save_png(png, output_path):
+    """Готовые PNG-байты в output_path или строкой data:image/png;base64"""
+    if output_path:
+        with open(output_path, 'wb') as f:
+            f.write(png)
+        return output_path
+    return f"data:image/png;base64,{base64.b64encode(png).decode('utf-8')}"
+
+
 class StructureVisualizer:
     """Класс для визуализации кристаллических структур"""
     
+    # Увеличивать при любом изменении внешнего вида изображений (ключ кэша)
+    RENDER_VERSION = 2
+    
+    # Начиная с этого числа атомов create_structure_plot рисует быстрым режимом
+    FAST_RENDER_MIN_ATOMS = 100
+    
+    # Радиус поиска связей, Å (как NeighborList с радиусами 2.0 у каждого атома)
+    BOND_CUTOFF = 4.0
+    
     @staticmethod
-    def create_structure_plot(cif_path, output_path=None, dpi=150):
+    @timed
+    def _draw_atoms_and_bonds_fast(ax, atoms, element_colors, atomic_radii):
+        """
+        Быстрый режим: один scatter на элемент и все связи одной Line3DCollection
+        по единственному векторизованному запросу соседей
+        """
+        from ase.neighborlist import neighbor_list
+        from mpl_toolkits.mplot3d.art3d import Line3DCollection
+        
+        positions = atoms.get_positions()
+        numbers = atoms.get_atomic_numbers()
+        
+        for num in np.unique(numbers):
+            mask = numbers == num
+            radius = atomic_radii.get(num, 0.7)
+            ax.scatter(positions[mask, 0], positions[mask, 1], positions[mask, 2],
+                       s=(radius * 20) ** 2, color=element_colors.get(num, 'gray'),
+                       alpha=0.8, edgecolors='none', depthshade=True)
+        
+        if len(atoms) > 1:
+            i, j, S = neighbor_list('ijS', atoms, StructureVisualizer.BOND_CUTOFF)
+            # Связь внутри ячейки встречается дважды (i-j и j-i) - оставляем одну
+            keep = (i < j) | S.any(axis=1)
+            i, j, S = i[keep], j[keep], S[keep]
+            if len(i):
+                starts = positions[i]
+                ends = positions[j] + S @ atoms.get_cell().array
+                segments = np.stack([starts, ends], axis=1)
+                ax.add_collection3d(Line3DCollection(segments, colors='k',
+                                                     linewidths=1, alpha=0.5))
+                ax.auto_scale_xyz(segments[:, :, 0], segments[:, :, 1],
+                                  segments[:, :, 2], had_data=True)
+    
+    @staticmethod
+    @timed
+    def create_structure_plot(cif_path, output_path=None, dpi=150, fast=None):
         """
         Создает 2D изображение кристаллической структуры из CIF файла
+        fast: None - выбрать по числу атомов, True/False - быстрый или подробный режим
         """
         try:
-            atoms = read(cif_path)
-            
-            fig = plt.figure(figsize=(10, 8))
-            ax = fig.add_subplot(111, projection='3d')
-            
-            # Получаем позиции атомов
-            positions = atoms.get_positions()
-            symbols = atoms.get_chemical_symbols()
-            numbers = atoms.get_atomic_numbers()
-            
-            # Цвета для разных элементов
-            element_colors = {
-                1: 'gray',    # H
-                6: 'black',   # C
-                7: 'blue',    # N
-                8: 'red',     # O
-                14: 'orange', # Si
-                26: 'brown',  # Fe
-                24: 'green',  # Cr
-                42: 'cyan',   # Mo
-                74: 'purple', # W
-                53: 'pink',   # I
-            }
-            
-            # Размеры атомов
-            atomic_radii = {
-                1: 0.3,   # H
-                6: 0.7,   # C
-                7: 0.65,  # N
-                8: 0.6,   # O
-                14: 1.1,  # Si
-                26: 1.4,  # Fe
-                24: 1.3,  # Cr
-                42: 1.3,  # Mo
-                74: 1.3,  # W
-                53: 1.4,  # I
-            }
-            
-            # Рисуем атомы
-            for pos, num in zip(positions, numbers):
-                color = element_colors.get(num, 'gray')
-                radius = atomic_radii.get(num, 0.7)
+            atoms = read_structure(cif_path)
+            
+            with new_figure(figsize=(10, 8)) as fig:
+                ax = fig.add_subplot(111, projection='3d')
+            
+                # Получаем позиции атомов
+                positions = atoms.get_positions()
+                symbols = atoms.get_chemical_symbols()
+                numbers = atoms.get_atomic_numbers()
+            
+                # Цвета для разных элементов
+                element_colors = {
+                    1: 'gray',    # H
+                    6: 'black',   # C
+                    7: 'blue',    # N
+                    8: 'red',     # O
+                    14: 'orange', # Si
+                    26: 'brown',  # Fe
+                    24: 'green',  # Cr
+                    42: 'cyan',   # Mo
+                    74: 'purple', # W
+                    53: 'pink',   # I
+                }
+            
+                # Размеры атомов
+                atomic_radii = {
+                    1: 0.3,   # H
+                    6: 0.7,   # C
+                    7: 0.65,  # N
+                    8: 0.6,   # O
+                    14: 1.1,  # Si
+                    26: 1.4,  # Fe
+                    24: 1.3,  # Cr
+                    42: 1.3,  # Mo
+                    74: 1.3,  # W
+                    53: 1.4,  # I
+                }
+            
+                if fast is None:
+                    fast = len(atoms) > StructureVisualizer.FAST_RENDER_MIN_ATOMS
+            
+                if fast:
+                    StructureVisualizer._draw_atoms_and_bonds_fast(
+                        ax, atoms, element_colors, atomic_radii
+                    )
+                else:
+                    # Рисуем атомы
+                    for pos, num in zip(positions, numbers):
+                        color = element_colors.get(num, 'gray')
+                        radius = atomic_radii.get(num, 0.7)
                 
-                # Сфера
-                u = np.linspace(0, 2 * np.pi, 30)
-                v = np.linspace(0, np.pi, 30)
-                x = radius * np.outer(np.cos(u), np.sin(v)) + pos[0]
-                y = radius * np.outer(np.sin(u), np.sin(v)) + pos[1]
-                z = radius * np.outer(np.ones(np.size(u)), np.cos(v)) + pos[2]
+                        # Сфера
+                        u = np.linspace(0, 2 * np.pi, 30)
+                        v = np.linspace(0, np.pi, 30)
+                        x = radius * np.outer(np.cos(u), np.sin(v)) + pos[0]
+                        y = radius * np.outer(np.sin(u), np.sin(v)) + pos[1]
+                        z = radius * np.outer(np.ones(np.size(u)), np.cos(v)) + pos[2]
                 
-                ax.plot_surface(x, y, z, color=color, alpha=0.8)
-            
-            # Рисуем связи
-            if len(atoms) > 1:
-                from ase.neighborlist import NeighborList
-                nl = NeighborList([2.0] * len(atoms), self_interaction=False, 
-                                 bothways=True)
-                nl.update(atoms)
+                        ax.plot_surface(x, y, z, color=color, alpha=0.8)
+            
+                    # Рисуем связи
+                    if len(atoms) > 1:
+                        from ase.neighborlist import NeighborList
+                        nl = NeighborList([2.0] * len(atoms), self_interaction=False, 
+                                         bothways=True)
+                        nl.update(atoms)
                 
-                for i in range(len(atoms)):
-                    indices, offsets = nl.get_neighbors(i)
-                    for j, offset in zip(indices, offsets):
-                        pos_i = atoms.positions[i]
-                        pos_j = atoms.positions[j] + np.dot(offset, atoms.get_cell())
+                        for i in range(len(atoms)):
+                            indices, offsets = nl.get_neighbors(i)
+                            for j, offset in zip(indices, offsets):
+                                pos_i = atoms.positions[i]
+                                pos_j = atoms.positions[j] + np.dot(offset, atoms.get_cell())
                         
-                        # Рисуем линию между атомами
-                        ax.plot([pos_i[0], pos_j[0]],
-                                [pos_i[1], pos_j[1]],
-                                [pos_i[2], pos_j[2]],
-                                'k-', linewidth=1, alpha=0.5)
-            
-            # Настройки осей
-            ax.set_xlabel('X (Å)', fontsize=12)
-            ax.set_ylabel('Y (Å)', fontsize=12)
-            ax.set_zlabel('Z (Å)', fontsize=12)
-            ax.set_title(f'Кристаллическая структура: {atoms.get_chemical_formula()}', 
-                        fontsize=14, pad=20)
-            
-            # Легенда для элементов
-            unique_elements = set(symbols)
-            legend_patches = []
-            for elem in unique_elements:
-                for num, sym in element_colors.items():
-                    if ase.data.chemical_symbols[num] == elem:
-                        patch = mpatches.Patch(color=sym, label=elem)
-                        legend_patches.append(patch)
-                        break
-            
-            if legend_patches:
-                ax.legend(handles=legend_patches, loc='upper right')
-            
-            plt.tight_layout()
-            
-            if output_path:
-                plt.savefig(output_path, dpi=dpi, bbox_inches='tight')
-                plt.close()
-                return output_path
-            else:
-                # Возвращаем изображение как base64
-                buf = BytesIO()
-                plt.savefig(buf, format='png', dpi=dpi, bbox_inches='tight')
-                plt.close()
-                buf.seek(0)
-                img_str = base64.b64encode(buf.read()).decode('utf-8')
-                return f"data:image/png;base64,{img_str}"
+                                # Рисуем линию между атомами
+                                ax.plot([pos_i[0], pos_j[0]],
+                                        [pos_i[1], pos_j[1]],
+                                        [pos_i[2], pos_j[2]],
+                                        'k-', linewidth=1, alpha=0.5)
+            
+                # Настройки осей
+                ax.set_xlabel('X (Å)', fontsize=12)
+                ax.set_ylabel('Y (Å)', fontsize=12)
+                ax.set_zlabel('Z (Å)', fontsize=12)
+                ax.set_title(f'Кристаллическая структура: {atoms.get_chemical_formula()}', 
+                            fontsize=14, pad=20)
+            
+                # Легенда для элементов
+                unique_elements = set(symbols)
+                legend_patches = []
+                for elem in unique_elements:
+                    for num, sym in element_colors.items():
+                        if ase.data.chemical_symbols[num] == elem:
+                            patch = mpatches.Patch(color=sym, label=elem)
+                            legend_patches.append(patch)
+                            break
+            
+                if legend_patches:
+                    ax.legend(handles=legend_patches, loc='upper right')
+            
+                fig.tight_layout()
+                return save_figure(fig, output_path, dpi)
                 
         except Exception as e:
             print(f"Ошибка визуализации структуры: {e}")
             return None
     
     @staticmethod
-    def create_reciprocal_lattice_plot(cif_path, output_path=None):
+    @timed
+    def create_reciprocal_lattice_plot(cif_path, output_path=None, dpi=150):
         """
         Создает визуализацию обратной решетки
         """
         try:
-            atoms = read(cif_path)
+            atoms = read_structure(cif_path)
             
             # Получаем обратную решетку
             cell = atoms.get_cell()
             reciprocal_cell = cell.reciprocal()
             
-            fig = plt.figure(figsize=(10, 8))
-            ax = fig.add_subplot(111, projection='3d')
-            
-            # Векторы обратной решетки
-            vectors = reciprocal_cell
-            origin = np.zeros(3)
-            
-            # Цвета для векторов
-            colors = ['r', 'g', 'b']
-            labels = ['b₁', 'b₂', 'b₃']
-            
-            for i in range(3):
-                ax.quiver(*origin, *vectors[i], 
-                         color=colors[i], label=labels[i],
-                         arrow_length_ratio=0.1, linewidth=2)
-            
-            # Рисуем точки обратной решетки
-            n_points = 3
-            points = []
-            
-            for i in range(-n_points, n_points+1):
-                for j in range(-n_points, n_points+1):
-                    for k in range(-n_points, n_points+1):
-                        point = i * vectors[0] + j * vectors[1] + k * vectors[2]
-                        points.append(point)
-            
-            points = np.array(points)
-            ax.scatter(points[:, 0], points[:, 1], points[:, 2], 
-                      c='black', s=20, alpha=0.6)
-            
-            # Первая зона Бриллюэна (упрощенная)
-            # Для кубических/гексагональных систем
-            if atoms.cell.cellpar()[3:] == (90, 90, 90):
-                # Простая кубическая
-                pass
-            
-            ax.set_xlabel('b₁ (Å⁻¹)', fontsize=12)
-            ax.set_ylabel('b₂ (Å⁻¹)', fontsize=12)
-            ax.set_zlabel('b₃ (Å⁻¹)', fontsize=12)
-            ax.set_title('Обратная решетка', fontsize=14, pad=20)
-            ax.legend()
-            
-            plt.tight_layout()
-            
-            if output_path:
-                plt.savefig(output_path, dpi=150, bbox_inches='tight')
-                plt.close()
-                return output_path
-            else:
-                buf = BytesIO()
-                plt.savefig(buf, format='png', dpi=150, bbox_inches='tight')
-                plt.close()
-                buf.seek(0)
-                img_str = base64.b64encode(buf.read()).decode('utf-8')
-                return f"data:image/png;base64,{img_str}"
+            with new_figure(figsize=(10, 8)) as fig:
+                ax = fig.add_subplot(111, projection='3d')
+            
+                # Векторы обратной решетки
+                vectors = reciprocal_cell
+                origin = np.zeros(3)
+            
+                # Цвета для векторов
+                colors = ['r', 'g', 'b']
+                labels = ['b₁', 'b₂', 'b₃']
+            
+                for i in range(3):
+                    ax.quiver(*origin, *vectors[i], 
+                             color=colors[i], label=labels[i],
+                             arrow_length_ratio=0.1, linewidth=2)
+            
+                # Рисуем точки обратной решетки
+                n_points = 3
+                points = []
+            
+                for i in range(-n_points, n_points+1):
+                    for j in range(-n_points, n_points+1):
+                        for k in range(-n_points, n_points+1):
+                            point = i * vectors[0] + j * vectors[1] + k * vectors[2]
+                            points.append(point)
+            
+                points = np.array(points)
+                ax.scatter(points[:, 0], points[:, 1], points[:, 2], 
+                          c='black', s=20, alpha=0.6)
+            
+                # Первая зона Бриллюэна (упрощенная)
+                # Для кубических/гексагональных систем
+                if np.allclose(atoms.cell.cellpar()[3:], 90):
+                    # Простая кубическая
+                    pass
+            
+                ax.set_xlabel('b₁ (Å⁻¹)', fontsize=12)
+                ax.set_ylabel('b₂ (Å⁻¹)', fontsize=12)
+                ax.set_zlabel('b₃ (Å⁻¹)', fontsize=12)
+                ax.set_title('Обратная решетка', fontsize=14, pad=20)
+                ax.legend()
+            
+                fig.tight_layout()
+                return save_figure(fig, output_path, dpi)
                 
         except Exception as e:
             print(f"Ошибка визуализации обратной решетки: {e}")
             return None
     
     @staticmethod
+    @timed
     def create_interactive_structure(cif_path):
         """
         Создает интерактивную 3D визуализацию с помощью plotly
         """
         try:
-            atoms = read(cif_path)
+            atoms = read_structure(cif_path)
             
             # Получаем данные атомов
             positions = atoms.get_positions()
@@ -326,8 +403,12 @@ class StructureVisualizer:
 class BandStructureVisualizer:
     """Класс для визуализации зонной структуры"""
     
+    # 2: PNG из шаблона фигуры (utils/plot_templates.py), легенда уровня Ферми
+    RENDER_VERSION = 2
+    
     @staticmethod
-    def create_band_structure_plot(data, output_path=None):
+    @timed
+    def create_band_structure_plot(data, output_path=None, dpi=150):
         """
         Создает график зонной структуры из данных
         data: словарь с ключами 'kpoints', 'energies', 'labels'
@@ -340,79 +421,52 @@ class BandStructureVisualizer:
             if len(kpoints) == 0 or len(energies) == 0:
                 return None
             
-            fig, ax = plt.subplots(figsize=(12, 8))
-            
-            # Рисуем зоны
-            if energies.ndim == 2:
-                for band in energies.T:
-                    ax.plot(kpoints, band, 'b-', linewidth=1, alpha=0.7)
-            else:
-                ax.plot(kpoints, energies, 'b-', linewidth=1, alpha=0.7)
-            
-            # Линия Ферми
-            ax.axhline(y=0, color='r', linestyle='--', linewidth=1, alpha=0.7)
-            
-            # Настройка осей
-            ax.set_xlabel('Волновой вектор', fontsize=14)
-            ax.set_ylabel('Энергия (эВ)', fontsize=14)
-            ax.set_title('Зонная структура', fontsize=16, pad=20)
-            
-            # Метки высокосимметричных точек
-            if labels:
-                tick_positions = []
-                tick_labels = []
-                
-                for label, position in labels.items():
-                    if position in kpoints:
-                        idx = np.where(kpoints == position)[0][0]
-                        tick_positions.append(position)
-                        tick_labels.append(f'${label}$')
-                
-                ax.set_xticks(tick_positions)
-                ax.set_xticklabels(tick_labels, fontsize=12)
-                
-                # Вертикальные линии в высокосимметричных точках
-                for pos in tick_positions:
-                    ax.axvline(x=pos, color='gray', linestyle=':', linewidth=0.5)
-            
-            # Сетка
-            ax.grid(True, alpha=0.3)
-            
-            # Легенда
-            ax.legend(['Зоны', 'Уровень Ферми'], loc='upper right')
-            
-            plt.tight_layout()
-            
-            if output_path:
-                plt.savefig(output_path, dpi=150, bbox_inches='tight')
-                plt.close()
-                return output_path
-            else:
-                buf = BytesIO()
-                plt.savefig(buf, format='png', dpi=150, bbox_inches='tight')
-                plt.close()
-                buf.seek(0)
-                img_str = base64.b64encode(buf.read()).decode('utf-8')
-                return f"data:image/png;base64,{img_str}"
+            png = band_structure_png(kpoints, energies, labels, dpi)
+            return save_png(png, output_path)
                 
         except Exception as e:
             print(f"Ошибка визуализации зонной структуры: {e}")
             return None
     
+    # Ширина графика в пикселях: точек на зону в обзорном виде
+    INTERACTIVE_PX = 800
+    # Предел точек во всем trace (при сотнях зон на зону приходится меньше px)
+    INTERACTIVE_MAX_POINTS = 200000
+    
     @staticmethod
-    def create_interactive_bands(data):
+    @timed
+    def create_interactive_bands(data, single_trace=True, zoom_url=None, levels=None,
+                                 px=INTERACTIVE_PX, max_points=INTERACTIVE_MAX_POINTS):
         """
-        Создает интерактивный график зонной структуры
+        Создает интерактивный график зонной структуры.
+        single_trace: все зоны одним trace с разрывами NaN, прореженные LTTB;
+        иначе - trace на каждую зону со всеми точками.
+        zoom_url: адрес /api/material/<id>/bands - при масштабировании график
+        запрашивает видимый диапазон k в полном разрешении.
+        levels: пирамида детализации (spectra_storage.load_levels).
         """
         try:
-            kpoints = np.array(data.get('kpoints', []))
-            energies = np.array(data.get('energies', []))
+            kpoints = np.asarray(data.get('kpoints', []))
+            energies = np.asarray(data.get('energies', []))
             labels = data.get('labels', {})
             
             fig = go.Figure()
+            full_resolution = True
             
             # Рисуем зоны
-            if energies.ndim == 2:
+            if single_trace:
+                x, y, full_resolution = band_window(kpoints, energies, px=px, max_points=max_points,
+                                                    levels=levels)
+                fig.add_trace(go.Scatter(
+                    x=x,
+                    y=y,
+                    mode='lines',
+                    name='Зоны',
+                    line=dict(color='blue', width=1),
+                    opacity=0.7,
+                    connectgaps=False
+                ))
+            elif energies.ndim == 2:
                 for i in range(energies.shape[1]):
                     fig.add_trace(go.Scatter(
                         x=kpoints,
@@ -447,7 +501,8 @@ class BandStructureVisualizer:
                 ),
                 yaxis=dict(title='Энергия (эВ)'),
                 showlegend=True,
-                hovermode='x unified'
+                # Единая подсказка по x перебирает все зоны - для одного trace не нужна
+                hovermode='closest' if single_trace else 'x unified'
             )
             
             # Метки высокосимметричных точек
@@ -460,14 +515,18 @@ class BandStructureVisualizer:
                         tick_positions.append(position)
                         tick_labels.append(f'{label}')
                 
-                fig.update_xaxis(
+                fig.update_xaxes(
                     tickmode='array',
                     tickvals=tick_positions,
                     ticktext=tick_labels
                 )
             
+            post_script = None
+            if single_trace and zoom_url and not full_resolution:
+                post_script = BAND_ZOOM_SCRIPT.replace('{zoom_url}', json.dumps(zoom_url))
+            
             # Конвертируем в HTML
-            html_str = fig.to_html(full_html=False, include_plotlyjs='cdn')
+            html_str = fig.to_html(full_html=False, include_plotlyjs='cdn', post_script=post_script)
             return html_str
             
         except Exception as e:
@@ -475,90 +534,113 @@ class BandStructureVisualizer:
             return None
 
 
+# При масштабировании по k догружает видимый диапазон с сервера,
+# при сбросе масштаба - снова обзорный прореженный вид
+BAND_ZOOM_SCRIPT = """
+var gd = document.getElementById('{plot_id}');
+gd.on('plotly_relayout', function(event) {
+    var params = new URLSearchParams({px: Math.round(gd.clientWidth || 800)});
+    if (event['xaxis.range[0]'] !== undefined && event['xaxis.range[1]'] !== undefined) {
+        params.set('kmin', event['xaxis.range[0]']);
+        params.set('kmax', event['xaxis.range[1]']);
+    } else if (!event['xaxis.autorange']) {
+        return;
+    }
+    fetch({zoom_url} + '?' + params)
+        .then(function(response) { return response.json(); })
+        .then(function(data) { Plotly.restyle(gd, {x: [data.x], y: [data.y]}, [0]); });
+});
+"""
+
+
 class DOSVisualizer:
     """Класс для визуализации плотности состояний"""
     
+    # 3: PNG из шаблона фигуры (utils/plot_templates.py)
+    RENDER_VERSION = 3
+    
+    # Высота интерактивного графика в пикселях: точек на канал в обзорном виде
+    INTERACTIVE_PX = 600
+    
+    # Цвета частичных DOS (линия и заливка с прозрачностью 0.3)
+    PARTIAL_COLORS = [(255, 0, 0), (0, 128, 0), (255, 165, 0), (128, 0, 128), (165, 42, 42)]
+    
+    @staticmethod
+    @timed
+    def window(data, levels=None, emin=None, emax=None, px=INTERACTIVE_PX):
+        """
+        Окно энергий [emin, emax] с уровня детализации, где в него попадает
+        не больше px точек: (уровень, энергия, min, max), min/max - матрицы
+        каналов (total_dos, затем partial_dos).
+        levels - пирамида из spectra_storage.load_levels; без нее строится на лету.
+        """
+        if levels:
+            # Сохраненная ось уже упорядочена, исходные точки читаются только в окне
+            energy = data['energy']
+
+            def read_window(start, stop):
+                return dos_channels(data, start, stop)
+        else:
+            energy, channels = sort_by_axis(data['energy'], dos_channels(data))
+            levels = build_levels(energy, channels) if energy.size > px else []
+
+            def read_window(start, stop):
+                return channels[:, start:stop]
+        return select_window(energy, read_window, levels, emin, emax, px)
+    
+    @staticmethod
+    @timed
+    def _plot_channels(data, levels, px):
+        # Огибающая min/max вместо всех точек, если их больше, чем пикселей
+        level, energy, minimum, maximum = DOSVisualizer.window(data, levels, px=px)
+        if level:
+            energy, channels = envelope(energy, minimum, maximum)
+        else:
+            channels = minimum
+        return level, energy, channels
+    
     @staticmethod
-    def create_dos_plot(data, output_path=None):
+    @timed
+    def create_dos_plot(data, output_path=None, dpi=150, levels=None):
         """
         Создает график плотности состояний
         data: словарь с ключами 'energy', 'total_dos', 'partial_dos'
         """
         try:
-            energy = np.array(data.get('energy', []))
-            total_dos = np.array(data.get('total_dos', []))
-            partial_dos = data.get('partial_dos', {})
-            
-            if len(energy) == 0 or len(total_dos) == 0:
+            if len(data.get('energy', [])) == 0 or len(data.get('total_dos', [])) == 0:
                 return None
             
-            fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
-            
-            # Общая DOS
-            ax1.plot(total_dos, energy, 'b-', linewidth=2)
-            ax1.axhline(y=0, color='r', linestyle='--', linewidth=1)
-            ax1.fill_betweenx(energy, 0, total_dos, where=(total_dos > 0), 
-                             alpha=0.3, color='blue')
-            ax1.set_xlabel('Плотность состояний', fontsize=12)
-            ax1.set_ylabel('Энергия (эВ)', fontsize=12)
-            ax1.set_title('Общая плотность состояний', fontsize=14)
-            ax1.grid(True, alpha=0.3)
-            
-            # Частичная DOS (если есть)
-            if partial_dos:
-                colors = plt.cm.tab10(np.linspace(0, 1, len(partial_dos)))
-                
-                for i, (orbital, dos_data) in enumerate(partial_dos.items()):
-                    dos_values = np.array(dos_data)
-                    ax2.plot(dos_values, energy, label=orbital, 
-                            color=colors[i], linewidth=2)
-                    ax2.fill_betweenx(energy, 0, dos_values, 
-                                     where=(dos_values > 0), 
-                                     alpha=0.3, color=colors[i])
-                
-                ax2.axhline(y=0, color='r', linestyle='--', linewidth=1)
-                ax2.set_xlabel('Плотность состояний', fontsize=12)
-                ax2.set_ylabel('Энергия (эВ)', fontsize=12)
-                ax2.set_title('Частичная плотность состояний', fontsize=14)
-                ax2.legend(loc='best')
-                ax2.grid(True, alpha=0.3)
-            else:
-                ax2.remove()
-            
-            plt.suptitle('Плотность состояний', fontsize=16, y=1.02)
-            plt.tight_layout()
+            names = list(data.get('partial_dos') or {})
+            # Высота графика 6 дюймов
+            level, energy, channels = DOSVisualizer._plot_channels(data, levels, px=int(6 * dpi))
+            total_dos = channels[0]
+            partial_dos = dict(zip(names, channels[1:]))
             
-            if output_path:
-                plt.savefig(output_path, dpi=150, bbox_inches='tight')
-                plt.close()
-                return output_path
-            else:
-                buf = BytesIO()
-                plt.savefig(buf, format='png', dpi=150, bbox_inches='tight')
-                plt.close()
-                buf.seek(0)
-                img_str = base64.b64encode(buf.read()).decode('utf-8')
-                return f"data:image/png;base64,{img_str}"
+            png = dos_png(energy, total_dos, partial_dos, dpi)
+            return save_png(png, output_path)
                 
         except Exception as e:
             print(f"Ошибка визуализации DOS: {e}")
             return None
     
     @staticmethod
-    def create_interactive_dos(data):
+    @timed
+    def create_interactive_dos(data, levels=None, zoom_url=None, px=INTERACTIVE_PX):
         """
-        Создает интерактивный график DOS
+        Создает интерактивный график DOS.
+        Рисуется уровень детализации с ~px точками на канал; zoom_url - адрес
+        /api/material/<id>/dos, с которого при масштабировании по энергии
+        загружается видимое окно.
         """
         try:
-            energy = np.array(data.get('energy', []))
-            total_dos = np.array(data.get('total_dos', []))
-            partial_dos = data.get('partial_dos', {})
+            names = list(data.get('partial_dos') or {})
+            level, energy, channels = DOSVisualizer._plot_channels(data, levels, px)
             
             fig = go.Figure()
             
             # Общая DOS
             fig.add_trace(go.Scatter(
-                x=total_dos,
+                x=channels[0],
                 y=energy,
                 mode='lines',
                 name='Total DOS',
@@ -568,25 +650,21 @@ class DOSVisualizer:
             ))
             
             # Частичная DOS
-            if partial_dos:
-                colors = ['red', 'green', 'orange', 'purple', 'brown']
+            for i, orbital in enumerate(names):
+                if i < len(DOSVisualizer.PARTIAL_COLORS):
+                    r, g, b = DOSVisualizer.PARTIAL_COLORS[i]
+                else:
+                    r, g, b = 128, 128, 128
                 
-                for i, (orbital, dos_data) in enumerate(partial_dos.items()):
-                    if i < len(colors):
-                        color = colors[i]
-                    else:
-                        color = 'gray'
-                    
-                    dos_values = np.array(dos_data)
-                    fig.add_trace(go.Scatter(
-                        x=dos_values,
-                        y=energy,
-                        mode='lines',
-                        name=f'{orbital}',
-                        line=dict(color=color, width=2),
-                        fill='tozerox',
-                        fillcolor=f'rgba{tuple(int(color.lstrip("#")[i:i+2], 16) for i in (0, 2, 4)) + (0.3,)}'
-                    ))
+                fig.add_trace(go.Scatter(
+                    x=channels[i + 1],
+                    y=energy,
+                    mode='lines',
+                    name=f'{orbital}',
+                    line=dict(color=f'rgb({r}, {g}, {b})', width=2),
+                    fill='tozerox',
+                    fillcolor=f'rgba({r}, {g}, {b}, 0.3)'
+                ))
             
             # Линия Ферми
             fig.add_hline(y=0, line=dict(color='red', dash='dash', width=1))
@@ -600,9 +678,45 @@ class DOSVisualizer:
                 legend=dict(x=1.02, y=1)
             )
             
-            html_str = fig.to_html(full_html=False, include_plotlyjs='cdn')
+            post_script = None
+            if zoom_url and level:
+                post_script = DOS_ZOOM_SCRIPT.replace('{zoom_url}', json.dumps(zoom_url))
+            
+            html_str = fig.to_html(full_html=False, include_plotlyjs='cdn', post_script=post_script)
             return html_str
             
         except Exception as e:
             print(f"Ошибка создания интерактивной DOS: {e}")
-            return None
\ No newline at end of file
+            return None
+
+
+# Энергия на графике DOS - ось y: при масштабировании догружается окно
+# энергий, каждая корзина рисуется парой точек min/max
+DOS_ZOOM_SCRIPT = """
+var gd = document.getElementById('{plot_id}');
+gd.on('plotly_relayout', function(event) {
+    var params = new URLSearchParams({px: Math.round(gd.clientHeight || 600)});
+    if (event['yaxis.range[0]'] !== undefined && event['yaxis.range[1]'] !== undefined) {
+        params.set('emin', Math.min(event['yaxis.range[0]'], event['yaxis.range[1]']));
+        params.set('emax', Math.max(event['yaxis.range[0]'], event['yaxis.range[1]']));
+    } else if (!event['yaxis.autorange']) {
+        return;
+    }
+    fetch({zoom_url} + '?' + params)
+        .then(function(response) { return response.json(); })
+        .then(function(data) {
+            var channels = [data.total_dos].concat(data.partial_dos);
+            var xs = [], ys = [];
+            channels.forEach(function(channel) {
+                var x = [], y = [];
+                data.energy.forEach(function(e, i) {
+                    x.push(channel.min[i], channel.max[i]);
+                    y.push(e, e);
+                });
+                xs.push(x);
+                ys.push(y);
+            });
+            Plotly.restyle(gd, {x: xs, y: ys}, channels.map(function(c, i) { return i; }));
+        });
+});
+"""